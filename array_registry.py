@@ -0,0 +1,314 @@
+"""
+Concrete Mixture Prediction System
+Pickle-free, memory-mappable model registry
+
+convert_directory() rewrites a trained_models/ directory as
+<models_dir>/array_registry/:
+
+    registry.json       ash types, targets and inputs; per model its features,
+                        scaler parameters and where its arrays are
+    arrays-<hash>.bin   every model array, 64-byte aligned
+    native/             boosters that could not be compiled, saved in their
+                        library's own format
+
+Linear models become coefficient vectors and tree ensembles become
+tree_compiler node tables. Loading is one read-only np.memmap plus array
+views: no pickle is executed, nothing is copied, and every process mapping
+the file shares its pages through the OS page cache.
+
+Usage:
+    python array_registry.py [trained_models]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from concrete_predictor import (DEFAULT_MODELS_DIR, LINEAR_MODEL_CLASSES, REGISTRY_FILE, file_sha256,
+                                load_model_index, load_registry, model_file_name)
+from tree_compiler import (TREE_MODEL_CLASSES, ArrayScaler, CompiledEnsemble, check_compiled,
+                           export_ensemble, load_compiled, probe_inputs)
+
+ARRAY_REGISTRY_DIR = 'array_registry'
+MANIFEST_FILE = 'registry.json'
+FORMAT_VERSION = 1
+NATIVE_DIR = 'native'
+# Start of every array in the blob (cache line / SIMD friendly)
+ALIGNMENT = 64
+# Library and file extension of the native format of each booster class
+NATIVE_FORMATS = {
+    'XGBRegressor': ('xgboost', '.json'),
+    'LGBMRegressor': ('lightgbm', '.txt'),
+    'CatBoostRegressor': ('catboost', '.cbm'),
+}
+
+
+class ArrayLinearModel:
+    """Fitted linear model reduced to intercept + X @ coef_"""
+
+    def __init__(self, coef, intercept):
+        self.coef_ = coef
+        self.intercept_ = float(intercept)
+
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef_ + self.intercept_
+
+
+class _Blob:
+    """Concatenates arrays at aligned offsets and records where each one went"""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def add(self, array):
+        array = np.ascontiguousarray(array)
+        padding = -self.size % ALIGNMENT
+        if padding:
+            self.chunks.append(b'\0' * padding)
+            self.size += padding
+        spec = {'offset': self.size, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        self.chunks.append(array.tobytes())
+        self.size += array.nbytes
+        return spec
+
+    def add_all(self, arrays):
+        return {key: self.add(array) for key, array in arrays.items()}
+
+
+def _view(blob, spec):
+    """Read-only array over a slice of the mapped blob"""
+    dtype = np.dtype(spec['dtype'])
+    shape = tuple(spec['shape'])
+    count = int(np.prod(shape, dtype=np.int64))
+    if count == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.frombuffer(blob, dtype=dtype, count=count, offset=spec['offset']).reshape(shape)
+
+
+def _scaler_entry(scaler):
+    if scaler.__class__.__name__ not in ('StandardScaler', 'ArrayScaler'):
+        raise ValueError(f"Cannot convert scaler of type {scaler.__class__.__name__}")
+    array_scaler = ArrayScaler.from_scaler(scaler)
+    return {'mean': array_scaler.mean_.tolist(), 'scale': array_scaler.scale_.tolist()}
+
+
+def _compiled_trees(model, meta, models_dir):
+    """The model's verified CompiledEnsemble (reusing tree_compiler's export), or None"""
+    if meta.get('compiled'):
+        return load_compiled(os.path.join(models_dir, meta['compiled']))['model']
+    try:
+        compiled = export_ensemble(model)
+    except ValueError:
+        return None
+    ok, _ = check_compiled(model, compiled, probe_inputs(compiled, model.n_features_in_))
+    return compiled if ok else None
+
+
+def _save_native(model, path):
+    if model.__class__.__name__ == 'LGBMRegressor':
+        model.booster_.save_model(path)
+    else:
+        model.save_model(path)
+
+
+def _load_native(model_class, path):
+    """Booster from its native file (no pickle involved)"""
+    library, _ = NATIVE_FORMATS[model_class]
+    if library == 'xgboost':
+        from xgboost import XGBRegressor
+        model = XGBRegressor()
+        model.load_model(path)
+        return model
+    if library == 'lightgbm':
+        import lightgbm
+        return lightgbm.Booster(model_file=path)
+    from catboost import CatBoostRegressor
+    return CatBoostRegressor().load_model(path)
+
+
+def convert_model(model_info, meta, models_dir, out_dir, blob):
+    """
+    Convert one registry model; returns (registry.json entry, converted model).
+
+    Tree models use their tree_compiler node table where it matches the
+    original, and their library's native format otherwise.
+    """
+    model = model_info['model']
+    model_class = model.__class__.__name__
+    entry = {
+        'name': model_info['name'],
+        'model_class': model_class,
+        'features': list(model_info['features']),
+        'scaler': _scaler_entry(model_info['scaler']),
+    }
+    if model_info.get('calibration') is not None:
+        entry['calibration'] = [float(r) for r in model_info['calibration']]
+
+    compiled = _compiled_trees(model, meta, models_dir) if model_class in TREE_MODEL_CLASSES else None
+    if model_class in LINEAR_MODEL_CLASSES:
+        coef = np.asarray(model.coef_, dtype=np.float64).reshape(-1)
+        intercept = float(np.asarray(model.intercept_, dtype=np.float64).reshape(-1)[0])
+        entry.update(kind='linear', intercept=intercept, arrays=blob.add_all({'coef': coef}))
+        converted = ArrayLinearModel(coef, intercept)
+    elif compiled is not None:
+        arrays = {k: v for k, v in compiled.to_arrays().items() if v.ndim > 0}
+        arrays.update(compiled.eval_arrays())
+        entry.update(kind='trees', arrays=blob.add_all(arrays), base_score=compiled.base_score,
+                     scale=compiled.scale, input_dtype=compiled.input_dtype, max_depth=compiled.max_depth)
+        converted = compiled
+    elif model_class in NATIVE_FORMATS:
+        _, ext = NATIVE_FORMATS[model_class]
+        rel_path = f"{NATIVE_DIR}/{os.path.splitext(meta['file'])[0]}{ext}"
+        os.makedirs(os.path.join(out_dir, NATIVE_DIR), exist_ok=True)
+        _save_native(model, os.path.join(out_dir, rel_path))
+        entry.update(kind='native', file=rel_path)
+        converted = _load_native(model_class, os.path.join(out_dir, rel_path))
+    else:
+        raise ValueError(f"Cannot convert model of type {model_class}")
+
+    X_probe = (probe_inputs(compiled, len(entry['features'])) if compiled is not None else
+               np.random.default_rng(0).uniform(-3, 3, (256, len(entry['features']))))
+    ok, max_error = check_compiled(model, converted, X_probe)
+    if not ok:
+        raise ValueError(f"Converted {model_info['name']} disagrees with the original "
+                         f"(max error {max_error:.3g})")
+    return entry, converted
+
+
+def convert_directory(models_dir=DEFAULT_MODELS_DIR, verbose=True):
+    """
+    Write <models_dir>/array_registry/ from the pickled registry.
+
+    Every converted model is checked against the original on probe inputs.
+    The blob is named by its content hash and registry.json is replaced
+    atomically, so a reader sees either the old or the new registry.
+    Returns the registry.json contents.
+    """
+    model_registry = load_registry(models_dir)
+    index = load_model_index(models_dir)
+    out_dir = os.path.join(models_dir, ARRAY_REGISTRY_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+
+    blob = _Blob()
+    models = {}
+    for ash_type, ash_models in model_registry['models'].items():
+        models[ash_type] = {}
+        for target_var, model_info in ash_models.items():
+            meta = index['models'].get(ash_type, {}).get(target_var) or {
+                'file': model_file_name(ash_type, target_var)}
+            entry, _ = convert_model(model_info, meta, models_dir, out_dir, blob)
+            models[ash_type][target_var] = entry
+            if verbose:
+                print(f"  {ash_type.strip():<6} {target_var:<28} {entry['name']:<18} {entry['kind']}")
+
+    data = b''.join(blob.chunks)
+    blob_name = f"arrays-{hashlib.sha256(data).hexdigest()[:16]}.bin"
+    with open(os.path.join(out_dir, blob_name), 'wb') as f:
+        f.write(data)
+
+    manifest = {
+        'format': FORMAT_VERSION,
+        'source_sha256': file_sha256(os.path.join(models_dir, REGISTRY_FILE)),
+        'blob': blob_name,
+        'blob_size': len(data),
+        'ash_types': list(model_registry['ash_types']),
+        'target_variables': list(model_registry['target_variables']),
+        'input_variables': list(model_registry['input_variables']),
+        'selection_policy': model_registry.get('selection_policy'),
+        'models': models,
+    }
+    tmp_path = os.path.join(out_dir, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(out_dir, MANIFEST_FILE))
+
+    # Old blobs may still be mapped by running processes (Windows refuses to delete them)
+    for old in glob.glob(os.path.join(out_dir, 'arrays-*.bin')):
+        if os.path.basename(old) != blob_name:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return manifest
+
+
+def _load_model(entry, arrays, out_dir):
+    if entry['kind'] == 'linear':
+        return ArrayLinearModel(arrays['coef'], entry['intercept'])
+    if entry['kind'] == 'trees':
+        prepared = {key: arrays[key] for key in ('packed', 'eval_threshold', 'nan_right')}
+        return CompiledEnsemble(arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'],
+                                arrays['value'], arrays['default_left'], arrays['roots'],
+                                base_score=entry['base_score'], scale=entry['scale'],
+                                input_dtype=entry['input_dtype'], max_depth=entry['max_depth'],
+                                prepared=prepared)
+    return _load_native(entry['model_class'], os.path.join(out_dir, entry['file']))
+
+
+def load_array_registry(models_dir=DEFAULT_MODELS_DIR):
+    """
+    Model registry shaped like load_registry()'s, backed by the mapped blob.
+
+    Model entries also carry their original 'model_class'.
+    """
+    out_dir = os.path.join(models_dir, ARRAY_REGISTRY_DIR)
+    with open(os.path.join(out_dir, MANIFEST_FILE), encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported array registry format {manifest.get('format')!r} in {out_dir}")
+    blob = (np.memmap(os.path.join(out_dir, manifest['blob']), dtype=np.uint8, mode='r')
+            if manifest['blob_size'] else b'')
+
+    models = {}
+    for ash_type, ash_models in manifest['models'].items():
+        models[ash_type] = {}
+        for target_var, entry in ash_models.items():
+            arrays = {key: _view(blob, spec) for key, spec in entry.get('arrays', {}).items()}
+            models[ash_type][target_var] = {
+                'name': entry['name'],
+                'model_class': entry['model_class'],
+                'model': _load_model(entry, arrays, out_dir),
+                'scaler': ArrayScaler(entry['scaler']['mean'], entry['scaler']['scale']),
+                'features': list(entry['features']),
+                'calibration': entry.get('calibration'),
+            }
+    return {
+        'ash_types': manifest['ash_types'],
+        'target_variables': manifest['target_variables'],
+        'input_variables': manifest['input_variables'],
+        'models': models,
+        'selection_policy': manifest.get('selection_policy'),
+    }
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Convert trained models to the pickle-free array registry")
+    parser.add_argument('models_dir', nargs='?', default=DEFAULT_MODELS_DIR)
+    args = parser.parse_args()
+
+    print(f"Converting {args.models_dir}/ ...")
+    try:
+        manifest = convert_directory(args.models_dir)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        return 1
+    out_dir = os.path.join(args.models_dir, ARRAY_REGISTRY_DIR)
+
+    start = time.perf_counter()
+    load_array_registry(args.models_dir)
+    elapsed = time.perf_counter() - start
+    print(f"\nArray registry written to {out_dir}/ ({manifest['blob_size'] / 1e6:.2f} MB of arrays); "
+          f"loads in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
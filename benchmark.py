@@ -0,0 +1,341 @@
+"""
+Concrete Mixture Prediction System
+Benchmark harness: startup, per-model latency, peak memory and batch throughput
+
+Startup is measured in fresh interpreters (the GUI through run_gui.main and
+headless registry loads, split into import and unpickle time). Latency and
+throughput are measured in-process for each predictor configuration. Results
+are written as JSON; --compare flags regressions against a saved baseline.
+
+Usage:
+    python benchmark.py --out bench.json
+    python benchmark.py --out new.json --compare bench.json --tolerance 0.2
+"""
+
+# Only the standard library is imported at module level so that startup
+# children can import this file without skewing their own import timings
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+RESULT_MARKER = 'BENCHMARK_RESULT '
+BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+# Predictor.from_directory options of each benchmarked configuration
+CONFIGS = {
+    'optimized': {'lazy': True, 'compiled': True, 'fuse_linear': True},
+    'native': {'lazy': False, 'compiled': False, 'fuse_linear': False},
+}
+STARTUP_SCENARIOS = ['headless_eager', 'headless_lazy', 'gui']
+# Metric name suffixes where a larger value is better (everything else: lower is better)
+HIGHER_IS_BETTER = ('rows_per_s',)
+# Absolute differences below these are timer noise, whatever the relative change
+NOISE_FLOOR = {'_ms': 0.05, '_s': 0.01, '_mb': 5.0}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def startup_child(scenario, models_dir):
+    """Run one startup scenario in this (fresh) interpreter and print its stage timings"""
+    stages = {}
+    start = time.perf_counter()
+
+    def mark(name):
+        stages[name] = time.perf_counter() - start - sum(stages.values())
+
+    if scenario == 'headless_eager':
+        import concrete_predictor
+        mark('import_s')
+        registry = concrete_predictor.load_registry(models_dir)
+        mark('unpickle_s')
+        predictor = concrete_predictor.Predictor(registry)
+        mark('init_s')
+        _first_predictions(predictor)
+        mark('first_predict_s')
+    elif scenario == 'headless_lazy':
+        import concrete_predictor
+        mark('import_s')
+        predictor = concrete_predictor.Predictor.from_directory(models_dir, lazy=True, compiled=True)
+        mark('open_s')
+        _first_predictions(predictor)
+        mark('first_predict_s')
+    elif scenario == 'gui':
+        import tkinter
+        import run_gui
+
+        def first_frame(widget, n=0):
+            widget.update()
+            mark('until_ready_s')
+            widget.destroy()
+
+        # Stop at the first drawn frame instead of entering the event loop
+        tkinter.Misc.mainloop = first_frame
+        mark('import_s')
+        run_gui.main()
+    else:
+        raise ValueError(f"Unknown startup scenario: {scenario}")
+
+    stages['total_s'] = time.perf_counter() - start
+    stages['peak_rss_mb'] = peak_rss_mb()
+    print(RESULT_MARKER + json.dumps(stages))
+
+
+def _first_predictions(predictor):
+    """One example mix per ash type, all targets (loads every model once)"""
+    import numpy as np
+    x = np.array([[20, 320, 80, 700, 1100, 30, 5, 180, 28]], dtype=np.float64)
+    for ash_type in predictor.ash_types:
+        predictor.predict(x, ash_type)
+
+
+def gui_available():
+    """(available, reason): whether Tk can open a window here"""
+    probe = subprocess.run([sys.executable, '-c', 'import tkinter; tkinter.Tk().destroy()'],
+                           capture_output=True, text=True)
+    if probe.returncode == 0:
+        return True, None
+    lines = probe.stderr.strip().splitlines()
+    return False, lines[-1] if lines else 'Tk unavailable'
+
+
+def run_startup(scenario, models_dir, runs=3):
+    """Median stage timings of a scenario over fresh interpreter runs"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [here, os.environ.get('PYTHONPATH')])))
+    code = f"import benchmark; benchmark.startup_child({scenario!r}, {os.path.abspath(models_dir)!r})"
+
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(models_dir)), env=env)
+        wall = time.perf_counter() - start
+        results = [line for line in proc.stdout.splitlines() if line.startswith(RESULT_MARKER)]
+        if proc.returncode != 0 or not results:
+            lines = (proc.stderr or proc.stdout).strip().splitlines()
+            return {'error': lines[-1] if lines else f'exit code {proc.returncode}'}
+        sample = json.loads(results[-1][len(RESULT_MARKER):])
+        sample['wall_s'] = wall
+        samples.append(sample)
+    return {key: _median([s[key] for s in samples]) for key in samples[0] if samples[0][key] is not None}
+
+
+def _median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def time_call(fn, repeats):
+    """(median, min) seconds of fn() over repeats calls, after one warm-up call"""
+    fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return _median(times), min(times)
+
+
+def sample_inputs(n, rng, input_variables):
+    """n random mixes within the optimizer's default search box"""
+    import numpy as np
+    from mix_optimizer import DEFAULT_BOUNDS
+
+    lo = np.array([DEFAULT_BOUNDS[v][0] for v in input_variables])
+    hi = np.array([DEFAULT_BOUNDS[v][1] for v in input_variables])
+    X = lo + rng.random((n, len(input_variables))) * (hi - lo)
+    X[:, input_variables.index('curing_days')] = rng.choice([7, 14, 28, 56, 90], n)
+    return X
+
+
+def bench_models(predictor, rng, batch=1000, repeats=50):
+    """Single-row and batched latency of every (ash type, target) model"""
+    X = sample_inputs(batch, rng, predictor.input_variables)
+    results = {}
+    for ash_type in predictor.ash_types:
+        for target_var in predictor.available_targets(ash_type):
+            single, single_min = time_call(lambda: predictor.predict(X[:1], ash_type, [target_var]), repeats)
+            batched, _ = time_call(lambda: predictor.predict(X, ash_type, [target_var]),
+                                   max(3, repeats // 10))
+            results[f"{ash_type.strip()}/{target_var}"] = {
+                'model': predictor.model_name(ash_type, target_var),
+                'single_ms': single * 1000,
+                'single_min_ms': single_min * 1000,
+                f'batch{batch}_ms': batched * 1000,
+            }
+    return results
+
+
+def bench_throughput(predictor, rng, batch_sizes=BATCH_SIZES, budget_s=1.0):
+    """Rows/s of a full (all ash types, all targets) predict call per batch size"""
+    import numpy as np
+
+    results = {}
+    for n in batch_sizes:
+        X = sample_inputs(n, rng, predictor.input_variables)
+        ash_types = np.array(predictor.ash_types, dtype=object)[rng.integers(0, len(predictor.ash_types), n)]
+        once, _ = time_call(lambda: predictor.predict(X, ash_types), 1)
+        repeats = int(min(200, max(3, budget_s / max(once, 1e-6))))
+        median, _ = time_call(lambda: predictor.predict(X, ash_types), repeats)
+        results[str(n)] = {'latency_ms': median * 1000, 'rows_per_s': n / median}
+    return results
+
+
+def run_benchmarks(models_dir='trained_models', configs=None, batch_sizes=BATCH_SIZES,
+                   startup_runs=3, repeats=50, seed=0, verbose=True):
+    """Run every benchmark and return the result dict"""
+    import numpy as np
+    import sklearn
+    from concrete_predictor import Predictor, registry_hash
+
+    configs = list(CONFIGS) if configs is None else configs
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'sklearn': sklearn.__version__,
+            'registry_hash': registry_hash(models_dir),
+        },
+        'startup': {},
+        'models': {},
+        'throughput': {},
+    }
+
+    has_gui, reason = gui_available()
+    for scenario in STARTUP_SCENARIOS:
+        if scenario == 'gui' and not has_gui:
+            results['startup'][scenario] = {'skipped': reason}
+        else:
+            results['startup'][scenario] = run_startup(scenario, models_dir, startup_runs)
+        if verbose:
+            print(f"  startup {scenario:<15} {_describe(results['startup'][scenario])}")
+
+    for config in configs:
+        rng = np.random.default_rng(seed)
+        predictor = Predictor.from_directory(models_dir, **CONFIGS[config])
+        results['models'][config] = bench_models(predictor, rng, repeats=repeats)
+        results['throughput'][config] = bench_throughput(predictor, rng, batch_sizes)
+        if verbose:
+            singles = [m['single_ms'] for m in results['models'][config].values()]
+            print(f"  {config:<9} per-model single row: median {_median(singles):.3f} ms, "
+                  f"max {max(singles):.3f} ms")
+            for n, row in results['throughput'][config].items():
+                print(f"  {config:<9} batch {int(n):>7}: {row['latency_ms']:>10.3f} ms "
+                      f"{row['rows_per_s']:>14,.0f} rows/s")
+
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def _describe(stages):
+    if 'skipped' in stages or 'error' in stages:
+        return f"({stages.get('skipped') or stages.get('error')})"
+    return '  '.join(f"{k[:-2] if k.endswith('_s') else k}={v:.3f}" for k, v in stages.items())
+
+
+def flatten_metrics(results):
+    """{dotted metric name: value} for every numeric benchmark result"""
+    flat = {}
+
+    def walk(prefix, node):
+        for key, value in node.items():
+            name = f"{prefix}.{key}" if prefix else key
+            if isinstance(value, dict):
+                walk(name, value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                flat[name] = value
+
+    walk('', {k: v for k, v in results.items() if k != 'meta'})
+    return flat
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Regressions and improvements beyond tolerance (relative) against a baseline.
+
+    Returns (regressions, improvements), each a list of
+    (metric, baseline value, new value, relative change).
+    """
+    new, old = flatten_metrics(results), flatten_metrics(baseline)
+    regressions, improvements = [], []
+    for name in sorted(set(new) & set(old)):
+        if old[name] <= 0 or name.endswith('cpu_count'):
+            continue
+        floor = next((v for suffix, v in NOISE_FLOOR.items() if name.endswith(suffix)), 0.0)
+        if abs(new[name] - old[name]) < floor:
+            continue
+        change = new[name] / old[name] - 1
+        if name.endswith(HIGHER_IS_BETTER):
+            change = -change
+        row = (name, old[name], new[name], change)
+        if change > tolerance:
+            regressions.append(row)
+        elif change < -tolerance:
+            improvements.append(row)
+    return regressions, improvements
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark the concrete mixture predictor")
+    parser.add_argument('--models-dir', default='trained_models')
+    parser.add_argument('--out', default='benchmark_results.json', help="Write results to this JSON file")
+    parser.add_argument('--compare', metavar='BASELINE', help="Flag regressions against a saved result file")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Relative slowdown counted as a regression (default 0.2 = 20%%)")
+    parser.add_argument('--config', action='append', choices=list(CONFIGS),
+                        help="Predictor configuration(s) to benchmark (default: all)")
+    parser.add_argument('--max-batch', type=int, default=BATCH_SIZES[-1])
+    parser.add_argument('--startup-runs', type=int, default=3)
+    parser.add_argument('--repeats', type=int, default=50, help="Timed calls per latency measurement")
+    args = parser.parse_args()
+
+    # Version-mismatch warnings from unpickling would drown the report
+    import warnings
+    warnings.filterwarnings('ignore')
+    print(f"Benchmarking {args.models_dir} ({platform.python_version()}, {os.cpu_count()} CPUs)")
+    results = run_benchmarks(args.models_dir, configs=args.config,
+                             batch_sizes=[n for n in BATCH_SIZES if n <= args.max_batch],
+                             startup_runs=args.startup_runs, repeats=args.repeats)
+    print(f"  peak RSS {results['peak_rss_mb']:.0f} MB" if results['peak_rss_mb'] else "  peak RSS n/a")
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResults saved to: {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('registry_hash') != results['meta']['registry_hash']:
+            print("Note: baseline was recorded with a different model registry")
+        regressions, improvements = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions (beyond {args.tolerance:.0%}):")
+            for name, old, new, change in regressions:
+                print(f"  {name:<70} {old:>12.4g} -> {new:>12.4g}  ({change:+.0%})")
+        if improvements:
+            print(f"\n{len(improvements)} metric(s) improved by more than {args.tolerance:.0%}")
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}")
+            return 1
+        print(f"\nNo regressions against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+Concrete Mixture Prediction System
+Streaming bulk scorer for large CSV/Excel mix files
+
+The input is read in fixed-size chunks, so memory stays bounded by the chunk
+size. In each chunk, rows are validated with the GUI's rules (all inputs
+numeric and non-negative, known ash type); inputs the row's models do not
+read may be absent or blank and default to 0. Valid rows are scored per ash type
+in one batch per model (--coverage adds interval bounds). Each scored chunk
+is appended to a CSV or Parquet file before the next one is read. With
+--workers, chunks are scored in separate processes and written in input
+order.
+
+Usage:
+    python bulk_score.py supplier_mixes.csv scored.csv
+    python bulk_score.py supplier_mixes.xlsx scored.parquet --ash RHA --workers 4
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from concrete_predictor import ASH_COLUMN, DEFAULT_MODELS_DIR, Predictor, valid_rows
+
+DEFAULT_CHUNK_SIZE = 50000
+STATUS_COLUMN = 'status'
+
+# Predictor owned by each worker process (process pool only)
+_worker_predictor = None
+
+
+def _init_worker(models_dir, compiled, arrays, pooled=False):
+    """Process-pool initializer: each worker loads its own predictor"""
+    global _worker_predictor
+    _worker_predictor = Predictor.from_directory(models_dir, compiled=compiled, arrays=arrays, pooled=pooled)
+
+
+def _worker_score(frame, ash_type, ash_column, coverage=None):
+    return score_chunk(_worker_predictor, frame, ash_type, ash_column, coverage)
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("Parquet files need pyarrow (pip install pyarrow)") from None
+
+
+def read_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, sheet_name=None):
+    """Yield DataFrame chunks of at most chunk_size rows from a CSV, Excel or Parquet file"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.csv', '.txt'):
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    elif ext in ('.xlsx', '.xlsm'):
+        yield from _read_excel_chunks(path, chunk_size, sheet_name)
+    elif ext == '.parquet':
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported input format: {ext} (use .csv, .xlsx or .parquet)")
+
+
+def _read_excel_chunks(path, chunk_size, sheet_name=None):
+    """Stream an Excel sheet with openpyxl's read-only mode (pandas reads it whole)"""
+    import openpyxl
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(c).strip() if c is not None else f'column_{i}' for i, c in enumerate(next(rows, ()))]
+        chunk = []
+        for row in rows:
+            chunk.append(row[:len(header)])
+            if len(chunk) == chunk_size:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def _input_column(frame, column):
+    """(values, blank) of one input column; an absent column is all blank"""
+    if column not in frame.columns:
+        return np.full(len(frame), np.nan), np.ones(len(frame), dtype=bool)
+    raw = frame[column]
+    blank = raw.isna().to_numpy()
+    if not pd.api.types.is_numeric_dtype(raw):
+        blank = blank | raw.astype(str).str.strip().eq('').to_numpy()
+    return pd.to_numeric(raw, errors='coerce').to_numpy(dtype=np.float64), blank
+
+
+def _used_inputs(predictor, ash_type):
+    """Input variables read by at least one model of an ash type"""
+    used = set()
+    for target_var in predictor.available_targets(ash_type):
+        used.update(predictor.model_features(ash_type, target_var))
+    return used
+
+
+def score_chunk(predictor, frame, ash_type=None, ash_column=ASH_COLUMN, coverage=None):
+    """
+    Score one chunk; returns the chunk with one column per target plus 'status'.
+
+    ash_type applies one ash type to every row; otherwise it is read from
+    ash_column. An absent or blank input that none of the row's models
+    reads defaults to 0, as in predict_one(). Rows with any other
+    non-numeric, negative or missing input, or an unknown ash type, get NaN
+    predictions and a status explaining why. With coverage, each target
+    also gets '<target> lower' and '<target> upper' interval columns.
+    """
+    columns = [_input_column(frame, c) for c in predictor.input_variables]
+    X = np.column_stack([values for values, _ in columns])
+    blank = np.column_stack([blank for _, blank in columns])
+
+    if ash_type is not None:
+        ash_type = predictor.resolve_ash_type(ash_type)
+        used = _used_inputs(predictor, ash_type)
+        missing = [c for c in predictor.input_variables if c not in frame.columns and c in used]
+        if missing:
+            raise ValueError(f"Missing input columns: {missing}")
+        ash_types = np.full(len(frame), ash_type, dtype=object)
+    else:
+        if ash_column not in frame.columns:
+            raise ValueError(f"No '{ash_column}' column; pass --ash to score every row as one ash type")
+        # Resolve each distinct label once, then broadcast by code
+        codes, labels = pd.factorize(frame[ash_column])
+        resolved = np.empty(len(labels) + 1, dtype=object)
+        for k, label in enumerate(labels):
+            try:
+                resolved[k] = predictor.resolve_ash_type(str(label).strip())
+            except KeyError:
+                resolved[k] = None
+        ash_types = resolved[codes]  # code -1 (missing) picks the trailing None
+
+    for name in set(ash_types) - {None}:
+        used = _used_inputs(predictor, name)
+        unused = [k for k, c in enumerate(predictor.input_variables) if c not in used]
+        default = blank[:, unused] & (ash_types == name)[:, None]
+        X[:, unused] = np.where(default, 0.0, X[:, unused])
+
+    status = np.full(len(frame), 'ok', dtype=object)
+    status[~valid_rows(X)] = 'invalid inputs'
+    status[(ash_types == None) & (status == 'ok')] = 'unknown ash type'  # noqa: E711
+
+    ok = status == 'ok'
+    out = frame.copy()
+    # Column-name suffix -> {target: values of the ok rows}
+    results = {'': {}} if coverage is None else {'': {}, ' lower': {}, ' upper': {}}
+    if ok.any():
+        if coverage is None:
+            results[''] = predictor.predict(X[ok], ash_types[ok])
+        else:
+            results[''], results[' lower'], results[' upper'] = predictor.predict_interval(
+                X[ok], ash_types[ok], coverage=coverage)
+    for target_var in predictor.target_variables:
+        for suffix, values in results.items():
+            column = np.full(len(frame), np.nan)
+            if target_var in values:
+                column[ok] = values[target_var]
+            out[target_var + suffix] = column
+    out[STATUS_COLUMN] = status
+    return out
+
+
+class ChunkWriter:
+    """Appends scored chunks to a CSV or Parquet file as they arrive"""
+
+    def __init__(self, path):
+        self.path = path
+        self.ext = os.path.splitext(path)[1].lower()
+        if self.ext not in ('.csv', '.parquet'):
+            raise ValueError(f"Unsupported output format: {self.ext} (use .csv or .parquet)")
+        if self.ext == '.parquet':
+            _require_pyarrow()
+        self._file = None
+        self._writer = None
+
+    def write(self, frame):
+        if self.ext == '.csv':
+            first = self._file is None
+            if first:
+                self._file = open(self.path, 'w', newline='', encoding='utf-8')
+            frame.to_csv(self._file, header=first, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                # Chunks with an all-empty column infer a different type
+                table = table.cast(self._writer.schema)
+            self._writer.write_table(table)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _scored_chunks(chunks, models_dir, compiled, arrays, workers, ash_type, ash_column, pooled=False,
+                   coverage=None):
+    """Scored chunks in input order, in-process or on a process pool"""
+    if workers <= 1:
+        predictor = Predictor.from_directory(models_dir, compiled=compiled, arrays=arrays, pooled=pooled)
+        for chunk in chunks:
+            yield score_chunk(predictor, chunk, ash_type, ash_column, coverage)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(models_dir, compiled, arrays, pooled)) as executor:
+        # At most two chunks per worker are read ahead, which bounds memory
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_worker_score, chunk, ash_type, ash_column, coverage))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def bulk_score(input_path, output_path, models_dir=DEFAULT_MODELS_DIR, ash_type=None,
+               ash_column=ASH_COLUMN, chunk_size=DEFAULT_CHUNK_SIZE, workers=1, compiled=False,
+               sheet_name=None, arrays=False, pooled=False, coverage=None, verbose=True):
+    """Stream input_path through the models into output_path; returns a summary dict"""
+    chunks = read_chunks(input_path, chunk_size, sheet_name)
+    writer = ChunkWriter(output_path)
+    start = time.perf_counter()
+    rows = scored = 0
+    try:
+        for out in _scored_chunks(chunks, models_dir, compiled, arrays, workers, ash_type, ash_column,
+                                  pooled, coverage):
+            writer.write(out)
+            rows += len(out)
+            scored += int((out[STATUS_COLUMN] == 'ok').sum())
+            if verbose:
+                elapsed = time.perf_counter() - start
+                print(f"\r  {rows:>12,} rows  {rows / elapsed:>10,.0f} rows/s  "
+                      f"{rows - scored:>9,} skipped", end='', file=sys.stderr, flush=True)
+    finally:
+        writer.close()
+    if verbose:
+        print(file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'scored': scored,
+        'skipped': rows - scored,
+        'elapsed': elapsed,
+        'rows_per_s': rows / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Score a large mix file in chunks")
+    parser.add_argument('input', help="Input .csv, .xlsx or .parquet with one column per input variable")
+    parser.add_argument('output', help="Output .csv or .parquet (input columns + predictions + status)")
+    parser.add_argument('--ash', help="Ash type for every row (default: read the ash type column)")
+    parser.add_argument('--ash-column', default=ASH_COLUMN)
+    parser.add_argument('--sheet', help="Excel sheet name (default: first sheet)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=1, help="Processes scoring chunks in parallel")
+    parser.add_argument('--compiled', action='store_true', help="Use NumPy-compiled tree models")
+    parser.add_argument('--arrays', action='store_true',
+                        help="Use the memory-mapped array registry (workers share its pages)")
+    parser.add_argument('--pooled', action='store_true',
+                        help="Use the pooled multi-ash models (train_models.py --pooled)")
+    parser.add_argument('--coverage', type=float,
+                        help="Add '<target> lower'/'<target> upper' interval columns at this coverage, e.g. 0.9")
+    parser.add_argument('--models-dir', default=DEFAULT_MODELS_DIR)
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args()
+
+    try:
+        summary = bulk_score(args.input, args.output, args.models_dir, args.ash, args.ash_column,
+                             args.chunk_size, args.workers, args.compiled, args.sheet,
+                             arrays=args.arrays, pooled=args.pooled, coverage=args.coverage,
+                             verbose=not args.quiet)
+    except (OSError, ValueError, KeyError, ImportError) as e:
+        print(f"ERROR: {e}")
+        return 1
+
+    print(f"Scored {summary['scored']:,} of {summary['rows']:,} rows in {summary['elapsed']:.1f}s "
+          f"({summary['rows_per_s']:,.0f} rows/s); {summary['skipped']:,} skipped")
+    print(f"Results saved to: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,364 @@
+"""
+Concrete Mixture Prediction System
+Dataset ingestion: Excel workbook -> cleaned, typed columnar cache
+
+Parsing REVISED_DATASET.xlsx through openpyxl is the slowest I/O step of
+training and analysis. Each ash type sheet is cleaned once and stored as an
+uncompressed .npz of typed column arrays, keyed on the sheet's content hash
+and the cleaning-code version. Later runs load from the cache and re-parse
+only the sheets whose contents changed.
+
+Usage:
+    python concrete_dataset.py --data REVISED_DATASET.xlsx
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import posixpath
+import sys
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+from concrete_predictor import file_sha256
+
+DEFAULT_DATASET = 'REVISED_DATASET.xlsx'
+DEFAULT_CACHE_DIR = 'dataset_cache'
+CACHE_MANIFEST = 'manifest.json'
+CACHE_FORMAT_VERSION = 1
+# The first 7 sheets of the workbook are ash types
+N_ASH_SHEETS = 7
+# Additive columns; only POFA's fly ash is a model input
+ADDITIVE_PREFIX = 'pozzolan added'
+
+TARGET_VARIABLES = ['cost_USD_per_m3', 'Slump(mm)', 'compressive_strength_MPa_', 'CO2_kgCO₂e / kg']
+INPUT_VARIABLES = ['replacement_pct', 'cement_kg_m3', 'ash_kg_m3', 'fine_aggregate_kg_m3',
+                   'coarse_aggregate_kg_m3', 'pozzolan added(Fly Ash) kgm3',
+                   'superplasticizer_kg_m3', 'water kg_m3', 'curing_days']
+
+_XLSX_NS = {
+    'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+    'rel': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    'pkg': 'http://schemas.openxmlformats.org/package/2006/relationships',
+}
+
+
+def load_datasets(excel_file=DEFAULT_DATASET, sheet_names=None):
+    """Ash type sheet names and their raw DataFrames (optionally only sheet_names)"""
+    xl = pd.ExcelFile(excel_file)
+    ash_types = xl.sheet_names[:N_ASH_SHEETS]
+    wanted = ash_types if sheet_names is None else [s for s in ash_types if s in sheet_names]
+    return ash_types, {ash_type: pd.read_excel(xl, sheet_name=ash_type) for ash_type in wanted}
+
+
+def clean_dataset(df, ash_type_name, verbose=True):
+    """
+    Clean and prepare dataset for analysis
+    """
+    if verbose:
+        print(f"\nCleaning {ash_type_name}...")
+        print(f"Original shape: {df.shape}")
+
+    df_clean = df.copy()
+
+    # Mixes with an additive the models do not see (slag, silica fume, fibre,
+    # clay): their cost and CO2 depend on an amount missing from the inputs
+    additive_cols = [col for col in df_clean.columns
+                     if str(col).startswith(ADDITIVE_PREFIX) and col not in INPUT_VARIABLES]
+    unmodelled = pd.Series(False, index=df_clean.index)
+    for col in additive_cols:
+        unmodelled |= pd.to_numeric(df_clean[col], errors='coerce').fillna(0) != 0
+
+    # Convert to numeric: blank cells (' ') appear in CO2 and a few other columns
+    for col in INPUT_VARIABLES + TARGET_VARIABLES:
+        if col in df_clean.columns:
+            df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce')
+
+    # Keep only necessary columns
+    necessary_cols = INPUT_VARIABLES + TARGET_VARIABLES + ['paper', 'reference']
+    df_clean = df_clean[[col for col in necessary_cols if col in df_clean.columns]]
+
+    # Remove rows where ALL target variables are missing
+    target_cols_present = [col for col in TARGET_VARIABLES if col in df_clean.columns]
+    df_clean = df_clean.dropna(subset=target_cols_present, how='all')
+
+    # Fill missing values in input variables with median
+    for col in INPUT_VARIABLES:
+        if col in df_clean.columns and df_clean[col].isnull().any():
+            median_val = df_clean[col].median()
+            df_clean[col] = df_clean[col].fillna(median_val)
+            if verbose:
+                print(f"  Filled {col} missing values with median: {median_val:.2f}")
+
+    # Remove duplicates (only POFA has the 'pozzolan added(Fly Ash) kgm3' column)
+    input_cols_present = [col for col in INPUT_VARIABLES if col in df_clean.columns]
+    before_dup = len(df_clean)
+    df_clean = df_clean.drop_duplicates(subset=input_cols_present + target_cols_present)
+    if verbose and before_dup != len(df_clean):
+        print(f"  Removed {before_dup - len(df_clean)} duplicate rows")
+
+    # Remove outliers using IQR method for each variable
+    before_outliers = len(df_clean)
+    for col in INPUT_VARIABLES + target_cols_present:
+        if col in df_clean.columns:
+            Q1 = df_clean[col].quantile(0.25)
+            Q3 = df_clean[col].quantile(0.75)
+            IQR = Q3 - Q1
+            lower_bound = Q1 - 3 * IQR  # Using 3*IQR for more lenient outlier removal
+            upper_bound = Q3 + 3 * IQR
+            df_clean = df_clean[(df_clean[col] >= lower_bound) & (df_clean[col] <= upper_bound)]
+    after_outliers = len(df_clean)
+
+    # Dropped after the outlier pass, so the IQR bounds are the notebook's
+    df_clean = df_clean[~unmodelled.loc[df_clean.index]]
+
+    if verbose:
+        if before_outliers != after_outliers:
+            print(f"  Removed {before_outliers - after_outliers} outlier rows")
+        if after_outliers != len(df_clean):
+            print(f"  Removed {after_outliers - len(df_clean)} rows with unmodelled additives")
+        print(f"Final shape: {df_clean.shape}")
+        print(f"Rows removed: {df.shape[0] - df_clean.shape[0]} "
+              f"({100 * (df.shape[0] - df_clean.shape[0]) / df.shape[0]:.1f}%)")
+
+    return df_clean
+
+
+def cleaning_version():
+    """Hash of the cleaning code and variable lists; any edit invalidates the cache"""
+    digest = hashlib.sha256()
+    digest.update(str(CACHE_FORMAT_VERSION).encode())
+    digest.update(inspect.getsource(clean_dataset).encode())
+    digest.update(json.dumps([INPUT_VARIABLES, TARGET_VARIABLES]).encode())
+    return digest.hexdigest()[:16]
+
+
+def _shared_strings(z):
+    """Text of each shared-string item (rich-text runs joined, phonetic hints skipped)"""
+    if 'xl/sharedStrings.xml' not in z.namelist():
+        return []
+    strings = []
+    for item in ET.fromstring(z.read('xl/sharedStrings.xml')).findall('main:si', _XLSX_NS):
+        texts = item.findall('main:t', _XLSX_NS) + item.findall('main:r/main:t', _XLSX_NS)
+        strings.append(''.join(t.text or '' for t in texts))
+    return strings
+
+
+def _sheet_values_hash(sheet_xml, shared):
+    """
+    Hash of a worksheet's cells: reference, type, style and value, with
+    shared-string indices replaced by their text.
+    """
+    digest = hashlib.sha256()
+    cell_tag = f"{{{_XLSX_NS['main']}}}c"
+    value_tag = f"{{{_XLSX_NS['main']}}}v"
+    text_tag = f"{{{_XLSX_NS['main']}}}t"
+    for _, cell in ET.iterparse(sheet_xml):
+        if cell.tag != cell_tag:
+            continue
+        kind = cell.get('t', 'n')
+        if kind == 'inlineStr':
+            value = ''.join(t.text or '' for t in cell.iter(text_tag))
+        else:
+            v = cell.find(value_tag)
+            value = v.text if v is not None and v.text is not None else ''
+            if kind == 's' and value:
+                value = shared[int(value)]
+        digest.update(f"{cell.get('r')}\x1f{kind}\x1f{cell.get('s', '')}\x1f{value}\x1e".encode('utf-8'))
+        cell.clear()
+    return digest.hexdigest()
+
+
+def sheet_hashes(excel_file):
+    """
+    {sheet name: content hash} in workbook order, read from the .xlsx zip parts.
+
+    A sheet's hash covers its cell values (including cached formula
+    results), with shared strings resolved to their text. Strings added to
+    other sheets therefore leave it unchanged, even when Excel renumbers the
+    shared-string table. Returns None for files that are not .xlsx packages.
+    """
+    try:
+        with zipfile.ZipFile(excel_file) as z:
+            workbook = ET.fromstring(z.read('xl/workbook.xml'))
+            rels = ET.fromstring(z.read('xl/_rels/workbook.xml.rels'))
+            targets = {r.get('Id'): r.get('Target') for r in rels.findall('pkg:Relationship', _XLSX_NS)}
+            shared = _shared_strings(z)
+
+            hashes = {}
+            for sheet in workbook.find('main:sheets', _XLSX_NS):
+                target = targets[sheet.get(f"{{{_XLSX_NS['rel']}}}id")]
+                part = target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+                with z.open(posixpath.normpath(part)) as sheet_xml:
+                    hashes[sheet.get('name')] = _sheet_values_hash(sheet_xml, shared)
+            return hashes
+    except (zipfile.BadZipFile, KeyError, IndexError, ValueError, ET.ParseError):
+        return None
+
+
+def save_frame(path, df):
+    """Write a DataFrame as typed column arrays (.npz, no pickled objects)"""
+    arrays = {
+        'columns': np.array(df.columns, dtype=str),
+        'index': df.index.to_numpy(),
+    }
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            arrays[f'c{i}'] = values.to_numpy()
+        else:
+            # Text columns: concatenated UTF-8 bytes, end offsets and a missing-value mask
+            missing = values.isna().to_numpy()
+            encoded = [b'' if m else str(v).encode('utf-8') for v, m in zip(values.tolist(), missing)]
+            arrays[f'c{i}'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+            arrays[f'o{i}'] = np.cumsum([len(e) for e in encoded], dtype=np.int64)
+            arrays[f'm{i}'] = missing
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_frame(path):
+    """Read a DataFrame written by save_frame"""
+    with np.load(path, allow_pickle=False) as data:
+        columns = data['columns'].tolist()
+        frame = {}
+        for i, col in enumerate(columns):
+            values = data[f'c{i}']
+            if f'o{i}' in data:
+                raw = values.tobytes()
+                ends = data[f'o{i}'].tolist()
+                starts = [0] + ends[:-1]
+                values = np.array([None if m else raw[a:b].decode('utf-8')
+                                   for a, b, m in zip(starts, ends, data[f'm{i}'].tolist())], dtype=object)
+            frame[col] = values
+        return pd.DataFrame(frame, index=data['index'], columns=columns)
+
+
+def _cache_file(ash_type):
+    return f"{ash_type.strip().replace(' ', '_')}.npz"
+
+
+def _read_manifest(cache_dir):
+    path = os.path.join(cache_dir, CACHE_MANIFEST)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_clean_datasets(excel_file=DEFAULT_DATASET, cache_dir=DEFAULT_CACHE_DIR, refresh=False, verbose=True):
+    """
+    Cleaned ash type datasets, from the columnar cache where possible.
+
+    Returns (ash_types, {ash_type: cleaned DataFrame}). With cache_dir=None
+    the workbook is parsed and cleaned directly.
+    """
+    if cache_dir is None:
+        ash_types, datasets_raw = load_datasets(excel_file)
+        return ash_types, {a: clean_dataset(datasets_raw[a], a, verbose) for a in ash_types}
+
+    start = time.perf_counter()
+    version = cleaning_version()
+    workbook_hash = file_sha256(excel_file)
+    manifest = None if refresh else _read_manifest(cache_dir)
+    if manifest is not None and (manifest.get('format') != CACHE_FORMAT_VERSION or
+                                 manifest.get('cleaning_version') != version):
+        manifest = None
+    cached = manifest['sheets'] if manifest is not None else {}
+
+    # Fast path: unchanged workbook, no zip inspection needed
+    if manifest is not None and manifest.get('workbook_sha256') == workbook_hash:
+        ash_types = manifest['ash_types']
+        keys = {a: cached[a]['key'] for a in ash_types if a in cached}
+    else:
+        hashes = sheet_hashes(excel_file)
+        if hashes is None:
+            # Not an .xlsx package: key every sheet on the whole file
+            ash_types = pd.ExcelFile(excel_file).sheet_names[:N_ASH_SHEETS]
+            keys = {a: workbook_hash for a in ash_types}
+        else:
+            ash_types = list(hashes)[:N_ASH_SHEETS]
+            keys = {a: hashes[a] for a in ash_types}
+
+    datasets_clean, stale = {}, []
+    for ash_type in ash_types:
+        entry = cached.get(ash_type)
+        path = os.path.join(cache_dir, _cache_file(ash_type))
+        if entry is not None and entry['key'] == keys.get(ash_type) and os.path.exists(path):
+            try:
+                datasets_clean[ash_type] = load_frame(path)
+                continue
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Warning: Could not read cached dataset {path}: {e}")
+        stale.append(ash_type)
+
+    if stale:
+        os.makedirs(cache_dir, exist_ok=True)
+        _, datasets_raw = load_datasets(excel_file, stale)
+        for ash_type in stale:
+            df_clean = clean_dataset(datasets_raw[ash_type], ash_type, verbose)
+            save_frame(os.path.join(cache_dir, _cache_file(ash_type)), df_clean)
+            datasets_clean[ash_type] = df_clean
+            cached[ash_type] = {
+                'key': keys[ash_type],
+                'file': _cache_file(ash_type),
+                'raw_rows': int(len(datasets_raw[ash_type])),
+                'rows': int(len(df_clean)),
+            }
+
+    if stale or manifest is None or manifest.get('workbook_sha256') != workbook_hash:
+        os.makedirs(cache_dir, exist_ok=True)
+        manifest = {
+            'format': CACHE_FORMAT_VERSION,
+            'cleaning_version': version,
+            'workbook': os.path.basename(excel_file),
+            'workbook_sha256': workbook_hash,
+            'ash_types': ash_types,
+            'sheets': {a: cached[a] for a in ash_types},
+        }
+        tmp_path = os.path.join(cache_dir, CACHE_MANIFEST + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(cache_dir, CACHE_MANIFEST))
+
+    if verbose:
+        print(f"Datasets: {len(ash_types) - len(stale)} sheets from cache, {len(stale)} rebuilt "
+              f"({time.perf_counter() - start:.3f}s)")
+    return ash_types, {a: datasets_clean[a] for a in ash_types}
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Build or refresh the cleaned dataset cache")
+    parser.add_argument('--data', default=DEFAULT_DATASET, help="Excel workbook with one sheet per ash type")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--refresh', action='store_true', help="Rebuild every sheet")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data):
+        print(f"ERROR: Dataset not found: {args.data}")
+        return 1
+    ash_types, datasets_clean = load_clean_datasets(args.data, args.cache_dir, refresh=args.refresh,
+                                                    verbose=False)
+    manifest = _read_manifest(args.cache_dir)
+    for ash_type in ash_types:
+        sheet = manifest['sheets'][ash_type]
+        print(f"  {ash_type.strip():<6} {sheet['raw_rows']:>5} raw rows -> {sheet['rows']:>5} clean "
+              f"({sheet['file']})")
+    print(f"Cache: {args.cache_dir}/ (cleaning version {manifest['cleaning_version']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,676 @@
+"""
+Concrete Mixture Prediction System
+Headless batch prediction engine shared by the GUI and scripts
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+from prediction_metrics import METRICS
+
+DEFAULT_MODELS_DIR = 'trained_models'
+REGISTRY_FILE = 'model_registry.pkl'
+INDEX_FILE = 'model_index.json'
+ASH_COLUMN = 'ash_type'
+
+# Model classes whose prediction is intercept + coef . x (foldable with the scaler)
+LINEAR_MODEL_CLASSES = {'LinearRegression', 'Ridge', 'Lasso', 'ElasticNet', 'ArrayLinearModel'}
+# Absolute/relative tolerance for checking fused linear outputs against sklearn
+FUSED_RTOL = 1e-7
+FUSED_ATOL = 1e-6
+# Coverage of prediction intervals when none is requested
+DEFAULT_COVERAGE = 0.9
+# A typical mix (the GUI's example mix): the sweep's default base and the reload smoke test
+EXAMPLE_MIX = {
+    'replacement_pct': 20.0,
+    'cement_kg_m3': 320.0,
+    'ash_kg_m3': 80.0,
+    'fine_aggregate_kg_m3': 700.0,
+    'coarse_aggregate_kg_m3': 1100.0,
+    'pozzolan added(Fly Ash) kgm3': 30.0,
+    'superplasticizer_kg_m3': 5.0,
+    'water kg_m3': 180.0,
+    'curing_days': 28.0,
+}
+
+
+def load_registry(models_dir=DEFAULT_MODELS_DIR):
+    """Load the pickled model registry and apply compatibility fixes"""
+    import joblib
+    model_registry = joblib.load(os.path.join(models_dir, REGISTRY_FILE))
+    fix_xgboost_models(model_registry['models'])
+    return model_registry
+
+
+def fix_xgboost_models(models):
+    """Fix XGBoost models for compatibility with newer versions"""
+    try:
+        for ash_type in models:
+            for target_var in models[ash_type]:
+                fix_xgboost_model(models[ash_type][target_var]['model'])
+    except Exception as e:
+        print(f"Warning: Could not fix XGBoost models: {e}")
+
+
+def fix_xgboost_model(model):
+    """Remove deprecated parameters from a single XGBoost model"""
+    if 'XGB' not in model.__class__.__name__:
+        return
+    deprecated_params = ['gpu_id', 'predictor', 'n_gpus']
+    for param in deprecated_params:
+        if hasattr(model, param):
+            try:
+                delattr(model, param)
+            except Exception:
+                pass
+
+
+def base_vector(input_variables, base_inputs):
+    """Base mix as a float array in input_variables order (missing inputs count as 0)"""
+    return np.array([float(base_inputs.get(var, 0.0)) for var in input_variables], dtype=np.float64)
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Hex SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def registry_hash(models_dir=DEFAULT_MODELS_DIR):
+    """Content hash identifying a trained_models version (registry + index)"""
+    digest = hashlib.sha256()
+    for name in (REGISTRY_FILE, INDEX_FILE):
+        path = os.path.join(models_dir, name)
+        if os.path.exists(path):
+            digest.update(name.encode())
+            digest.update(file_sha256(path).encode())
+    return digest.hexdigest()
+
+
+def model_file_name(ash_type, target_var):
+    """File name of a per-model pickle, as written by the training notebook"""
+    return f"{ash_type.replace(' ', '_')}_{target_var.replace(' ', '_').replace('/', '_')}_best.pkl"
+
+
+def build_model_index(model_registry, models_dir=DEFAULT_MODELS_DIR):
+    """Build the metadata index (no fitted models) from a loaded registry"""
+    index = {
+        'ash_types': list(model_registry['ash_types']),
+        'target_variables': list(model_registry['target_variables']),
+        'input_variables': list(model_registry['input_variables']),
+        'selection_policy': model_registry.get('selection_policy'),
+        'models': {},
+    }
+    for ash_type, ash_models in model_registry['models'].items():
+        index['models'][ash_type] = {}
+        for target_var, model_info in ash_models.items():
+            file_name = model_file_name(ash_type, target_var)
+            file_path = os.path.join(models_dir, file_name)
+            index['models'][ash_type][target_var] = {
+                'name': model_info['name'],
+                'model_class': model_info['model'].__class__.__name__,
+                'features': list(model_info['features']),
+                'file': file_name,
+                'file_size': os.path.getsize(file_path) if os.path.exists(file_path) else None,
+            }
+            if model_info.get('calibration') is not None:
+                index['models'][ash_type][target_var]['calibration'] = [
+                    float(r) for r in model_info['calibration']]
+    return index
+
+
+def write_model_index(models_dir=DEFAULT_MODELS_DIR, model_registry=None):
+    """Write model_index.json next to the registry and return the index"""
+    if model_registry is None:
+        import joblib
+        model_registry = joblib.load(os.path.join(models_dir, REGISTRY_FILE))
+    index = build_model_index(model_registry, models_dir)
+    with open(os.path.join(models_dir, INDEX_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    return index
+
+
+def load_model_index(models_dir=DEFAULT_MODELS_DIR):
+    """Read model_index.json, creating it from the full registry on first use"""
+    index_path = os.path.join(models_dir, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return write_model_index(models_dir)
+    with open(index_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_compiled_model(models_dir, meta):
+    """Load the NumPy-only compiled version of an index entry"""
+    from tree_compiler import load_compiled
+    return load_compiled(os.path.join(models_dir, meta['compiled']))
+
+
+def use_compiled_models(model_registry, models_dir=DEFAULT_MODELS_DIR):
+    """Swap registry models for their compiled versions where available"""
+    index = load_model_index(models_dir)
+    for ash_type, ash_models in index['models'].items():
+        for target_var, meta in ash_models.items():
+            if meta.get('compiled') and target_var in model_registry['models'].get(ash_type, {}):
+                compiled = load_compiled_model(models_dir, meta)
+                model_registry['models'][ash_type][target_var].update(
+                    model=compiled['model'], scaler=compiled['scaler'])
+    return model_registry
+
+
+class LazyModelStore:
+    """
+    Loads individual <ASH>_1_<target>_best.pkl files on first use.
+
+    Loaded models are kept in an LRU cache bounded by a model count and/or an
+    approximate memory budget (the pickle size on disk of each model).
+    With use_compiled, models exported by tree_compiler are read from their
+    NumPy .npz instead of the pickle.
+    """
+
+    def __init__(self, models_dir, index, max_models=None, max_bytes=None, use_compiled=False):
+        self.models_dir = models_dir
+        self.index = index
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.use_compiled = use_compiled
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        ash_type, target_var = key
+        return target_var in self.index['models'].get(ash_type, {})
+
+    def loaded(self):
+        """(ash type, target) pairs currently held in memory"""
+        with self._lock:
+            return list(self._cache)
+
+    def get(self, ash_type, target_var):
+        """Return {'name', 'model', 'scaler', 'features'} for a pair, loading it if needed"""
+        key = (ash_type, target_var)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key][0]
+
+            meta = self.index['models'][ash_type][target_var]
+            if self.use_compiled and meta.get('compiled'):
+                model_info = load_compiled_model(self.models_dir, meta)
+            else:
+                import joblib
+                saved = joblib.load(os.path.join(self.models_dir, meta['file']))
+                fix_xgboost_model(saved['model'])
+                model_info = {
+                    'name': saved.get('model_name', meta['name']),
+                    'model': saved['model'],
+                    'scaler': saved['scaler'],
+                    'features': list(saved['features']),
+                }
+            size = meta.get('file_size') or 0
+            self._cache[key] = (model_info, size)
+            self._cached_bytes += size
+            self.loads += 1
+            self._evict()
+            return model_info
+
+    def _evict(self):
+        """Drop least recently used models until within limits (keeps the newest)"""
+        while len(self._cache) > 1 and (
+                (self.max_models is not None and len(self._cache) > self.max_models) or
+                (self.max_bytes is not None and self._cached_bytes > self.max_bytes)):
+            _, (_, size) = self._cache.popitem(last=False)
+            self._cached_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Release every loaded model"""
+        with self._lock:
+            self._cache.clear()
+            self._cached_bytes = 0
+
+
+def fold_linear_model(model, scaler, feature_idx, n_inputs):
+    """
+    Fold a StandardScaler into a linear model.
+
+    Returns (weights, intercept) over all n_inputs raw input columns such that
+    X @ weights + intercept == model.predict(scaler.transform(X[:, feature_idx])),
+    or None if the pair is not a single-output linear model behind a StandardScaler.
+    """
+    if (model.__class__.__name__ not in LINEAR_MODEL_CLASSES or
+            scaler.__class__.__name__ not in ('StandardScaler', 'ArrayScaler')):
+        return None
+    coef = np.asarray(model.coef_, dtype=np.float64)
+    if coef.ndim > 1 and coef.shape[0] != 1:
+        return None
+    coef = coef.reshape(-1)
+    mean = getattr(scaler, 'mean_', None)
+    scale = getattr(scaler, 'scale_', None)
+    mean = np.zeros_like(coef) if mean is None else np.asarray(mean, dtype=np.float64)
+    scale = np.ones_like(coef) if scale is None else np.asarray(scale, dtype=np.float64)
+
+    folded = coef / scale
+    weights = np.zeros(n_inputs)
+    weights[feature_idx] = folded
+    intercept = float(np.asarray(model.intercept_, dtype=np.float64).reshape(-1)[0]) - float(folded @ mean)
+    return weights, intercept
+
+
+def conformal_half_width(residuals, coverage=DEFAULT_COVERAGE):
+    """
+    Split-conformal interval half-width from sorted absolute calibration residuals.
+
+    This is the ceil((n + 1) * coverage)-th smallest residual: prediction
+    +/- it covers a new mix with probability >= coverage if the mix is
+    exchangeable with the calibration rows. It is inf when n is too small
+    for that coverage.
+    """
+    if not 0 < coverage < 1:
+        raise ValueError(f"Coverage must be between 0 and 1, got {coverage}")
+    n = len(residuals)
+    k = int(np.ceil((n + 1) * coverage))
+    return float(residuals[k - 1]) if k <= n else float('inf')
+
+
+def valid_rows(X):
+    """Rows whose inputs are all finite and non-negative (the GUI's validate_inputs rule)"""
+    X = np.asarray(X, dtype=np.float64)
+    return np.isfinite(X).all(axis=1) & (X >= 0).all(axis=1)
+
+
+def ash_display_name(ash_type):
+    """Short display name of an ash type, e.g. 'POFA 1' -> 'POFA'"""
+    return ash_type.replace(' 1', '').strip()
+
+
+class Predictor:
+    """
+    Vectorized prediction engine over a trained model registry.
+
+    Rows are grouped by ash type so that every (ash type, target) pair costs
+    exactly one scaler.transform and one model.predict call per batch.
+    With a model_store, model_registry only needs metadata (see
+    model_index.json) and fitted models are fetched from the store on use.
+
+    With fuse_linear, every linear model of an ash type is folded together
+    with its scaler into one (inputs x targets) matrix, so all linear targets
+    of a group come from a single matmul.
+
+    A registry with a 'pooled' model (pooled_models.py) is served by it
+    instead: a whole mixed-ash batch costs one call per pooled member.
+
+    Models trained with calibration residuals also give split-conformal
+    prediction intervals (predict_interval), at the cost of a point
+    prediction plus one addition per value.
+    """
+
+    def __init__(self, model_registry, model_store=None, fuse_linear=True):
+        self.ash_types = list(model_registry['ash_types'])
+        self.target_variables = list(model_registry['target_variables'])
+        self.input_variables = list(model_registry['input_variables'])
+        self.models = model_registry['models']
+        self.model_store = model_store
+        self.models_dir = None
+        # from_directory() arguments, so the same kind of predictor can be reloaded
+        self.load_options = {}
+        self.pooled = model_registry.get('pooled')
+        self.fuse_linear = fuse_linear and self.pooled is None
+        self._fused = {}
+        self._half_widths = {}
+
+        # Accept both registry keys ('POFA 1', ' GSA 1') and display names ('GSA')
+        self._ash_lookup = {}
+        for ash_type in self.ash_types:
+            self._ash_lookup[ash_type] = ash_type
+            self._ash_lookup[ash_type.strip()] = ash_type
+            self._ash_lookup[ash_display_name(ash_type)] = ash_type
+
+        # Column positions of each model's features, resolved once at load time
+        self._entries = {}
+        for ash_type in self.ash_types:
+            for target_var, model_info in self.models.get(ash_type, {}).items():
+                self._entries[(ash_type, target_var)] = self._make_entry(model_info)
+        if self.pooled is not None:
+            self._pooled_codes = {ash_type: k for k, ash_type in enumerate(self.pooled.ash_types)}
+            for ash_type in self.pooled.ash_types:
+                for target_var in self.pooled.target_variables:
+                    self._entries[(ash_type, target_var)] = self._make_entry({
+                        'name': self.pooled.model_name(target_var),
+                        'model_class': 'PooledModel',
+                        'model': self.pooled,
+                        'features': self.pooled.ash_features[ash_type],
+                    })
+
+        # Compile fused linear models now unless models are loaded lazily
+        if self.fuse_linear and model_store is None:
+            for ash_type in self.ash_types:
+                self._fused_linear(ash_type)
+
+    @classmethod
+    def from_directory(cls, models_dir=DEFAULT_MODELS_DIR, lazy=False, max_models=None, max_bytes=None,
+                       fuse_linear=True, compiled=False, arrays=False, pooled=False):
+        """
+        Create a predictor from a trained_models directory.
+
+        lazy=True reads only model_index.json at startup and loads each
+        per-model pickle on first use, keeping at most max_models models
+        and/or max_bytes of pickled model data in memory.
+        compiled=True evaluates tree models from their tree_compiler export
+        (NumPy only) wherever one exists.
+        arrays=True memory-maps the pickle-free registry written by
+        array_registry.py instead (lazy and compiled do not apply).
+        pooled=True serves the pooled multi-ash models of pooled_models.py
+        (none of the other options apply).
+        """
+        if pooled:
+            from pooled_models import load_pooled
+            predictor = cls(load_pooled(models_dir))
+        elif arrays:
+            from array_registry import load_array_registry
+            predictor = cls(load_array_registry(models_dir), fuse_linear=fuse_linear)
+        elif not lazy:
+            model_registry = load_registry(models_dir)
+            if compiled:
+                use_compiled_models(model_registry, models_dir)
+            predictor = cls(model_registry, fuse_linear=fuse_linear)
+        else:
+            index = load_model_index(models_dir)
+            store = LazyModelStore(models_dir, index, max_models=max_models, max_bytes=max_bytes,
+                                   use_compiled=compiled)
+            predictor = cls(index, model_store=store, fuse_linear=fuse_linear)
+        predictor.models_dir = models_dir
+        predictor.load_options = {'lazy': lazy, 'max_models': max_models, 'max_bytes': max_bytes,
+                                  'fuse_linear': fuse_linear, 'compiled': compiled, 'arrays': arrays,
+                                  'pooled': pooled}
+        return predictor
+
+    def _make_entry(self, model_info):
+        """Bundle a registry model with its feature index array"""
+        model = model_info.get('model')
+        missing = [f for f in model_info['features'] if f not in self.input_variables]
+        if missing:
+            raise ValueError(f"Model {model_info['name']} uses features {missing} "
+                             f"that are not input variables")
+        return {
+            'name': model_info['name'],
+            'model_class': model_info.get('model_class') or model.__class__.__name__,
+            'model': model,
+            'scaler': model_info.get('scaler'),
+            'features': list(model_info['features']),
+            'feature_idx': np.array([self.input_variables.index(f) for f in model_info['features']],
+                                    dtype=np.intp),
+            'calibration': (np.asarray(model_info['calibration'], dtype=np.float64)
+                            if model_info.get('calibration') is not None else None),
+        }
+
+    def resolve_ash_type(self, ash_type):
+        """Map a registry key or display name to the registry key"""
+        try:
+            return self._ash_lookup[ash_type]
+        except KeyError:
+            raise KeyError(f"Unknown ash type: {ash_type!r}") from None
+
+    def has_models(self, ash_type):
+        """True if at least one target model exists for this ash type"""
+        ash_type = self.resolve_ash_type(ash_type)
+        return any((ash_type, t) in self._entries for t in self.target_variables)
+
+    def available_targets(self, ash_type):
+        """Target variables that have a trained model for this ash type"""
+        ash_type = self.resolve_ash_type(ash_type)
+        return [t for t in self.target_variables if (ash_type, t) in self._entries]
+
+    def preload(self, ash_type):
+        """Load (and fuse) every model of an ash type ahead of its first prediction"""
+        ash_type = self.resolve_ash_type(ash_type)
+        if self.fuse_linear:
+            self._fused_linear(ash_type)
+        for target_var in self.available_targets(ash_type):
+            self._model_entry(ash_type, target_var)
+
+    def model_name(self, ash_type, target_var):
+        """Name of the best model used for an (ash type, target) pair"""
+        return self._entries[(self.resolve_ash_type(ash_type), target_var)]['name']
+
+    def model_features(self, ash_type, target_var):
+        """Input features of the model used for an (ash type, target) pair"""
+        return list(self._entries[(self.resolve_ash_type(ash_type), target_var)]['features'])
+
+    def as_matrix(self, X):
+        """Convert an (N x inputs) array or DataFrame to a float64 matrix"""
+        if hasattr(X, 'columns'):
+            missing = [c for c in self.input_variables if c not in X.columns]
+            if missing:
+                raise ValueError(f"Missing input columns: {missing}")
+            X = X[self.input_variables].to_numpy(dtype=np.float64)
+        else:
+            X = np.asarray(X, dtype=np.float64)
+            if X.ndim == 1:
+                X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != len(self.input_variables):
+            raise ValueError(f"Expected inputs of shape (N, {len(self.input_variables)}), "
+                             f"got {X.shape}")
+        return X
+
+    def group_rows(self, ash_types, n_rows):
+        """Yield (ash_type, row_indices) groups; row_indices is None for all rows"""
+        if isinstance(ash_types, str):
+            yield self.resolve_ash_type(ash_types), None
+            return
+        ash_types = np.asarray(ash_types, dtype=object)
+        if ash_types.shape != (n_rows,):
+            raise ValueError(f"Expected {n_rows} ash types, got {ash_types.shape[0]}")
+        labels, inverse = np.unique(ash_types.astype(str), return_inverse=True)
+        if len(labels) == 1:
+            yield self.resolve_ash_type(labels[0]), None
+            return
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(labels) + 1))
+        for k, label in enumerate(labels):
+            yield self.resolve_ash_type(label), order[bounds[k]:bounds[k + 1]]
+
+    def predict(self, X, ash_types=None, targets=None):
+        """
+        Predict every requested target for a batch of mixes.
+
+        X is an (N x inputs) array or DataFrame ordered like input_variables.
+        ash_types is a single ash type, a length-N sequence, or None to read
+        the 'ash_type' column of a DataFrame. Returns {target: ndarray(N)}
+        with NaN where no model exists for a row's ash type.
+        """
+        with METRICS.trace('predict'):
+            return self._predict(X, ash_types, targets)[0]
+
+    def _predict(self, X, ash_types, targets):
+        """(predictions, [(ash_type, row_indices)] groups of the batch)"""
+        with METRICS.stage('assemble'):
+            if ash_types is None:
+                if not hasattr(X, 'columns') or ASH_COLUMN not in X.columns:
+                    raise ValueError(f"ash_types is required unless X has an '{ASH_COLUMN}' column")
+                ash_types = X[ASH_COLUMN].to_numpy()
+            X = self.as_matrix(X)
+            targets = self.target_variables if targets is None else list(targets)
+            groups = list(self.group_rows(ash_types, X.shape[0]))
+
+        results = {t: np.full(X.shape[0], np.nan) for t in targets}
+        if self.pooled is not None:
+            codes = np.empty(X.shape[0], dtype=np.intp)
+            for ash_type, rows in groups:
+                codes[slice(None) if rows is None else rows] = self._pooled_codes[ash_type]
+            with METRICS.stage('model'):
+                results.update(self.pooled.predict(X, codes, targets))
+            return results, groups
+        for ash_type, rows in groups:
+            X_ash = X if rows is None else X[rows]
+            for target_var, prediction in self._predict_group(ash_type, X_ash, targets):
+                if rows is None:
+                    results[target_var][:] = prediction
+                else:
+                    results[target_var][rows] = prediction
+        return results, groups
+
+    def _predict_group(self, ash_type, X_ash, targets):
+        """Yield (target, predictions) for one ash type's rows"""
+        remaining = targets
+        fused = self._fused_linear(ash_type) if self.fuse_linear else None
+        if fused is not None:
+            columns = [fused['targets'].index(t) for t in targets if t in fused['targets']]
+            if columns:
+                with METRICS.stage('fused_linear') as timer:
+                    Y = X_ash @ fused['weights'][:, columns] + fused['intercepts'][columns]
+                if METRICS.enabled:
+                    # One matmul serves every fused target; each is charged its full time
+                    for k in columns:
+                        METRICS.record_model(ash_type, fused['targets'][k],
+                                             self.model_name(ash_type, fused['targets'][k]),
+                                             X_ash.shape[0], timer.elapsed)
+                for j, k in enumerate(columns):
+                    yield fused['targets'][k], Y[:, j]
+            remaining = [t for t in targets if t not in fused['targets']]
+
+        for target_var in remaining:
+            entry = self._model_entry(ash_type, target_var)
+            if entry is not None:
+                start = time.perf_counter() if METRICS.enabled else None
+                prediction = self._predict_entry(entry, X_ash)
+                if start is not None:
+                    METRICS.record_model(ash_type, target_var, entry['name'], X_ash.shape[0],
+                                         time.perf_counter() - start)
+                yield target_var, prediction
+
+    def predict_one(self, ash_type, values, targets=None):
+        """Predict a single mix given {input_variable: value}; missing inputs are 0"""
+        x = np.array([[float(values.get(var, 0.0)) for var in self.input_variables]])
+        ash_type = self.resolve_ash_type(ash_type)
+        targets = self.available_targets(ash_type) if targets is None else targets
+        predictions = self.predict(x, ash_type, targets)
+        return {t: float(p[0]) for t, p in predictions.items() if not np.isnan(p[0])}
+
+    def interval_half_width(self, ash_type, target_var, coverage=DEFAULT_COVERAGE):
+        """
+        Conformal half-width of an (ash type, target) pair's intervals.
+
+        NaN if its model has no calibration residuals (trained before they
+        were stored, or pooled); inf if it has too few for the coverage.
+        """
+        ash_type = self.resolve_ash_type(ash_type)
+        key = (ash_type, target_var, coverage)
+        if key not in self._half_widths:
+            if not 0 < coverage < 1:
+                raise ValueError(f"Coverage must be between 0 and 1, got {coverage}")
+            entry = self._entries.get((ash_type, target_var))
+            self._half_widths[key] = (float('nan') if entry is None or entry['calibration'] is None
+                                      else conformal_half_width(entry['calibration'], coverage))
+        return self._half_widths[key]
+
+    def predict_interval(self, X, ash_types=None, targets=None, coverage=DEFAULT_COVERAGE):
+        """
+        Predictions with split-conformal intervals at the given coverage.
+
+        Takes the same arguments as predict(). Returns (predictions, lower,
+        upper), each {target: ndarray(N)}. Every model has one half-width
+        per coverage, cached on first use, so a batch costs one predict()
+        plus one subtraction and one addition.
+        """
+        with METRICS.trace('predict'):
+            predictions, groups = self._predict(X, ash_types, targets)
+        if len(groups) == 1:
+            ash_type = groups[0][0]
+            half_widths = {t: self.interval_half_width(ash_type, t, coverage) for t in predictions}
+        else:
+            half_widths = {t: np.empty(len(p)) for t, p in predictions.items()}
+            for ash_type, rows in groups:
+                for target_var, width in half_widths.items():
+                    width[rows] = self.interval_half_width(ash_type, target_var, coverage)
+        lower = {t: p - half_widths[t] for t, p in predictions.items()}
+        upper = {t: p + half_widths[t] for t, p in predictions.items()}
+        return predictions, lower, upper
+
+    def predict_one_interval(self, ash_type, values, targets=None, coverage=DEFAULT_COVERAGE):
+        """predict_one() with intervals: {target: (prediction, lower, upper)}"""
+        ash_type = self.resolve_ash_type(ash_type)
+        predictions = self.predict_one(ash_type, values, targets)
+        return {t: (p, p - self.interval_half_width(ash_type, t, coverage),
+                    p + self.interval_half_width(ash_type, t, coverage)) for t, p in predictions.items()}
+
+    def _model_entry(self, ash_type, target_var):
+        """Entry with its fitted model and scaler, fetching lazily loaded pairs"""
+        entry = self._entries.get((ash_type, target_var))
+        if entry is None or entry['model'] is not None:
+            return entry
+        with METRICS.stage('load_model'):
+            model_info = self.model_store.get(ash_type, target_var)
+        return dict(entry, model=model_info['model'], scaler=model_info['scaler'])
+
+    def _fused_linear(self, ash_type):
+        """Stacked folded weights of an ash type's linear models, compiled on first use"""
+        if ash_type in self._fused:
+            return self._fused[ash_type]
+
+        targets, weights, intercepts = [], [], []
+        for target_var in self.target_variables:
+            entry = self._entries.get((ash_type, target_var))
+            if entry is None or entry['model_class'] not in LINEAR_MODEL_CLASSES:
+                continue
+            entry = self._model_entry(ash_type, target_var)
+            folded = fold_linear_model(entry['model'], entry['scaler'], entry['feature_idx'],
+                                       len(self.input_variables))
+            if folded is None or not self._check_folded(entry, *folded):
+                continue
+            targets.append(target_var)
+            weights.append(folded[0])
+            intercepts.append(folded[1])
+
+        fused = None
+        if targets:
+            fused = {
+                'targets': targets,
+                'weights': np.column_stack(weights),
+                'intercepts': np.array(intercepts),
+            }
+        self._fused[ash_type] = fused
+        return fused
+
+    def _check_folded(self, entry, weights, intercept):
+        """Compare folded weights with sklearn on probe mixes around the training mean"""
+        scaler = entry['scaler']
+        rng = np.random.default_rng(0)
+        X_probe = np.zeros((64, len(self.input_variables)))
+        n_features = len(entry['feature_idx'])
+        mean = getattr(scaler, 'mean_', None)
+        scale = getattr(scaler, 'scale_', None)
+        mean = np.zeros(n_features) if mean is None else mean
+        scale = np.ones(n_features) if scale is None else scale
+        X_probe[:, entry['feature_idx']] = mean + scale * rng.standard_normal((64, n_features)) * 3
+        expected = self._predict_entry(entry, X_probe)
+        fused = X_probe @ weights + intercept
+        if np.allclose(fused, expected, rtol=FUSED_RTOL, atol=FUSED_ATOL):
+            return True
+        warnings.warn(f"Fused linear model disagrees with sklearn for {entry['name']} "
+                      f"(max error {np.max(np.abs(fused - expected)):.3g}); using sklearn path",
+                      RuntimeWarning)
+        return False
+
+    def _predict_entry(self, entry, X_ash):
+        """One scaler.transform and one model.predict for a whole ash-type group"""
+        with METRICS.stage('assemble'):
+            X_model = X_ash[:, entry['feature_idx']]
+        with METRICS.stage('scale'), warnings.catch_warnings():
+            # Scalers were fitted on DataFrames; columns are already in feature order
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            X_scaled = entry['scaler'].transform(X_model)
+        with METRICS.stage('model'):
+            return np.asarray(entry['model'].predict(X_scaled), dtype=np.float64).reshape(-1)
@@ -5,11 +5,21 @@ Interactive GUI for predicting Cost, Compressive Strength, and CO2 Emissions
 
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import joblib
-import numpy as np
-import pandas as pd
 import os
+import queue
 import sys
+import threading
+
+from concrete_predictor import Predictor, load_model_index
+from prediction_cache import PredictionCache
+from prediction_metrics import METRICS
+
+# How often the Tk loop checks the background model loader (ms)
+LOADER_POLL_MS = 50
+# How often the Tk loop checks for finished predictions while one is pending (ms)
+RESULT_POLL_MS = 10
+# Quiet time after the last edit before live mode re-predicts (ms)
+LIVE_DEBOUNCE_MS = 300
 
 class ConcretePredictorGUI:
     def __init__(self, root):
@@ -39,14 +49,11 @@ class ConcretePredictorGUI:
                     f"Please ensure model_registry.pkl is in the trained_models folder.")
                 sys.exit(1)
             
-            self.model_registry = joblib.load(model_path)
-            self.ash_types = self.model_registry['ash_types']
-            self.target_variables = self.model_registry['target_variables']
-            self.input_variables = self.model_registry['input_variables']
-            self.models = self.model_registry['models']
-            
-            # Fix XGBoost compatibility issues
-            self._fix_xgboost_models()
+            # Only the metadata index is read here; models load in the background
+            index = load_model_index('trained_models')
+            self.ash_types = list(index['ash_types'])
+            self.target_variables = list(index['target_variables'])
+            self.input_variables = list(index['input_variables'])
         except Exception as e:
             messagebox.showerror("Error", 
                 f"Failed to load models: {str(e)}\n\n"
@@ -54,32 +61,29 @@ class ConcretePredictorGUI:
                 f"Please ensure 'trained_models/model_registry.pkl' exists.")
             sys.exit(1)
         
+        # Set by the background loader (see start_model_loader)
+        self.predictor = None
+        self.prediction_cache = None
+        self.ready_ash_types = set()
+        self._loader_events = queue.Queue()
+        
+        # Predictions run on a worker thread; only the newest request is scored
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._request_seq = 0
+        self._answered_seq = 0
+        self._polling_results = False
+        self._live_after_id = None
+        threading.Thread(target=self._prediction_worker, daemon=True).start()
+        
         # Variables
         self.selected_ash_type = tk.StringVar()
         self.input_values = {}
+        self.live_mode = tk.BooleanVar(value=False)
         
         # Setup GUI
         self.setup_gui()
-        
-    def _fix_xgboost_models(self):
-        """Fix XGBoost models for compatibility with newer versions"""
-        try:
-            import xgboost
-            for ash_type in self.models:
-                for target_var in self.models[ash_type]:
-                    model = self.models[ash_type][target_var]['model']
-                    # Check if it's an XGBoost model
-                    if hasattr(model, '__class__') and 'XGB' in model.__class__.__name__:
-                        # Remove deprecated parameters
-                        deprecated_params = ['gpu_id', 'predictor', 'n_gpus']
-                        for param in deprecated_params:
-                            if hasattr(model, param):
-                                try:
-                                    delattr(model, param)
-                                except:
-                                    pass
-        except Exception as e:
-            print(f"Warning: Could not fix XGBoost models: {e}")
+        self.start_model_loader()
         
     def setup_gui(self):
         """Setup the main GUI layout"""
@@ -125,6 +129,7 @@ class ConcretePredictorGUI:
             btn = ttk.Button(button_frame, text=ash_display, 
                            command=lambda a=ash_type: self.select_ash_type(a),
                            width=10)
+            btn.state(['disabled'])  # enabled once this ash type's models are loaded
             btn.grid(row=i//3, column=i%3, padx=2, pady=2, sticky=(tk.W, tk.E))
             self.ash_buttons.append(btn)
             button_frame.columnconfigure(i%3, weight=1)
@@ -190,6 +195,7 @@ class ConcretePredictorGUI:
                 
                 # Entry - smaller
                 entry_var = tk.StringVar(value="0")
+                entry_var.trace_add('write', self.on_input_changed)
                 self.input_values[var] = entry_var
                 entry = ttk.Entry(scrollable_frame, textvariable=entry_var, width=20)
                 entry.grid(row=row, column=1, sticky=(tk.W, tk.E), pady=2)
@@ -209,6 +215,7 @@ class ConcretePredictorGUI:
         button_panel.columnconfigure(0, weight=1)
         button_panel.columnconfigure(1, weight=1)
         button_panel.columnconfigure(2, weight=1)
+        button_panel.columnconfigure(3, weight=1)
         
         predict_btn = ttk.Button(button_panel, text="Predict", command=self.predict, style='Accent.TButton')
         predict_btn.grid(row=0, column=0, padx=2, sticky=(tk.W, tk.E))
@@ -219,6 +226,13 @@ class ConcretePredictorGUI:
         example_btn = ttk.Button(button_panel, text="Load Example", command=self.load_example)
         example_btn.grid(row=0, column=2, padx=2, sticky=(tk.W, tk.E))
         
+        sweep_btn = ttk.Button(button_panel, text="Sweep...", command=self.open_sweep_panel)
+        sweep_btn.grid(row=0, column=3, padx=2, sticky=(tk.W, tk.E))
+        
+        live_check = ttk.Checkbutton(button_panel, text="Live prediction (update while typing)",
+                                     variable=self.live_mode, command=self.on_input_changed)
+        live_check.grid(row=1, column=0, columnspan=4, sticky=tk.W, pady=(3, 0))
+        
         # Right Panel - Results Section - more compact
         right_panel = ttk.LabelFrame(main_frame, text="Prediction Results", padding="5")
         right_panel.grid(row=2, column=1, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(3, 0))
@@ -232,12 +246,62 @@ class ConcretePredictorGUI:
         self.results_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         # Status Bar - smaller
-        self.status_bar = ttk.Label(main_frame, text="Ready", relief=tk.SUNKEN, anchor=tk.W, font=('Arial', 8))
+        self.status_bar = ttk.Label(main_frame, text="Loading models...", relief=tk.SUNKEN, anchor=tk.W, font=('Arial', 8))
         self.status_bar.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
         
         # Initial message
         self.show_welcome_message()
         
+    def start_model_loader(self):
+        """Open the predictor and load each ash type's models on a background thread"""
+        threading.Thread(target=self._load_models, daemon=True).start()
+        self.root.after(LOADER_POLL_MS, self._poll_loader)
+        
+    def _load_models(self):
+        """Loader thread body; it never touches Tk widgets, it only posts events"""
+        try:
+            # No max_models: every ash type is preloaded below, and a capped
+            # store would evict the early ones before their buttons are used
+            predictor = Predictor.from_directory('trained_models', lazy=True, compiled=True)
+            self._loader_events.put(('predictor', predictor))
+            for ash_type in self.ash_types:
+                predictor.preload(ash_type)
+                self._loader_events.put(('ready', ash_type))
+        except Exception as e:
+            self._loader_events.put(('error', e))
+            return
+        self._loader_events.put(('done', None))
+        
+    def _poll_loader(self):
+        """Apply loader events on the Tk thread"""
+        while True:
+            try:
+                kind, value = self._loader_events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'predictor':
+                self.predictor = value
+                # Repeated mixes (e.g. the example mix) are answered from memory; exact keys
+                # (decimals=None), so results match predict_one()
+                self.prediction_cache = PredictionCache(value, decimals=None)
+            elif kind == 'ready':
+                self.ready_ash_types.add(value)
+                self.ash_buttons[self.ash_types.index(value)].state(['!disabled'])
+                self.status_bar.config(text=f"Loading models... "
+                                            f"{len(self.ready_ash_types)}/{len(self.ash_types)} ash types ready")
+                if value == self.selected_ash_type.get():
+                    self.on_input_changed()
+            elif kind == 'error':
+                messagebox.showerror("Error", 
+                    f"Failed to load models: {str(value)}\n\n"
+                    f"Current directory: {os.getcwd()}\n\n"
+                    f"Please ensure 'trained_models/model_registry.pkl' exists.")
+                sys.exit(1)
+            else:
+                self.status_bar.config(text="Ready")
+                return
+        self.root.after(LOADER_POLL_MS, self._poll_loader)
+        
     def create_tooltip(self, widget, text):
         """Create tooltip for widget"""
         def on_enter(event):
@@ -272,48 +336,141 @@ class ConcretePredictorGUI:
                 break
         
         self.status_bar.config(text=f"Selected: {ash_display}")
+        self.on_input_changed()
         
-    def validate_inputs(self):
+    def validate_inputs(self, quiet=False):
         """Validate all input values"""
         if not self.selected_ash_type.get():
-            messagebox.showerror("Error", "Please select an ash type.")
-            return False
+            return self.report_error("Please select an ash type.", quiet)
         
         try:
-            values = []
             for var in self.input_variables:
                 if var in self.input_values:
                     val = float(self.input_values[var].get())
                     if val < 0:
-                        messagebox.showerror("Error", f"{var} cannot be negative.")
-                        return False
-                    values.append(val)
+                        return self.report_error(f"{var} cannot be negative.", quiet)
             return True
         except ValueError:
-            messagebox.showerror("Error", "All input values must be valid numbers.")
-            return False
+            return self.report_error("All input values must be valid numbers.", quiet)
     
-    def predict(self):
-        """Make predictions using the trained models"""
-        if not self.validate_inputs():
-            return
+    def report_error(self, message, quiet=False):
+        """Show an input problem (in the status bar when quiet, e.g. while typing); returns False"""
+        if quiet:
+            self.status_bar.config(text=message)
+        else:
+            messagebox.showerror("Error", message)
+        return False
+    
+    def collect_inputs(self, quiet=False):
+        """Validated (ash_type, {input: value}) ready to predict, or None"""
+        if not self.validate_inputs(quiet):
+            return None
         
         ash_type = self.selected_ash_type.get()
         
+        if ash_type not in self.ready_ash_types:
+            message = f"Models for {ash_type.replace(' 1', '')} are still loading."
+            if quiet:
+                self.status_bar.config(text=message)
+            else:
+                messagebox.showinfo("Loading", message)
+            return None
+        
         # Check if models exist for this ash type
-        if ash_type not in self.models or not self.models[ash_type]:
-            messagebox.showerror("Error", f"No models available for {ash_type.replace(' 1', '')}")
-            return
+        if not self.predictor.has_models(ash_type):
+            self.report_error(f"No models available for {ash_type.replace(' 1', '')}", quiet)
+            return None
         
         # Prepare input data
-        X_input = []
+        input_values = {}
         for var in self.input_variables:
             if var in self.input_values:
-                X_input.append(float(self.input_values[var].get()))
-            else:
-                X_input.append(0.0)
-        X_input = np.array(X_input).reshape(1, -1)
+                input_values[var] = float(self.input_values[var].get())
+        return ash_type, input_values
+    
+    def predict(self):
+        """Make predictions using the trained models (scored on the worker thread)"""
+        self._start_prediction(quiet=False)
+    
+    def _start_prediction(self, quiet):
+        """Validate on the Tk thread and submit; one trace follows the request to its render"""
+        trace = METRICS.open_trace('gui')
+        with trace:
+            with METRICS.stage('validate'):
+                request = self.collect_inputs(quiet=quiet)
+        if request is not None:
+            self.submit_prediction(*request, trace=trace)
+    
+    def on_input_changed(self, *args):
+        """In live mode, re-predict once edits pause for LIVE_DEBOUNCE_MS"""
+        if self._live_after_id is not None:
+            self.root.after_cancel(self._live_after_id)
+            self._live_after_id = None
+        if self.live_mode.get():
+            self._live_after_id = self.root.after(LIVE_DEBOUNCE_MS, self._live_predict)
+    
+    def _live_predict(self):
+        self._live_after_id = None
+        self._start_prediction(quiet=True)
+    
+    def submit_prediction(self, ash_type, input_values, trace=None):
+        """Queue a prediction; any request still waiting is superseded by this one"""
+        self._request_seq += 1
+        self._requests.put((self._request_seq, ash_type, input_values, trace or METRICS.open_trace('gui')))
+        self.status_bar.config(text=f"Predicting {ash_type.replace(' 1', '')}...")
+        if not self._polling_results:
+            self._polling_results = True
+            self.root.after(RESULT_POLL_MS, self._poll_results)
+    
+    def _prediction_worker(self):
+        """Worker thread body; it never touches Tk widgets, it only posts results"""
+        while True:
+            seq, ash_type, input_values, trace = self._requests.get()
+            if seq != self._request_seq:
+                continue  # stale: a newer input set has been submitted
+            try:
+                with trace:
+                    predictions = self.prediction_cache.predict_one(ash_type, input_values)
+                self._results.put((seq, ash_type, input_values, predictions, None, trace))
+            except Exception as e:
+                self._results.put((seq, ash_type, input_values, None, e, trace))
+    
+    def _poll_results(self):
+        """Display the newest finished prediction on the Tk thread"""
+        latest = None
+        while True:
+            try:
+                latest = self._results.get_nowait()
+            except queue.Empty:
+                break
+        if latest is not None and latest[0] == self._request_seq:
+            self._answered_seq = latest[0]
+            self.show_prediction(*latest[1:])
+        
+        if self._answered_seq < self._request_seq:
+            self.root.after(RESULT_POLL_MS, self._poll_results)
+        else:
+            self._polling_results = False
+    
+    def show_prediction(self, ash_type, input_values, predictions, error, trace):
+        """Render a finished prediction and report it in the status bar"""
+        if error is not None:
+            self.report_error(f"Prediction failed: {error}", quiet=self.live_mode.get())
+            return
+        
+        with trace:
+            with METRICS.stage('render'):
+                self.show_results(ash_type, input_values, predictions)
+        trace.finish()
         
+        status = f"Prediction completed for {ash_type.replace(' 1', '')}"
+        if METRICS.enabled:
+            # Timing breakdown of this prediction (CONCRETE_METRICS=1)
+            status += f"  |  {METRICS.last_breakdown()}"
+        self.status_bar.config(text=status)
+        
+    def show_results(self, ash_type, input_values, predictions):
+        """Write the prediction report to the results area"""
         # Clear results
         self.results_text.delete(1.0, tk.END)
         
@@ -331,9 +488,9 @@ class ConcretePredictorGUI:
         self.results_text.insert(tk.END, "-"*55 + "\n")
         
         for var in self.input_variables:
-            value = self.input_values[var].get()
+            value = input_values.get(var, 0.0)
             display_name = var.replace('_', ' ').replace('kg m3', '(kg/m³)').title()
-            self.results_text.insert(tk.END, f"  {display_name:<35} {value:>15}\n")
+            self.results_text.insert(tk.END, f"  {display_name:<35} {value:>15g}\n")
         
         self.results_text.insert(tk.END, "\n" + "="*55 + "\n\n")
         
@@ -341,30 +498,10 @@ class ConcretePredictorGUI:
         self.results_text.insert(tk.END, "PREDICTED OUTPUT:\n")
         self.results_text.insert(tk.END, "-"*55 + "\n\n")
         
-        predictions = {}
         for target_var in self.target_variables:
-            if target_var in self.models[ash_type]:
-                model_info = self.models[ash_type][target_var]
-                model = model_info['model']
-                scaler = model_info['scaler']
-                model_name = model_info['name']
-                
-                # Get features used by this model
-                model_features = model_info['features']
-                
-                # Prepare input with correct features
-                X_model = []
-                for feat in model_features:
-                    idx = self.input_variables.index(feat)
-                    X_model.append(X_input[0, idx])
-                
-                # Convert to DataFrame with proper feature names to avoid warnings
-                X_model_df = pd.DataFrame([X_model], columns=model_features)
-                
-                # Scale and predict
-                X_scaled = scaler.transform(X_model_df)
-                prediction = model.predict(X_scaled)[0]
-                predictions[target_var] = prediction
+            if target_var in predictions:
+                prediction = predictions[target_var]
+                model_name = self.predictor.model_name(ash_type, target_var)
                 
                 # Format output
                 if 'cost' in target_var.lower():
@@ -392,8 +529,6 @@ class ConcretePredictorGUI:
             self.results_text.insert(tk.END, f"  ✓ Best performing models used\n")
             self.results_text.insert(tk.END, "="*55 + "\n")
         
-        self.status_bar.config(text=f"Prediction completed for {ash_type.replace(' 1', '')}")
-        
     def clear_inputs(self):
         """Clear all input fields"""
         for var in self.input_values:
@@ -434,6 +569,10 @@ class ConcretePredictorGUI:
         self.status_bar.config(text="Example values loaded")
         messagebox.showinfo("Example Loaded", "Example concrete mixture parameters loaded.\nClick 'Predict' to see results.")
     
+    def open_sweep_panel(self):
+        """Open the parameter sweep window for the current mix"""
+        SweepPanel(self)
+    
     def show_welcome_message(self):
         """Show welcome message in results area"""
         self.results_text.insert(tk.END, "="*55 + "\n")
@@ -454,6 +593,99 @@ class ConcretePredictorGUI:
         
         self.results_text.insert(tk.END, "\n" + "="*55 + "\n")
 
+class SweepPanel:
+    """Window that varies one or two inputs around the current mix and plots every target"""
+    
+    NO_VARIABLE = '(none)'
+    
+    def __init__(self, app):
+        # Deferred so the main window does not pay for matplotlib at startup
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+        from parameter_sweep import DEFAULT_POINTS, SWEEP_RANGES
+        
+        self.app = app
+        self.ranges = SWEEP_RANGES
+        self.window = tk.Toplevel(app.root)
+        self.window.title("Parameter Sweep")
+        self.window.geometry("900x700")
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(1, weight=1)
+        
+        controls = ttk.Frame(self.window, padding="5")
+        controls.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        
+        self.axis_vars = []
+        for row, (label, default) in enumerate((("Vary:", 'curing_days'), ("and:", self.NO_VARIABLE))):
+            ttk.Label(controls, text=label, font=('Arial', 9, 'bold')).grid(row=row, column=0, sticky=tk.W)
+            var = tk.StringVar(value=default)
+            lo, hi = tk.StringVar(), tk.StringVar()
+            choices = app.input_variables if row == 0 else [self.NO_VARIABLE] + app.input_variables
+            combo = ttk.Combobox(controls, textvariable=var, values=choices, state='readonly', width=28)
+            combo.grid(row=row, column=1, padx=3, pady=2)
+            combo.bind('<<ComboboxSelected>>', lambda e, v=var, l=lo, h=hi: self.fill_range(v, l, h))
+            ttk.Label(controls, text="from").grid(row=row, column=2)
+            ttk.Entry(controls, textvariable=lo, width=8).grid(row=row, column=3, padx=2)
+            ttk.Label(controls, text="to").grid(row=row, column=4)
+            ttk.Entry(controls, textvariable=hi, width=8).grid(row=row, column=5, padx=2)
+            self.fill_range(var, lo, hi)
+            self.axis_vars.append((var, lo, hi))
+        
+        ttk.Label(controls, text="Points:").grid(row=0, column=6, padx=(10, 2))
+        self.points = tk.StringVar(value=str(DEFAULT_POINTS))
+        ttk.Entry(controls, textvariable=self.points, width=6).grid(row=0, column=7)
+        ttk.Button(controls, text="Run Sweep", command=self.run,
+                   style='Accent.TButton').grid(row=1, column=6, columnspan=2, padx=(10, 0), sticky=(tk.W, tk.E))
+        
+        self.figure = Figure(figsize=(9, 5.5))
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self.window)
+        self.canvas.get_tk_widget().grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        self.sensitivity_text = scrolledtext.ScrolledText(self.window, height=8, font=('Courier', 8))
+        self.sensitivity_text.grid(row=2, column=0, sticky=(tk.W, tk.E), padx=5, pady=5)
+        
+        self.run()
+    
+    def fill_range(self, var, lo, hi):
+        """Prefill a variable's range from parameter_sweep.SWEEP_RANGES"""
+        lo_value, hi_value = self.ranges.get(var.get(), ('', ''))
+        lo.set(f"{lo_value:g}" if lo_value != '' else '')
+        hi.set(f"{hi_value:g}" if hi_value != '' else '')
+    
+    def run(self):
+        """Sweep around the main window's current mix and redraw"""
+        from parameter_sweep import local_sensitivity, parameter_sweep, plot_sweep
+        
+        request = self.app.collect_inputs()
+        if request is None:
+            return
+        ash_type, base_inputs = request
+        
+        try:
+            points = int(self.points.get())
+            sweeps = {}
+            for var, lo, hi in self.axis_vars:
+                if var.get() != self.NO_VARIABLE:
+                    sweeps[var.get()] = (float(lo.get()), float(hi.get()), points)
+            result = parameter_sweep(self.app.predictor, ash_type, base_inputs, sweeps)
+            sensitivity = local_sensitivity(self.app.predictor, ash_type, base_inputs, list(sweeps))
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid sweep: {e}", parent=self.window)
+            return
+        
+        plot_sweep(result, self.figure)
+        self.canvas.draw_idle()
+        
+        self.sensitivity_text.delete(1.0, tk.END)
+        self.sensitivity_text.insert(tk.END, f"{result['rows']:,} mixes scored in {result['elapsed'] * 1000:.0f} ms"
+                                             f" ({ash_type.replace(' 1', '')})\n\n")
+        self.sensitivity_text.insert(tk.END, "Local sensitivity at the current mix:\n")
+        self.sensitivity_text.insert(tk.END, f"  {'Target':<30} {'Variable':<30} {'Slope':>12} {'Elasticity':>11}\n")
+        for target_var, by_var in sensitivity.items():
+            for var, values in by_var.items():
+                self.sensitivity_text.insert(tk.END, f"  {target_var:<30} {var:<30} "
+                                                     f"{values['slope']:>12.4g} {values['elasticity']:>11.3f}\n")
+
 def main():
     """Main function to run the GUI"""
     root = tk.Tk()
@@ -0,0 +1,273 @@
+"""
+Concrete Mixture Prediction System
+Multi-objective mix design: minimize cost and CO2 under strength and slump limits
+
+Candidate mixes are generated by Latin hypercube sampling and refined by an
+evolutionary loop (mutation + blend crossover around the current Pareto
+front). Every generation is scored with one batched Predictor call, so each
+model runs once per generation rather than once per mix.
+
+Usage:
+    python mix_optimizer.py --ash RHA --min-strength 30 --slump 50 150
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from concrete_predictor import DEFAULT_MODELS_DIR, Predictor, ash_display_name
+
+# Default search range per input variable (lo, hi); lo == hi fixes the value
+DEFAULT_BOUNDS = {
+    'replacement_pct': (0.0, 50.0),
+    'cement_kg_m3': (200.0, 550.0),
+    'ash_kg_m3': (0.0, 200.0),
+    'fine_aggregate_kg_m3': (500.0, 900.0),
+    'coarse_aggregate_kg_m3': (800.0, 1250.0),
+    'pozzolan added(Fly Ash) kgm3': (0.0, 50.0),
+    'superplasticizer_kg_m3': (0.0, 10.0),
+    'water kg_m3': (140.0, 220.0),
+    'curing_days': (28.0, 28.0),
+}
+# Largest number of Pareto points carried between generations
+ARCHIVE_SIZE = 2000
+
+
+def find_target(target_variables, keyword):
+    """Target variable whose name contains keyword (case-insensitive)"""
+    for target_var in target_variables:
+        if keyword in target_var.lower():
+            return target_var
+    raise KeyError(f"No target variable matching '{keyword}'")
+
+
+def latin_hypercube(n, lo, hi, rng):
+    """n stratified samples in the box [lo, hi]"""
+    n_dims = len(lo)
+    strata = np.argsort(rng.random((n, n_dims)), axis=0)
+    u = (strata + rng.random((n, n_dims))) / n
+    return lo + u * (hi - lo)
+
+
+def derived_replacement(cement, ash):
+    """Percentage of the binder (cement + ash) that is ash; 0 without binder"""
+    total = cement + ash
+    return np.where(total > 0, 100.0 * ash / np.where(total > 0, total, 1), 0)
+
+
+def pareto_mask(objectives):
+    """Non-dominated rows of an (N x 2) minimization objective matrix"""
+    n = objectives.shape[0]
+    mask = np.zeros(n, dtype=bool)
+    if n == 0:
+        return mask
+    order = np.lexsort((objectives[:, 1], objectives[:, 0]))
+    second = objectives[order, 1]
+    best_before = np.minimum.accumulate(np.concatenate([[np.inf], second[:-1]]))
+    mask[order[second < best_before]] = True
+    return mask
+
+
+class MixOptimizer:
+    """Batched evolutionary search for cost/CO2-optimal mixes of one ash type"""
+
+    def __init__(self, predictor, ash_type, bounds=None, min_strength=None, slump_range=None,
+                 derive_replacement=True):
+        self.predictor = predictor
+        self.ash_type = predictor.resolve_ash_type(ash_type)
+        self.input_variables = predictor.input_variables
+        self.min_strength = min_strength
+        self.slump_range = slump_range
+        self.derive_replacement = derive_replacement
+
+        unknown = sorted(set(bounds or {}) - set(self.input_variables))
+        if unknown:
+            raise ValueError(f"Unknown bound variables: {unknown} (input variables: {self.input_variables})")
+        bounds = dict(DEFAULT_BOUNDS, **(bounds or {}))
+        self.lo = np.array([bounds[v][0] for v in self.input_variables], dtype=np.float64)
+        self.hi = np.array([bounds[v][1] for v in self.input_variables], dtype=np.float64)
+        if np.any(self.hi < self.lo):
+            raise ValueError("Each bound must satisfy lo <= hi")
+
+        targets = predictor.target_variables
+        self.cost_target = find_target(targets, 'cost')
+        self.co2_target = find_target(targets, 'co2')
+        self.strength_target = find_target(targets, 'strength')
+        self.slump_target = find_target(targets, 'slump')
+        self.targets = [self.cost_target, self.co2_target, self.strength_target, self.slump_target]
+        self.evaluations = 0
+
+    def _complete(self, X):
+        """
+        Clip to bounds and apply derived inputs.
+
+        A derived replacement_pct outside its bound is brought inside by
+        changing the ash content; if the ash bound prevents that, evaluate()
+        counts the remainder as a constraint violation.
+        """
+        X = np.clip(X, self.lo, self.hi)
+        if self.derive_replacement:
+            idx = self.input_variables.index
+            r, c, a = idx('replacement_pct'), idx('cement_kg_m3'), idx('ash_kg_m3')
+            raw = derived_replacement(X[:, c], X[:, a])
+            pct = np.clip(raw, self.lo[r], self.hi[r])
+            fix = (pct != raw) & (pct < 100)
+            X[fix, a] = np.clip(X[fix, c] * pct[fix] / (100 - pct[fix]), self.lo[a], self.hi[a])
+            X[:, r] = derived_replacement(X[:, c], X[:, a])
+        return X
+
+    def evaluate(self, X):
+        """Batch-score candidates: returns (predictions, objectives, constraint violation)"""
+        predictions = self.predictor.predict(X, self.ash_type, self.targets)
+        self.evaluations += X.shape[0]
+        objectives = np.column_stack([predictions[self.cost_target], predictions[self.co2_target]])
+
+        violation = np.zeros(X.shape[0])
+        if self.derive_replacement:
+            # The only input that can leave its bound
+            r = self.input_variables.index('replacement_pct')
+            violation += np.maximum(0, self.lo[r] - X[:, r]) + np.maximum(0, X[:, r] - self.hi[r])
+        if self.min_strength is not None:
+            violation += np.maximum(0, self.min_strength - predictions[self.strength_target])
+        if self.slump_range is not None:
+            slump = predictions[self.slump_target]
+            violation += np.maximum(0, self.slump_range[0] - slump)
+            violation += np.maximum(0, slump - self.slump_range[1])
+        # Missing models (NaN) never count as feasible
+        violation[np.isnan(objectives).any(axis=1)] = np.inf
+        return predictions, objectives, violation
+
+    def run(self, population=20000, generations=50, seed=42, explore=0.1, verbose=False):
+        """
+        Search for the Pareto front of (cost, CO2) over feasible mixes.
+
+        Returns a dict with the front's 'inputs' (N x inputs), 'predictions'
+        ({target: array}), plus 'evaluations' and 'elapsed' seconds.
+        """
+        rng = np.random.default_rng(seed)
+        start = time.perf_counter()
+        self.evaluations = 0
+        span = self.hi - self.lo
+
+        X = self._complete(latin_hypercube(population, self.lo, self.hi, rng))
+        archive = self._select(X, *self.evaluate(X))
+
+        for generation in range(generations):
+            # Mutation step shrinks from 10% to 1% of each variable's range
+            sigma = 0.1 * (0.1 ** (generation / max(1, generations - 1)))
+            parents = archive['inputs']
+            n_explore = int(population * explore)
+            n_children = population - n_explore
+
+            first = parents[rng.integers(0, len(parents), n_children)]
+            second = parents[rng.integers(0, len(parents), n_children)]
+            children = first + rng.random((n_children, 1)) * (second - first)
+            children += rng.standard_normal(children.shape) * sigma * span
+            fresh = latin_hypercube(n_explore, self.lo, self.hi, rng) if n_explore else np.empty((0, len(span)))
+
+            X = self._complete(np.vstack([children, fresh]))
+            predictions, objectives, violation = self.evaluate(X)
+            archive = self._select(np.vstack([archive['inputs'], X]),
+                                   {t: np.concatenate([archive['predictions'][t], predictions[t]])
+                                    for t in self.targets},
+                                   np.vstack([archive['objectives'], objectives]),
+                                   np.concatenate([archive['violation'], violation]))
+            if verbose:
+                feasible = 'feasible' if archive['feasible'] else 'least infeasible'
+                print(f"  generation {generation + 1:>3}: {len(archive['inputs']):>5} {feasible} "
+                      f"front points, {self.evaluations:,} evaluations")
+
+        archive['evaluations'] = self.evaluations
+        archive['elapsed'] = time.perf_counter() - start
+        order = np.argsort(archive['objectives'][:, 0])
+        for key in ('inputs', 'objectives', 'violation'):
+            archive[key] = archive[key][order]
+        archive['predictions'] = {t: p[order] for t, p in archive['predictions'].items()}
+        return archive
+
+    def _select(self, X, predictions, objectives, violation):
+        """Pareto front of feasible points, or the least infeasible points if none exist"""
+        feasible = violation == 0
+        if feasible.any():
+            keep = np.flatnonzero(feasible)[pareto_mask(objectives[feasible])]
+        else:
+            finite = np.flatnonzero(np.isfinite(violation))
+            if len(finite) == 0:
+                raise ValueError("No models available for this ash type")
+            keep = finite[np.argsort(violation[finite])[:ARCHIVE_SIZE]]
+        if len(keep) > ARCHIVE_SIZE:
+            # Thin evenly along the cost axis
+            keep = keep[np.argsort(objectives[keep, 0])]
+            keep = keep[np.linspace(0, len(keep) - 1, ARCHIVE_SIZE).astype(int)]
+        return {
+            'inputs': X[keep],
+            'predictions': {t: p[keep] for t, p in predictions.items()},
+            'objectives': objectives[keep],
+            'violation': violation[keep],
+            'feasible': bool(feasible.any()),
+        }
+
+
+def optimize_mix(predictor, ash_type, bounds=None, min_strength=None, slump_range=None,
+                 population=20000, generations=50, seed=42, derive_replacement=True, verbose=False):
+    """Convenience wrapper around MixOptimizer(...).run(...)"""
+    optimizer = MixOptimizer(predictor, ash_type, bounds=bounds, min_strength=min_strength,
+                             slump_range=slump_range, derive_replacement=derive_replacement)
+    return optimizer.run(population=population, generations=generations, seed=seed, verbose=verbose)
+
+
+def front_to_frame(result, input_variables):
+    """Pareto front as a DataFrame of inputs followed by predicted targets"""
+    import pandas as pd
+    df = pd.DataFrame(result['inputs'], columns=input_variables)
+    for target_var, values in result['predictions'].items():
+        df[target_var] = values
+    return df
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Find cost/CO2 Pareto-optimal concrete mixes")
+    parser.add_argument('--ash', required=True, help="Ash type, e.g. RHA")
+    parser.add_argument('--min-strength', type=float, help="Minimum compressive strength (MPa)")
+    parser.add_argument('--slump', type=float, nargs=2, metavar=('MIN', 'MAX'), help="Slump range (mm)")
+    parser.add_argument('--bound', nargs=3, action='append', default=[], metavar=('VAR', 'LO', 'HI'),
+                        help="Override the search range of an input variable")
+    parser.add_argument('--no-derive-replacement', dest='derive_replacement', action='store_false',
+                        help="Search replacement_pct independently of the cement and ash contents")
+    parser.add_argument('--population', type=int, default=20000)
+    parser.add_argument('--generations', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--models-dir', default=DEFAULT_MODELS_DIR)
+    parser.add_argument('--out', help="Write the Pareto front to this CSV file")
+    args = parser.parse_args()
+
+    try:
+        predictor = Predictor.from_directory(args.models_dir)
+        bounds = {var: (float(lo), float(hi)) for var, lo, hi in args.bound}
+        result = optimize_mix(predictor, args.ash, bounds=bounds, min_strength=args.min_strength,
+                              slump_range=args.slump, population=args.population,
+                              generations=args.generations, seed=args.seed,
+                              derive_replacement=args.derive_replacement, verbose=True)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"ERROR: {e}")
+        return 1
+
+    print(f"\n{ash_display_name(predictor.resolve_ash_type(args.ash))}: "
+          f"{len(result['inputs'])} Pareto-optimal mixes from {result['evaluations']:,} evaluations "
+          f"in {result['elapsed']:.1f}s ({result['evaluations'] / result['elapsed']:,.0f} mixes/s)")
+    if not result['feasible']:
+        print("WARNING: no mix met the constraints; showing the least infeasible mixes")
+
+    df = front_to_frame(result, predictor.input_variables)
+    print(df.head(20).to_string(index=False))
+    if args.out:
+        df.to_csv(args.out, index=False)
+        print(f"\nPareto front saved to: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
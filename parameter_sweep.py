@@ -0,0 +1,233 @@
+"""
+Concrete Mixture Prediction System
+Parameter sweeps and sensitivity analysis around a mix
+
+One or two input variables are varied over a grid while the others stay at
+the base mix. The whole grid is scored with one batched Predictor call, so
+each model runs once per sweep (a 200 x 200 grid is 40,000 rows).
+
+Usage:
+    python parameter_sweep.py --ash RHA --vary curing_days 1 365
+    python parameter_sweep.py --ash POFA --vary replacement_pct 0 50 --vary cement_kg_m3 200 550 --plot sweep.png
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from concrete_predictor import DEFAULT_MODELS_DIR, EXAMPLE_MIX, Predictor, ash_display_name, base_vector
+from mix_optimizer import DEFAULT_BOUNDS
+
+# Default sweep range per input variable (curing is fixed in the optimizer, not here)
+SWEEP_RANGES = dict(DEFAULT_BOUNDS, curing_days=(1.0, 365.0))
+DEFAULT_POINTS = 200
+# Finite-difference step of local_sensitivity, as a fraction of each variable's sweep range
+SENSITIVITY_STEP = 0.05
+
+
+def sweep_axes(sweeps, points=DEFAULT_POINTS):
+    """
+    Normalize sweep specs to {variable: values}.
+
+    Each spec is a variable name (SWEEP_RANGES, `points` steps), a
+    (lo, hi) or (lo, hi, n) tuple, or an explicit array of values.
+    """
+    if isinstance(sweeps, str):
+        sweeps = [sweeps]
+    if not isinstance(sweeps, dict):
+        sweeps = {var: SWEEP_RANGES[var] for var in sweeps}
+    axes = {}
+    for var, spec in sweeps.items():
+        if isinstance(spec, tuple) and len(spec) in (2, 3):
+            lo, hi = spec[:2]
+            n = int(spec[2]) if len(spec) == 3 else points
+            values = np.linspace(float(lo), float(hi), n)
+        else:
+            values = np.asarray(spec, dtype=np.float64).reshape(-1)
+        if len(values) < 2:
+            raise ValueError(f"Sweep of {var} needs at least 2 points")
+        axes[var] = values
+    if not 1 <= len(axes) <= 2:
+        raise ValueError(f"Expected 1 or 2 swept variables, got {len(axes)}")
+    return axes
+
+
+def grid_inputs(input_variables, base, axes):
+    """(N x inputs) rows of the meshgrid over axes, other inputs fixed at base"""
+    for var in axes:
+        if var not in input_variables:
+            raise KeyError(f"Unknown input variable: {var!r}")
+    mesh = np.meshgrid(*axes.values(), indexing='ij')
+    X = np.tile(base, (mesh[0].size, 1))
+    for var, values in zip(axes, mesh):
+        X[:, input_variables.index(var)] = values.ravel()
+    return X
+
+
+def parameter_sweep(predictor, ash_type, base_inputs=None, sweeps='curing_days', targets=None,
+                    points=DEFAULT_POINTS):
+    """
+    Predict every target over a 1-D or 2-D grid of input values.
+
+    sweeps names one or two input variables (see sweep_axes). Returns a dict
+    with 'axes' ({variable: values}), 'predictions' ({target: array shaped
+    like the grid}), 'gradients' ({target: [dY/d(variable) per axis]}),
+    'base' (the base mix), 'rows' and 'elapsed' seconds.
+    """
+    start = time.perf_counter()
+    ash_type = predictor.resolve_ash_type(ash_type)
+    targets = predictor.available_targets(ash_type) if targets is None else list(targets)
+    base_inputs = EXAMPLE_MIX if base_inputs is None else base_inputs
+    axes = sweep_axes(sweeps, points)
+    shape = tuple(len(values) for values in axes.values())
+
+    base = base_vector(predictor.input_variables, base_inputs)
+    X = grid_inputs(predictor.input_variables, base, axes)
+    flat = predictor.predict(X, ash_type, targets)
+
+    predictions, gradients = {}, {}
+    for target_var in targets:
+        Y = flat[target_var].reshape(shape)
+        predictions[target_var] = Y
+        gradient = np.gradient(Y, *axes.values())
+        gradients[target_var] = gradient if isinstance(gradient, list) else [gradient]
+
+    return {
+        'ash_type': ash_type,
+        'axes': axes,
+        'predictions': predictions,
+        'gradients': gradients,
+        'base': dict(zip(predictor.input_variables, base)),
+        'rows': X.shape[0],
+        'elapsed': time.perf_counter() - start,
+    }
+
+
+def local_sensitivity(predictor, ash_type, base_inputs=None, variables=None, targets=None,
+                      step=SENSITIVITY_STEP):
+    """
+    Central-difference sensitivity of every target to each input at the base mix.
+
+    The step is `step` times the variable's SWEEP_RANGES span, so models that
+    are step functions of their inputs (trees) still show a slope. All
+    perturbed mixes are scored in one batch. Returns {target: {variable:
+    {'slope': dY/dx, 'elasticity': (dY/Y) / (dx/x)}}}.
+    """
+    ash_type = predictor.resolve_ash_type(ash_type)
+    targets = predictor.available_targets(ash_type) if targets is None else list(targets)
+    variables = predictor.input_variables if variables is None else list(variables)
+    base_inputs = EXAMPLE_MIX if base_inputs is None else base_inputs
+    base = base_vector(predictor.input_variables, base_inputs)
+
+    rows, spans = [base], []
+    for var in variables:
+        j = predictor.input_variables.index(var)
+        lo, hi = SWEEP_RANGES.get(var, (0.0, max(1.0, 2 * base[j])))
+        h = step * max(hi - lo, 1e-6)
+        # Inputs cannot be negative: near zero the lower point is clipped
+        lower, upper = base.copy(), base.copy()
+        lower[j] = max(0.0, base[j] - h)
+        upper[j] = base[j] + h
+        rows.extend([upper, lower])
+        spans.append(upper[j] - lower[j])
+    flat = predictor.predict(np.vstack(rows), ash_type, targets)
+
+    result = {}
+    for target_var in targets:
+        y = flat[target_var]
+        result[target_var] = {}
+        for k, var in enumerate(variables):
+            slope = (y[1 + 2 * k] - y[2 + 2 * k]) / spans[k]
+            x = base[predictor.input_variables.index(var)]
+            elasticity = slope * x / y[0] if y[0] != 0 and x != 0 else float('nan')
+            result[target_var][var] = {'slope': float(slope), 'elasticity': float(elasticity)}
+    return result
+
+
+def plot_sweep(result, fig=None, columns=2):
+    """
+    Draw one panel per target: curves for 1-D sweeps, heatmaps for 2-D.
+
+    fig is a matplotlib Figure to draw into (e.g. one embedded in Tk);
+    a new Figure is created if None. Returns the figure.
+    """
+    from matplotlib.figure import Figure
+    if fig is None:
+        fig = Figure(figsize=(10, 7))
+    fig.clear()
+
+    variables = list(result['axes'])
+    targets = list(result['predictions'])
+    rows = max(1, -(-len(targets) // columns))
+    base = result['base']
+    for i, target_var in enumerate(targets):
+        ax = fig.add_subplot(rows, columns, i + 1)
+        Y = result['predictions'][target_var]
+        x = result['axes'][variables[0]]
+        if len(variables) == 1:
+            ax.plot(x, Y, color='#0078d7')
+            ax.axvline(base[variables[0]], color='grey', linestyle='--', linewidth=0.8)
+        else:
+            y = result['axes'][variables[1]]
+            mesh = ax.pcolormesh(x, y, Y.T, shading='auto', cmap='viridis')
+            fig.colorbar(mesh, ax=ax).ax.tick_params(labelsize=7)
+            ax.plot(base[variables[0]], base[variables[1]], 'w+', markersize=10)
+            ax.set_ylabel(variables[1], fontsize=8)
+        ax.set_title(target_var, fontsize=9)
+        ax.set_xlabel(variables[0], fontsize=8)
+        ax.tick_params(labelsize=7)
+    fig.suptitle(f"{ash_display_name(result['ash_type'])}: sweep of {' x '.join(variables)}", fontsize=10)
+    fig.tight_layout()
+    return fig
+
+
+def sweep_to_frame(result):
+    """Sweep grid as a long DataFrame: swept inputs followed by predicted targets"""
+    import pandas as pd
+    mesh = np.meshgrid(*result['axes'].values(), indexing='ij')
+    df = pd.DataFrame({var: values.ravel() for var, values in zip(result['axes'], mesh)})
+    for target_var, Y in result['predictions'].items():
+        df[target_var] = Y.ravel()
+    return df
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Sweep one or two mix inputs and plot the predictions")
+    parser.add_argument('--ash', required=True, help="Ash type, e.g. RHA")
+    parser.add_argument('--vary', nargs=3, action='append', required=True, metavar=('VAR', 'LO', 'HI'),
+                        help="Input variable to sweep (give once or twice)")
+    parser.add_argument('--points', type=int, default=DEFAULT_POINTS, help="Grid points per swept variable")
+    parser.add_argument('--set', nargs=2, action='append', default=[], metavar=('VAR', 'VALUE'),
+                        help="Override a base-mix input (default: the GUI example mix)")
+    parser.add_argument('--models-dir', default=DEFAULT_MODELS_DIR)
+    parser.add_argument('--out', help="Write the grid and predictions to this CSV file")
+    parser.add_argument('--plot', help="Save curves/heatmaps to this image file")
+    args = parser.parse_args()
+
+    predictor = Predictor.from_directory(args.models_dir)
+    base_inputs = dict(EXAMPLE_MIX, **{var: float(value) for var, value in args.set})
+    sweeps = {var: (float(lo), float(hi), args.points) for var, lo, hi in args.vary}
+    result = parameter_sweep(predictor, args.ash, base_inputs, sweeps)
+
+    print(f"{ash_display_name(result['ash_type'])}: {result['rows']:,} mixes in "
+          f"{result['elapsed'] * 1000:.1f} ms")
+    sensitivity = local_sensitivity(predictor, result['ash_type'], base_inputs, list(sweeps))
+    print("\nLocal sensitivity at the base mix (slope per unit, elasticity):")
+    for target_var, by_var in sensitivity.items():
+        for var, s in by_var.items():
+            print(f"  {target_var:<35} {var:<30} {s['slope']:>12.4g} {s['elasticity']:>10.3f}")
+
+    if args.out:
+        sweep_to_frame(result).to_csv(args.out, index=False)
+        print(f"\nSweep saved to: {args.out}")
+    if args.plot:
+        plot_sweep(result).savefig(args.plot, dpi=120)
+        print(f"Plot saved to: {args.plot}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,429 @@
+"""
+Concrete Mixture Prediction System
+Pooled multi-ash, multi-output models (an alternative registry layout)
+
+The per-pair layout fits one model per (ash type, target): 28 pickles, 28
+scalers and one model call per pair in a mixed-ash batch. The pooled layout
+fits each candidate once on the rows of every ash type:
+
+- ash type is one-hot encoded; linear models also get ash x input
+  interactions, so each ash type keeps its own slopes
+- inputs an ash type's sheet does not have are zero after scaling, so
+  they are ignored as the per-pair models ignore them
+- all targets are fitted jointly (standardized), natively where the model
+  class supports several outputs and through MultiOutputRegressor otherwise
+
+Each target uses the candidate with the best mean validation R² over the ash
+types. A mixed batch then costs one call per distinct chosen model. The
+train/test/validation rows of every ash type are the per-pair splits, so
+validation R² is comparable pair by pair.
+
+Usage:
+    python train_models.py --pooled              (train both layouts)
+    python pooled_models.py [--models-dir trained_models]   (compare them)
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from concrete_dataset import DEFAULT_CACHE_DIR, DEFAULT_DATASET, INPUT_VARIABLES
+from concrete_predictor import DEFAULT_MODELS_DIR, ash_display_name
+
+POOLED_FILE = 'pooled_model.pkl'
+POOLED_COMPARISON_FILE = 'pooled_comparison.csv'
+# Candidates whose ash one-hot is crossed with every input (per-ash slopes)
+INTERACTION_MODELS = {'Linear Regression', 'Ridge Regression', 'Lasso Regression', 'ElasticNet'}
+# Candidates without native multi-output support (one booster per target, one object)
+WRAPPED_MODELS = {'Gradient Boosting', 'LightGBM'}
+# Rows of the mixed-ash batch timed by compare_layouts
+COMPARISON_BATCH_ROWS = 10000
+
+
+class PooledModel:
+    """
+    Models fitted across every ash type, each predicting all targets at once.
+
+    members is a list of {'name', 'model', 'interactions', 'targets'}:
+    targets are the target_variables taken from that member's output.
+    """
+
+    def __init__(self, ash_types, input_variables, target_variables, ash_features, mean, scale, y_mean,
+                 y_scale, members):
+        self.ash_types = list(ash_types)
+        self.input_variables = list(input_variables)
+        self.target_variables = list(target_variables)
+        self.ash_features = {a: list(f) for a, f in ash_features.items()}
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.y_mean = np.asarray(y_mean, dtype=np.float64)
+        self.y_scale = np.asarray(y_scale, dtype=np.float64)
+        self.members = members
+        # (ash types x inputs) mask of the inputs each ash type's models see
+        self.feature_mask = np.array([[var in self.ash_features[a] for var in self.input_variables]
+                                      for a in self.ash_types])
+
+    def encode(self, X, codes, interactions=False):
+        """Model inputs for raw rows X of ash types codes (indices into ash_types)"""
+        Z = (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+        Z[~self.feature_mask[codes]] = 0.0
+        onehot = np.eye(len(self.ash_types))[codes]
+        if not interactions:
+            return np.hstack([Z, onehot])
+        crossed = (onehot[:, :, None] * Z[:, None, :]).reshape(len(Z), -1)
+        return np.hstack([Z, onehot, crossed])
+
+    def predict(self, X, codes, targets=None):
+        """{target: ndarray(N)} for raw rows X of ash types codes; one call per member needed"""
+        targets = self.target_variables if targets is None else targets
+        result = {}
+        encoded = {}
+        for member in self.members:
+            wanted = [t for t in member['targets'] if t in targets]
+            if not wanted:
+                continue
+            if member['interactions'] not in encoded:
+                encoded[member['interactions']] = self.encode(X, codes, member['interactions'])
+            X_encoded = encoded[member['interactions']]
+            columns = [self.target_variables.index(t) for t in wanted]
+            if member['model'].__class__.__name__ == 'MultiOutputRegressor':
+                # One estimator per target: run only the wanted ones
+                Y = np.column_stack([member['model'].estimators_[j].predict(X_encoded) for j in columns])
+            else:
+                Y = np.asarray(member['model'].predict(X_encoded), dtype=np.float64).reshape(len(X), -1)
+                Y = Y[:, columns]
+            Y = Y * self.y_scale[columns] + self.y_mean[columns]
+            for k, t in enumerate(wanted):
+                result[t] = Y[:, k]
+        return result
+
+    def model_name(self, target_var):
+        """Name shown for the member predicting a target (e.g. 'Pooled CatBoost')"""
+        for member in self.members:
+            if target_var in member['targets']:
+                return f"Pooled {member['name']}"
+        raise KeyError(target_var)
+
+
+def candidate(model_name, model, param_grid):
+    """(estimator, grid) fitting every target jointly"""
+    if model_name in WRAPPED_MODELS:
+        from sklearn.multioutput import MultiOutputRegressor
+        return (MultiOutputRegressor(model),
+                {f'estimator__{key}': values for key, values in param_grid.items()})
+    if model_name == 'CatBoost':
+        model.set_params(loss_function='MultiRMSE')
+    return model, param_grid
+
+
+def pooled_rows(datasets_clean, ash_types, splits, targets, tasks):
+    """
+    Raw pooled inputs, ash codes and targets of the per-pair splits.
+
+    Returns (ash_types, pooled_targets, ash_features, parts) where
+    parts[part] is (X, codes, Y) for 'train', 'test' and 'val' and codes
+    index ash_types. Only targets trained for every ash type are pooled.
+    """
+    ash_types = [a for a in ash_types if any(task[0] == a for task in tasks)]
+    pooled_targets = [t for t in dict.fromkeys(task[1] for task in tasks)
+                      if all((a, t) in targets for a in ash_types)]
+    if not pooled_targets:
+        raise ValueError("No target is available for every ash type; nothing to pool")
+
+    ash_features = {ash_type: features for ash_type, _, features in tasks}
+    parts = {part: ([], [], []) for part in ('train', 'test', 'val')}
+    for code, ash_type in enumerate(ash_types):
+        split_ids = {targets[(ash_type, t)]['split_id'] for t in pooled_targets}
+        if len(split_ids) != 1:
+            raise ValueError(f"Pooled models need every target of {ash_type.strip()} on the same rows")
+        df = datasets_clean[ash_type]
+        for part, index in zip(parts, splits[split_ids.pop()]['index']):
+            rows = df.loc[index]
+            X = np.column_stack([rows[var].to_numpy(dtype=np.float64) if var in ash_features[ash_type]
+                                 else np.zeros(len(rows)) for var in INPUT_VARIABLES])
+            parts[part][0].append(X)
+            parts[part][1].append(np.full(len(rows), code, dtype=np.intp))
+            parts[part][2].append(np.column_stack([rows[t].to_numpy(dtype=np.float64)
+                                                   for t in pooled_targets]))
+    parts = {part: tuple(np.concatenate(arrays) for arrays in values) for part, values in parts.items()}
+    return ash_types, pooled_targets, ash_features, parts
+
+
+def _scores(model, parts, part):
+    """R² of a PooledModel per (ash code, target) and MSE per target over all ash types, on one part"""
+    from sklearn.metrics import mean_squared_error, r2_score
+
+    X, codes, Y = parts[part]
+    predictions = model.predict(X, codes)
+    r2, mse = {}, {}
+    for j, t in enumerate(model.target_variables):
+        mse[t] = mean_squared_error(Y[:, j], predictions[t])
+        for code in np.unique(codes):
+            rows = codes == code
+            r2[(int(code), t)] = r2_score(Y[rows, j], predictions[t][rows])
+    return r2, mse
+
+
+def train_pooled(datasets_clean, ash_types, splits, targets, tasks, workers=None, threads=1, verbose=True):
+    """
+    Fit every candidate jointly on the pooled rows and keep the best per target.
+
+    The best candidate of a target has the lowest validation MSE over all
+    ash types; per-ash R² is degenerate where a target is constant within
+    an ash type (as Slump is in most sheets). Returns {'model': PooledModel,
+    'results': {candidate: {'val_r2': {(ash code, target): R²}, 'val_mse':
+    {target: MSE}, 'test_r2': ..., 'seconds': ...}}, 'selection': {target:
+    candidate}}.
+    """
+    from sklearn.model_selection import GridSearchCV, KFold
+
+    from train_models import cv_folds, get_models, get_param_grids
+
+    ash_types, pooled_targets, ash_features, parts = pooled_rows(datasets_clean, ash_types, splits,
+                                                                 targets, tasks)
+    X_train, codes_train, Y_train = parts['train']
+    # Scaling statistics of each input over the ash types that have it
+    mask = np.array([[var in ash_features[a] for var in INPUT_VARIABLES] for a in ash_types])[codes_train]
+    mean = np.array([X_train[mask[:, j], j].mean() if mask[:, j].any() else 0.0
+                     for j in range(X_train.shape[1])])
+    scale = np.array([X_train[mask[:, j], j].std() if mask[:, j].any() else 1.0
+                      for j in range(X_train.shape[1])])
+    scale[scale == 0] = 1.0
+    y_mean, y_scale = Y_train.mean(axis=0), Y_train.std(axis=0)
+    y_scale[y_scale == 0] = 1.0
+    base = PooledModel(ash_types, INPUT_VARIABLES, pooled_targets, ash_features, mean, scale, y_mean, y_scale,
+                       [])
+    Y_scaled = (Y_train - y_mean) / y_scale
+    # Rows are stacked ash type by ash type: unshuffled folds would hold out whole ash types
+    folds = KFold(cv_folds(len(X_train)), shuffle=True, random_state=42)
+
+    models, param_grids = get_models(threads), get_param_grids()
+    fitted, results = {}, {}
+    for model_name, model in models.items():
+        start = time.perf_counter()
+        interactions = model_name in INTERACTION_MODELS
+        estimator, grid = candidate(model_name, model, param_grids[model_name])
+        X_encoded = base.encode(X_train, codes_train, interactions)
+        try:
+            if grid:
+                search = GridSearchCV(estimator, grid, cv=folds, scoring='r2', n_jobs=workers)
+                search.fit(X_encoded, Y_scaled)
+                estimator = search.best_estimator_
+            else:
+                estimator.fit(X_encoded, Y_scaled)
+        except Exception as e:
+            if verbose:
+                print(f"  Pooled {model_name:<18} ✗ Error: {e}")
+            continue
+        member = {'name': model_name, 'model': estimator, 'interactions': interactions,
+                  'targets': pooled_targets}
+        trial = PooledModel(ash_types, INPUT_VARIABLES, pooled_targets, ash_features, mean, scale, y_mean,
+                            y_scale, [member])
+        fitted[model_name] = member
+        val_r2, val_mse = _scores(trial, parts, 'val')
+        results[model_name] = {
+            'val_r2': val_r2,
+            'val_mse': val_mse,
+            'test_r2': _scores(trial, parts, 'test')[0],
+            'seconds': time.perf_counter() - start,
+        }
+        if verbose:
+            mean_r2 = np.mean(list(results[model_name]['val_r2'].values()))
+            print(f"  Pooled {model_name:<18} {results[model_name]['seconds']:>7.2f}s  "
+                  f"mean val R² {mean_r2:.4f}")
+    if not fitted:
+        raise ValueError("No pooled candidate could be fitted")
+
+    # min() keeps the first candidate in notebook order on ties
+    selection = {t: min(results, key=lambda name: results[name]['val_mse'][t]) for t in pooled_targets}
+    members = [dict(fitted[name], targets=[t for t in pooled_targets if selection[t] == name])
+               for name in dict.fromkeys(selection.values())]
+    model = PooledModel(ash_types, INPUT_VARIABLES, pooled_targets, ash_features, mean, scale, y_mean, y_scale,
+                        members)
+    return {'model': model, 'results': results, 'selection': selection}
+
+
+def pooled_hash(targets, tasks):
+    """Hash of everything a pooled fit depends on: every slice, the grids and the code"""
+    from train_models import get_param_grids, training_version
+
+    digest = hashlib.sha256(training_version().encode())
+    for func in (PooledModel, candidate, pooled_rows, train_pooled):
+        digest.update(inspect.getsource(func).encode())
+    digest.update(json.dumps([[a, t, targets[(a, t)]['hash']] for a, t, _ in tasks]).encode())
+    digest.update(repr(sorted(get_param_grids().items())).encode())
+    return digest.hexdigest()
+
+
+def export_pooled(trained, models_dir=DEFAULT_MODELS_DIR, source_hash=None):
+    """Write pooled_model.pkl: a registry-shaped dict holding the PooledModel"""
+    import joblib
+
+    model = trained['model']
+    val_r2 = {ash_type: {} for ash_type in model.ash_types}
+    for target_var, name in trained['selection'].items():
+        for (code, t), r2 in trained['results'][name]['val_r2'].items():
+            if t == target_var:
+                val_r2[model.ash_types[code]][t] = r2
+    pooled = {
+        'ash_types': model.ash_types,
+        'target_variables': model.target_variables,
+        'input_variables': model.input_variables,
+        'models': {},
+        'pooled': model,
+        'selection': trained['selection'],
+        'val_r2': val_r2,
+        'hash': source_hash,
+    }
+    os.makedirs(models_dir, exist_ok=True)
+    joblib.dump(pooled, os.path.join(models_dir, POOLED_FILE))
+    return pooled
+
+
+def load_pooled(models_dir=DEFAULT_MODELS_DIR):
+    """pooled_model.pkl contents (see export_pooled)"""
+    import joblib
+    return joblib.load(os.path.join(models_dir, POOLED_FILE))
+
+
+def _best_time(func, *args, repeats=3):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _model_calls(predictor, ash_types):
+    """Model calls a batch holding every ash type costs"""
+    if predictor.pooled is not None:
+        return len(predictor.pooled.members)
+    calls = 0
+    for ash_type in ash_types:
+        fused = predictor._fused_linear(ash_type) if predictor.fuse_linear else None
+        fused_targets = fused['targets'] if fused is not None else []
+        calls += bool(fused_targets) + len([t for t in predictor.available_targets(ash_type)
+                                            if t not in fused_targets])
+    return calls
+
+
+def _layout_bytes(models_dir, predictor):
+    """Pickled bytes a layout loads"""
+    from concrete_predictor import model_file_name
+
+    if predictor.pooled is not None:
+        return os.path.getsize(os.path.join(models_dir, POOLED_FILE))
+    return sum(os.path.getsize(os.path.join(models_dir, model_file_name(a, t)))
+               for a in predictor.ash_types for t in predictor.available_targets(a))
+
+
+def compare_layouts(datasets_clean, ash_types, splits, targets, tasks, models_dir=DEFAULT_MODELS_DIR,
+                    verbose=True):
+    """
+    Per-pair vs pooled: validation R² per (ash type, target), model calls, bytes and latency.
+
+    Both layouts are loaded from models_dir and scored on the same
+    validation rows. Returns (comparison DataFrame, cost dict); the
+    DataFrame is also written to pooled_comparison.csv.
+    """
+    import pandas as pd
+    from sklearn.metrics import mean_squared_error, r2_score
+
+    from concrete_predictor import Predictor
+
+    ash_types, pooled_targets, _, parts = pooled_rows(datasets_clean, ash_types, splits, targets, tasks)
+    layouts = {}
+    for label, pooled in (('Per-pair', False), ('Pooled', True)):
+        # The first load also imports the model libraries
+        Predictor.from_directory(models_dir, pooled=pooled)
+        start = time.perf_counter()
+        predictor = Predictor.from_directory(models_dir, pooled=pooled)
+        layouts[label] = (predictor, time.perf_counter() - start)
+
+    X_val, codes_val, Y_val = parts['val']
+    labels = np.array(ash_types, dtype=object)
+    rows = []
+    for code, ash_type in enumerate(ash_types):
+        in_ash = codes_val == code
+        row_scores = {}
+        for label, (predictor, _) in layouts.items():
+            predictions = predictor.predict(X_val[in_ash], ash_type, pooled_targets)
+            row_scores[label] = {t: (r2_score(Y_val[in_ash, j], predictions[t]),
+                                     np.sqrt(mean_squared_error(Y_val[in_ash, j], predictions[t])))
+                                 for j, t in enumerate(pooled_targets)}
+        for j, target_var in enumerate(pooled_targets):
+            row = {'Ash Type': ash_display_name(ash_type), 'Target Variable': target_var}
+            for label, (predictor, _) in layouts.items():
+                row[f'{label} Model'] = predictor.model_name(ash_type, target_var)
+                row[f'{label} Val R²'], row[f'{label} Val RMSE'] = row_scores[label][target_var]
+            # R² is 1 or 0 when the validation target is constant: compare RMSE instead
+            row['Constant'] = bool(np.ptp(Y_val[in_ash, j]) == 0)
+            rows.append(row)
+    df = pd.DataFrame(rows)
+    df['Val R² Change'] = df['Pooled Val R²'] - df['Per-pair Val R²']
+
+    # A shuffled mixed-ash batch, and one row of the first ash type
+    order = np.random.default_rng(0).permutation(len(X_val))
+    batch_rows = np.resize(order, COMPARISON_BATCH_ROWS)
+    X_batch, ash_batch = X_val[batch_rows], labels[codes_val[batch_rows]]
+    costs = {}
+    for label, (predictor, load_seconds) in layouts.items():
+        predictor.predict(X_batch, ash_batch)
+        costs[label] = {
+            'model_calls': _model_calls(predictor, ash_types),
+            'bytes': _layout_bytes(models_dir, predictor),
+            'load_ms': 1000 * load_seconds,
+            'single_ms': 1000 * float(np.median([_best_time(predictor.predict, X_val[:1], ash_types[0],
+                                                            repeats=1) for _ in range(20)])),
+            'batch_ms': 1000 * _best_time(predictor.predict, X_batch, ash_batch),
+        }
+
+    df.to_csv(os.path.join(models_dir, POOLED_COMPARISON_FILE), index=False)
+    if verbose:
+        print("\n" + df.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+        print(f"\n{'Layout':<10} {'Model calls':>12} {'Size KB':>10} {'Load ms':>9} {'Single-row ms':>14} "
+              f"{f'Batch ms ({COMPARISON_BATCH_ROWS} mixed rows)':>30}")
+        for label, cost in costs.items():
+            print(f"{label:<10} {cost['model_calls']:>12} {cost['bytes'] / 1000:>10.1f} {cost['load_ms']:>9.1f} "
+                  f"{cost['single_ms']:>14.3f} {cost['batch_ms']:>30.2f}")
+        varying = df[~df['Constant']]
+        print(f"Val R² change of the pooled layout: mean {varying['Val R² Change'].mean():+.4f}, "
+              f"worst {varying['Val R² Change'].min():+.4f} over {len(varying)} pairs; "
+              f"{len(df) - len(varying)} pairs with a constant validation target (see Val RMSE)")
+        print(f"Comparison saved to: {os.path.join(models_dir, POOLED_COMPARISON_FILE)}")
+    return df, costs
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Compare the pooled and per-pair model layouts")
+    parser.add_argument('--data', default=DEFAULT_DATASET, help="Excel workbook the models were trained on")
+    parser.add_argument('--models-dir', default=DEFAULT_MODELS_DIR)
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="Cleaned dataset cache directory")
+    args = parser.parse_args()
+
+    from concrete_dataset import load_clean_datasets
+    from train_models import prepare_data
+
+    if not os.path.exists(os.path.join(args.models_dir, POOLED_FILE)):
+        print(f"ERROR: No {POOLED_FILE} in {args.models_dir}/ (train with: python train_models.py --pooled)")
+        return 1
+    try:
+        ash_types, datasets_clean = load_clean_datasets(args.data, args.cache_dir, verbose=False)
+        splits, targets, tasks = prepare_data(datasets_clean, ash_types, verbose=False)
+        compare_layouts(datasets_clean, ash_types, splits, targets, tasks, args.models_dir)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"ERROR: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""
+Concrete Mixture Prediction System
+Memoizing prediction cache keyed on quantized mix inputs
+
+Repeated or nearly repeated mixes (the GUI example mix, standard curing
+variants, scripted re-submissions) are answered from memory. Inputs are
+rounded to a configurable number of decimals before lookup and before
+prediction, so a cached value never depends on which nearby mix came first.
+With decimals=None, keys are the exact inputs and predictions equal the
+predictor's own.
+
+When the registry files change, the predictor is reloaded (and validated)
+from the models directory before the cache is cleared, so entries always
+come from the models whose hash they are saved under.
+
+Lookups are per (row, target) in Python, so they only pay off for small
+batches; larger batches go straight to the predictor (still quantized).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from concrete_predictor import ASH_COLUMN, INDEX_FILE, REGISTRY_FILE, registry_hash
+from prediction_metrics import METRICS
+
+CACHE_FORMAT_VERSION = 1
+# Batches with more rows than this bypass the cache (a lookup costs more than scoring them)
+DEFAULT_MAX_CACHED_ROWS = 64
+
+
+class PredictionCache:
+    """
+    LRU/TTL cache in front of Predictor.predict.
+
+    Entries are keyed on (ash type, target, rounded inputs), so max_entries
+    counts (row, target) pairs: a mix scored for 4 targets takes 4.
+    decimals=None keys on the exact inputs and never rounds them. Batches
+    of more than max_cached_rows rows are scored without the cache. When
+    the content hash of the model registry changes, the predictor is
+    reloaded with its original options and the cache is cleared; if the
+    new version fails to load or validate, the current predictor and its
+    entries are kept until the files change again. The cache
+    can be saved to / restored from disk to start warm.
+    """
+
+    def __init__(self, predictor, decimals=3, max_entries=100000, ttl=None, models_dir=None,
+                 persist_path=None, max_cached_rows=DEFAULT_MAX_CACHED_ROWS):
+        self.predictor = predictor
+        self.decimals = decimals
+        self.max_entries = max_entries
+        self.max_cached_rows = max_cached_rows
+        self.ttl = ttl
+        self.models_dir = models_dir if models_dir is not None else predictor.models_dir
+        self.persist_path = persist_path
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.bypassed_rows = 0
+
+        self._registry_stat = None
+        self._failed_stat = None
+        self.registry_hash = None
+        self.check_registry()
+        if persist_path and os.path.exists(persist_path):
+            self.load(persist_path)
+
+    def _stat_registry(self):
+        """Cheap change detector: (mtime, size) of the registry files"""
+        stat = []
+        for name in (REGISTRY_FILE, INDEX_FILE):
+            path = os.path.join(self.models_dir, name)
+            if os.path.exists(path):
+                st = os.stat(path)
+                stat.append((name, st.st_mtime_ns, st.st_size))
+        return tuple(stat)
+
+    def check_registry(self):
+        """
+        Reload the predictor and clear the cache if the registry content
+        changed; returns True if it did.
+        """
+        if self.models_dir is None:
+            return False
+        if self._stat_registry() == self._registry_stat:
+            return False
+        with self._reload_lock:  # one reload at a time; others re-check after it
+            return self._check_registry()
+
+    def _check_registry(self):
+        stat = self._stat_registry()
+        if stat in (self._registry_stat, self._failed_stat):
+            return False
+        new_hash = registry_hash(self.models_dir)
+        if self.registry_hash is None or new_hash == self.registry_hash:
+            self._registry_stat = stat
+            self.registry_hash = new_hash
+            return False
+        predictor = self._reload_predictor()
+        if predictor is None:
+            # Keep serving (and caching) the current version; retried once the files change again
+            self._failed_stat = stat
+            return False
+        with self._lock:
+            self.predictor = predictor
+            self._entries.clear()
+            self._registry_stat = stat
+            self.registry_hash = new_hash
+            self.invalidations += 1
+        return True
+
+    def _reload_predictor(self):
+        """The models directory's new version, validated against the current one, or None"""
+        from registry_manager import RegistryManager
+        manager = RegistryManager(self.models_dir, load=False, **self.predictor.load_options)
+        manager.predictor = self.predictor  # validation compares input variables with it
+        attempt = manager.reload(force=True)
+        if not attempt['swapped']:
+            print(f"Warning: Could not reload models from {self.models_dir}: {attempt['error']}")
+            return None
+        return manager.predictor
+
+    def quantize(self, X):
+        """Round inputs to the cache precision (also used for the prediction itself)"""
+        X = self.predictor.as_matrix(X)
+        if self.decimals is None:
+            return X
+        # + 0.0 folds -0.0 into 0.0 so both map to the same key
+        return np.round(X, self.decimals) + 0.0
+
+    def predict(self, X, ash_types=None, targets=None):
+        """Same contract as Predictor.predict, answering repeated mixes from the cache"""
+        with METRICS.trace('predict'):
+            return self._predict(X, ash_types, targets)
+
+    def _predict(self, X, ash_types, targets):
+        if ash_types is None:
+            if not hasattr(X, 'columns') or ASH_COLUMN not in X.columns:
+                raise ValueError(f"ash_types is required unless X has an '{ASH_COLUMN}' column")
+            ash_types = X[ASH_COLUMN].to_numpy()
+        self.check_registry()
+        # One predictor and version per call, even if another thread reloads meanwhile
+        predictor, version = self.predictor, self.registry_hash
+        X = self.quantize(X)
+        n_rows = X.shape[0]
+        targets = predictor.target_variables if targets is None else list(targets)
+        if self.max_cached_rows is not None and n_rows > self.max_cached_rows:
+            with self._lock:
+                self.bypassed_rows += n_rows
+            return predictor.predict(X, ash_types, targets)
+        ash_keys = self._resolve_ash_types(ash_types, n_rows)
+        rows = list(map(tuple, X.tolist()))
+
+        results = {t: np.empty(n_rows) for t in targets}
+        missing = []
+        now = time.time()
+        with METRICS.stage('cache_lookup'), self._lock:
+            for i in range(n_rows):
+                row_missing = False
+                for target_var in targets:
+                    key = (ash_keys[i], target_var, rows[i])
+                    item = self._entries.get(key)
+                    if item is not None and self.ttl is not None and now - item[1] > self.ttl:
+                        del self._entries[key]
+                        self.expirations += 1
+                        item = None
+                    if item is None:
+                        self.misses += 1
+                        row_missing = True
+                    else:
+                        self._entries.move_to_end(key)
+                        results[target_var][i] = item[0]
+                        self.hits += 1
+                if row_missing:
+                    missing.append(i)
+
+        if missing:
+            missing = np.array(missing)
+            predictions = predictor.predict(X[missing], ash_keys[missing], targets)
+            with self._lock:
+                for target_var, values in predictions.items():
+                    results[target_var][missing] = values
+                    if self.registry_hash != version:
+                        continue  # reloaded meanwhile: these came from the old models
+                    for i, value in zip(missing.tolist(), values.tolist()):
+                        self._entries[(ash_keys[i], target_var, rows[i])] = (value, now)
+                self._evict()
+        return results
+
+    def predict_one(self, ash_type, values, targets=None):
+        """Cached equivalent of Predictor.predict_one"""
+        x = np.array([[float(values.get(var, 0.0)) for var in self.predictor.input_variables]])
+        ash_type = self.predictor.resolve_ash_type(ash_type)
+        targets = self.predictor.available_targets(ash_type) if targets is None else targets
+        predictions = self.predict(x, ash_type, targets)
+        return {t: float(p[0]) for t, p in predictions.items() if not np.isnan(p[0])}
+
+    def _resolve_ash_types(self, ash_types, n_rows):
+        """Registry key of every row as an object array"""
+        if isinstance(ash_types, str):
+            return np.full(n_rows, self.predictor.resolve_ash_type(ash_types), dtype=object)
+        ash_types = np.asarray(ash_types, dtype=object)
+        if ash_types.shape != (n_rows,):
+            raise ValueError(f"Expected {n_rows} ash types, got {ash_types.shape[0]}")
+        labels, inverse = np.unique(ash_types.astype(str), return_inverse=True)
+        resolved = np.array([self.predictor.resolve_ash_type(a) for a in labels], dtype=object)
+        return resolved[inverse]
+
+    def _evict(self):
+        """Drop least recently used entries beyond max_entries (lock held)"""
+        if self.max_entries is None:
+            return
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Forget every cached prediction"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters (per (row, target) lookup) and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'bypassed_rows': self.bypassed_rows,
+                'registry_hash': self.registry_hash,
+            }
+
+    def save(self, path=None):
+        """Persist the cache so a restarted process starts warm"""
+        path = path or self.persist_path
+        if path is None:
+            raise ValueError("No persist_path given")
+        with self._lock:
+            entries = list(self._entries.items())
+        import joblib
+        joblib.dump({
+            'version': CACHE_FORMAT_VERSION,
+            'registry_hash': self.registry_hash,
+            'decimals': self.decimals,
+            'entries': entries,
+        }, path)
+
+    def load(self, path=None):
+        """Restore a saved cache; ignored if it belongs to another registry or precision"""
+        path = path or self.persist_path
+        try:
+            import joblib
+            saved = joblib.load(path)
+        except Exception as e:
+            print(f"Warning: Could not load prediction cache {path}: {e}")
+            return 0
+        if (saved.get('version') != CACHE_FORMAT_VERSION or saved.get('decimals') != self.decimals or
+                saved.get('registry_hash') != self.registry_hash):
+            return 0
+        now = time.time()
+        with self._lock:
+            for key, (value, stored_at) in saved['entries']:
+                if self.ttl is None or now - stored_at <= self.ttl:
+                    self._entries[key] = (value, stored_at)
+            self._evict()
+            return len(self._entries)
@@ -0,0 +1,137 @@
+"""
+Concrete Mixture Prediction System
+Load-test client for prediction_server.py
+
+Opens one keep-alive connection per simulated client, sends single-mix
+/predict requests back to back, and reports p50/p99 latency and requests
+per second for each concurrency level.
+
+Usage:
+    python prediction_load_test.py --concurrency 1 8 32 128 --requests 2000
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+
+from prediction_server import DEFAULT_HOST, DEFAULT_PORT
+
+EXAMPLE_INPUTS = {
+    'replacement_pct': 20,
+    'cement_kg_m3': 320,
+    'ash_kg_m3': 80,
+    'fine_aggregate_kg_m3': 700,
+    'coarse_aggregate_kg_m3': 1100,
+    'pozzolan added(Fly Ash) kgm3': 30,
+    'superplasticizer_kg_m3': 5,
+    'water kg_m3': 180,
+    'curing_days': 28,
+}
+
+
+def random_request(rng, ash_types):
+    """A /predict body around the GUI example mix"""
+    inputs = {var: round(value * rng.uniform(0.8, 1.2), 2) for var, value in EXAMPLE_INPUTS.items()}
+    return json.dumps({'ash_type': str(rng.choice(ash_types)), 'inputs': inputs}).encode('utf-8')
+
+
+async def http_request(reader, writer, host, method, path, body=b''):
+    """Send one request on an open connection and return (status, parsed JSON)"""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(host, port, bodies, latencies, errors):
+    """One simulated caller: sequential requests over a keep-alive connection"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for body in bodies:
+            start = time.perf_counter()
+            status, _ = await http_request(reader, writer, host, 'POST', '/predict', body)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run_level(host, port, concurrency, n_requests, ash_types, seed=0):
+    """Drive n_requests at a fixed concurrency; returns a result row"""
+    rng = np.random.default_rng(seed)
+    bodies = [random_request(rng, ash_types) for _ in range(n_requests)]
+    shares = [bodies[i::concurrency] for i in range(concurrency)]
+    latencies, errors = [], []
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, share, latencies, errors) for share in shares if share))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'concurrency': concurrency,
+        'requests': n_requests,
+        'errors': len(errors),
+        'rps': n_requests / elapsed,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'max_ms': float(latencies_ms.max()),
+    }
+
+
+async def load_test(host, port, levels, n_requests):
+    reader, writer = await asyncio.open_connection(host, port)
+    _, metadata = await http_request(reader, writer, host, 'GET', '/metadata')
+    writer.close()
+
+    # Warm-up loads every model before measuring
+    await run_level(host, port, 4, 8 * len(metadata['ash_types']), metadata['ash_types'], seed=1)
+
+    rows = []
+    for concurrency in levels:
+        row = await run_level(host, port, concurrency, n_requests, metadata['ash_types'])
+        reader, writer = await asyncio.open_connection(host, port)
+        _, row['server'] = await http_request(reader, writer, host, 'GET', '/stats')
+        writer.close()
+        rows.append(row)
+        print(f"  {concurrency:>6} {row['rps']:>10,.0f} {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+              f"{row['server']['mean_batch_size']:>10.1f} {row['errors']:>7}")
+    return rows
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Load-test the concrete prediction server")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per concurrency level")
+    parser.add_argument('--json', help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    print(f"Load test against http://{args.host}:{args.port} ({args.requests} requests per level)")
+    print(f"  {'conc.':>6} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'avg batch':>10} {'errors':>7}")
+    rows = asyncio.run(load_test(args.host, args.port, args.concurrency, args.requests))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
+        print(f"\nResults saved to: {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
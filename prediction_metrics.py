@@ -0,0 +1,286 @@
+"""
+Concrete Mixture Prediction System
+Prediction-path instrumentation: stage timers, per-model counters and histograms
+
+A single module-level METRICS collector is shared by the predictor, the
+cache, the GUI and the server. It is disabled by default; disabled timers
+are a shared no-op object, so instrumented code costs one method call.
+Enable it with METRICS.enable() or by setting CONCRETE_METRICS=1.
+
+Snapshots are available as a JSON-serializable dict (snapshot()) and in the
+Prometheus text exposition format (prometheus_text()).
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Histogram bucket upper bounds in seconds (Prometheus 'le' labels)
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+METRIC_PREFIX = 'concrete'
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Upper bucket bound containing quantile q (None if empty)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum_s': self.sum,
+            'mean_ms': 1000 * self.sum / self.count if self.count else None,
+            'p50_le_ms': _ms(self.quantile(0.5)),
+            'p99_le_ms': _ms(self.quantile(0.99)),
+            'buckets': {str(b): c for b, c in zip(self.buckets + ('+Inf',), self.counts)},
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+class _NullTimer:
+    """Shared do-nothing timer handed out while metrics are disabled"""
+    elapsed = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def finish(self):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._start
+        self.metrics.record_stage(self.name, self.elapsed)
+        return False
+
+
+class _Trace:
+    """
+    Collects the stage timings of one top-level prediction on this thread.
+
+    An open trace (open=True) is not recorded when its block exits: it can
+    be entered again, on any thread, and is recorded by finish() with the
+    time since it was opened.
+    """
+
+    def __init__(self, metrics, label, open=False):
+        self.metrics = metrics
+        self.label = label
+        self.open = open
+        self.stages = {}
+        self.elapsed = 0.0
+        self._opened = time.perf_counter()
+
+    def __enter__(self):
+        self.metrics._local.trace = self
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics._local.trace = None
+        if not self.open:
+            self.elapsed = time.perf_counter() - self._start
+            self.metrics.record_trace(self)
+        return False
+
+    def finish(self):
+        """Record an open trace"""
+        self.elapsed = time.perf_counter() - self._opened
+        self.metrics.record_trace(self)
+
+
+class PredictionMetrics:
+    """Thread-safe collector of stage timings and per-model call statistics"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """Forget every recorded value"""
+        with self._lock:
+            self.stages = {}
+            self.traces = {}
+            self.models = {}
+            self.last_trace = None
+
+    def stage(self, name):
+        """Context manager timing one stage ('validate', 'scale', 'model', ...)"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, name)
+
+    def trace(self, label):
+        """
+        Context manager around one top-level prediction (a GUI click, a batch).
+
+        Stages recorded on this thread inside it make up last_trace. Nested
+        traces are folded into the outermost one.
+        """
+        if not self.enabled or getattr(self._local, 'trace', None) is not None:
+            return _NULL_TIMER
+        return _Trace(self, label)
+
+    def open_trace(self, label):
+        """
+        A trace for a prediction that crosses threads (e.g. a GUI click
+        validated and rendered on the Tk thread, scored on a worker).
+
+        Enter it around each part, on whichever thread runs it, then call
+        finish() once; its total is the time from opening to finish().
+        """
+        if not self.enabled or getattr(self._local, 'trace', None) is not None:
+            return _NULL_TIMER
+        return _Trace(self, label, open=True)
+
+    def record_stage(self, name, seconds):
+        with self._lock:
+            histogram = self.stages.get(name)
+            if histogram is None:
+                histogram = self.stages[name] = Histogram()
+            histogram.observe(seconds)
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace.stages[name] = trace.stages.get(name, 0.0) + seconds
+
+    def record_model(self, ash_type, target_var, model_name, rows, seconds):
+        """One predict call of a (ash type, target, model name)"""
+        key = (ash_type.strip(), target_var, model_name)
+        with self._lock:
+            stats = self.models.get(key)
+            if stats is None:
+                stats = self.models[key] = {'calls': 0, 'rows': 0, 'latency': Histogram()}
+            stats['calls'] += 1
+            stats['rows'] += rows
+            stats['latency'].observe(seconds)
+
+    def record_trace(self, trace):
+        with self._lock:
+            histogram = self.traces.get(trace.label)
+            if histogram is None:
+                histogram = self.traces[trace.label] = Histogram()
+            histogram.observe(trace.elapsed)
+            self.last_trace = {
+                'label': trace.label,
+                'total_ms': trace.elapsed * 1000,
+                'stages_ms': {name: s * 1000 for name, s in trace.stages.items()},
+            }
+
+    def last_breakdown(self):
+        """Short text breakdown of the last trace, e.g. for a status bar"""
+        last = self.last_trace
+        if last is None:
+            return ''
+        stages = ', '.join(f"{name} {ms:.2f}" for name, ms in last['stages_ms'].items())
+        return f"{last['total_ms']:.2f} ms ({stages})" if stages else f"{last['total_ms']:.2f} ms"
+
+    def snapshot(self):
+        """JSON-serializable view of all metrics"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'stages': {name: h.to_dict() for name, h in self.stages.items()},
+                'traces': {label: h.to_dict() for label, h in self.traces.items()},
+                'models': [{
+                    'ash_type': ash_type,
+                    'target': target_var,
+                    'model': model_name,
+                    'calls': stats['calls'],
+                    'rows': stats['rows'],
+                    'latency': stats['latency'].to_dict(),
+                } for (ash_type, target_var, model_name), stats in self.models.items()],
+                'last_trace': self.last_trace,
+            }
+
+    def prometheus_text(self):
+        """Metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            _histogram_family(lines, f'{METRIC_PREFIX}_stage_seconds', 'Time spent per prediction stage',
+                              [({'stage': name}, h) for name, h in self.stages.items()])
+            _histogram_family(lines, f'{METRIC_PREFIX}_prediction_seconds',
+                              'End-to-end time of top-level predictions',
+                              [({'source': label}, h) for label, h in self.traces.items()])
+            model_labels = [({'ash_type': a, 'target': t, 'model': m}, stats)
+                            for (a, t, m), stats in self.models.items()]
+            for name, field, help_text in (('model_calls_total', 'calls', 'Model predict calls'),
+                                           ('model_rows_total', 'rows', 'Rows scored per model')):
+                lines.append(f'# HELP {METRIC_PREFIX}_{name} {help_text}')
+                lines.append(f'# TYPE {METRIC_PREFIX}_{name} counter')
+                for labels, stats in model_labels:
+                    lines.append(f'{METRIC_PREFIX}_{name}{_labels(labels)} {stats[field]}')
+            _histogram_family(lines, f'{METRIC_PREFIX}_model_latency_seconds', 'Model predict call latency',
+                              [(labels, stats['latency']) for labels, stats in model_labels])
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + '}'
+
+
+def _histogram_family(lines, name, help_text, series):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for labels, histogram in series:
+        cumulative = 0
+        for bound, n in zip(histogram.buckets + ('+Inf',), histogram.counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {histogram.sum}')
+        lines.append(f'{name}_count{_labels(labels)} {histogram.count}')
+
+
+# Process-wide collector
+METRICS = PredictionMetrics(enabled=os.environ.get('CONCRETE_METRICS', '') not in ('', '0'))
@@ -0,0 +1,458 @@
+"""
+Concrete Mixture Prediction System
+Local HTTP/JSON prediction service with asyncio micro-batching
+
+Concurrent single-mix requests are held for a few milliseconds and scored
+together: one Predictor.predict call per batch, i.e. one model call per
+(ash type, target). Model calls run in a worker pool so the event loop keeps
+accepting requests. Standard library only.
+
+Models come from a RegistryManager: POST /reload (or, with --watch, a change
+to the registry files) loads and validates the new version in the
+background, then swaps it in. Requests already queued finish on the
+version they were parsed with.
+
+Endpoints:
+    GET  /health    {"status": "ok"}
+    GET  /metadata  ash types, input and target variables
+    GET  /stats     micro-batcher counters
+    GET  /metrics   stage and per-model metrics, Prometheus text (--metrics)
+    GET  /metrics.json  the same as JSON
+    GET  /version   active registry version, reload counters and timings
+    POST /reload    reload the registry now ({"force": true} reloads an unchanged one)
+    POST /predict   {"ash_type": "RHA", "inputs": {"cement_kg_m3": 320, ...}}
+                    or {"mixes": [{"ash_type": ..., "inputs": {...}}, ...]}
+                    "coverage": 0.9 adds conformal intervals (null bounds
+                    when the model has no or too little calibration data)
+
+Usage:
+    python prediction_server.py --port 8765
+    python prediction_server.py --arrays --watch 5
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from concrete_predictor import DEFAULT_MODELS_DIR, valid_rows
+from prediction_metrics import METRICS
+from registry_manager import RegistryManager
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# How long the first request of a batch waits for company, and the batch cap
+DEFAULT_MAX_DELAY_MS = 2.0
+DEFAULT_MAX_BATCH = 512
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+# Registry versions each worker process keeps, so requests parsed just before a reload still finish
+WORKER_VERSIONS = 2
+
+# Registry manager and {version: predictor} owned by each worker process (process pool only)
+_worker_manager = None
+_worker_predictors = {}
+
+
+def _init_worker(models_dir, arrays=False):
+    """Process-pool initializer: each worker loads its own predictor"""
+    global _worker_manager
+    _worker_manager = RegistryManager(models_dir, **_predictor_options(arrays))
+    _worker_predictors[_worker_manager.version] = _worker_manager.predictor
+
+
+def _predictor_options(arrays):
+    if arrays:
+        return {'arrays': True}
+    return {'lazy': True, 'compiled': True}
+
+
+def _interval(prediction, half_width):
+    """[lower, upper] for JSON: null bounds when the half-width is NaN or inf"""
+    if not np.isfinite(half_width):
+        return [None, None]
+    return [prediction - half_width, prediction + half_width]
+
+
+def _worker_predict(X, ash_types, version=None):
+    """
+    Batch prediction inside a worker process with exactly the given registry version.
+
+    A version the worker has not loaded yet is loaded from disk; raises
+    ValueError if the files on disk have already moved past it.
+    """
+    if version is None:
+        return _worker_manager.predictor.predict(X, ash_types)
+    predictor = _worker_predictors.get(version)
+    if predictor is None:
+        _worker_manager.reload()
+        _worker_predictors[_worker_manager.version] = _worker_manager.predictor
+        while len(_worker_predictors) > WORKER_VERSIONS:
+            del _worker_predictors[next(iter(_worker_predictors))]
+        predictor = _worker_predictors.get(version)
+        if predictor is None:
+            raise ValueError(f"Registry version {version} is no longer on disk "
+                             f"(found {_worker_manager.version}); POST /reload to serve it")
+    return predictor.predict(X, ash_types)
+
+
+class MicroBatcher:
+    """Collects single-mix requests and scores them in batches"""
+
+    def __init__(self, manager, executor, max_delay_ms=DEFAULT_MAX_DELAY_MS,
+                 max_batch=DEFAULT_MAX_BATCH, max_in_flight=1, use_processes=False):
+        self.manager = manager
+        self.executor = executor
+        self.max_delay = max_delay_ms / 1000.0
+        self.max_batch = max_batch
+        self.use_processes = use_processes
+        self._queue = asyncio.Queue()
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._task = None
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, ash_type, x, predictor=None):
+        """
+        Queue one mix (registry ash key, input row); resolves to {target: value}.
+
+        predictor is the registry version the mix was parsed against
+        (default: the active one).
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((predictor or self.manager.predictor, ash_type, x, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._in_flight.acquire()
+            loop.create_task(self._score(batch))
+
+    async def _score(self, batch):
+        try:
+            # Only a batch straddling a registry swap holds more than one version
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item[0]), []).append(item)
+            for group in groups.values():
+                await self._score_group(group)
+            self.batches += 1
+            self.rows += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+        finally:
+            self._in_flight.release()
+
+    async def _score_group(self, group):
+        loop = asyncio.get_running_loop()
+        try:
+            predictor = group[0][0]
+            X = np.array([x for _, _, x, _ in group])
+            ash_types = np.array([a for _, a, _, _ in group], dtype=object)
+            if self.use_processes:
+                # The worker scores with the version the requests were parsed against
+                predictions = await loop.run_in_executor(self.executor, _worker_predict, X, ash_types,
+                                                         predictor.registry_version)
+            else:
+                predictions = await loop.run_in_executor(self.executor, predictor.predict, X, ash_types)
+            for i, (_, _, _, future) in enumerate(group):
+                if not future.done():
+                    future.set_result({t: float(p[i]) for t, p in predictions.items() if not np.isnan(p[i])})
+        except Exception as e:
+            for _, _, _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch_size': self.rows / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'queued': self._queue.qsize(),
+        }
+
+
+def _content_length(headers):
+    """Body length from the Content-Length header (0 if absent), or None if it is invalid"""
+    value = headers.get('content-length', '')
+    if not value:
+        return 0
+    # int() would also accept '+5', ' 5' or '5_0'
+    return int(value) if value.isascii() and value.isdigit() else None
+
+
+class TextBody(str):
+    """Response payload sent as plain text instead of JSON"""
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class PredictionServer:
+    """Minimal HTTP/1.1 JSON server in front of a MicroBatcher"""
+
+    REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+    def __init__(self, manager, batcher):
+        self.manager = manager
+        self.batcher = batcher
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+                    break
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                length = _content_length(headers)
+                if length is None:
+                    # The body cannot be delimited, so the connection cannot be reused
+                    status, payload = 400, {'error': 'Content-Length must be a non-negative integer'}
+                    keep_alive = False
+                elif length > MAX_BODY_BYTES:
+                    status, payload = 413, {'error': 'Request body too large'}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = await self.dispatch(method, path, body)
+
+                if isinstance(payload, TextBody):
+                    data, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4'
+                else:
+                    data, content_type = json.dumps(payload).encode('utf-8'), 'application/json'
+                writer.write(
+                    f"HTTP/1.1 {status} {self.REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, path, body):
+        """Route a request; returns (status, JSON payload)"""
+        try:
+            if path == '/health' and method == 'GET':
+                return 200, {'status': 'ok'}
+            if path == '/metadata' and method == 'GET':
+                predictor = self.manager.predictor
+                return 200, {
+                    'ash_types': [a.strip() for a in predictor.ash_types],
+                    'input_variables': predictor.input_variables,
+                    'target_variables': predictor.target_variables,
+                    'version': self.manager.version,
+                }
+            if path == '/stats' and method == 'GET':
+                return 200, self.batcher.stats()
+            if path == '/metrics.json' and method == 'GET':
+                return 200, METRICS.snapshot()
+            if path == '/metrics' and method == 'GET':
+                return 200, TextBody(METRICS.prometheus_text())
+            if path == '/version' and method == 'GET':
+                return 200, self.manager.status()
+            if path == '/reload':
+                if method != 'POST':
+                    raise HttpError(405, 'Use POST')
+                return 200, await self.reload(body)
+            if path == '/predict':
+                if method != 'POST':
+                    raise HttpError(405, 'Use POST')
+                return 200, await self.predict(body)
+            raise HttpError(404, f'Unknown path {path}')
+        except HttpError as e:
+            return e.status, {'error': e.message}
+        except Exception as e:
+            return 500, {'error': str(e)}
+
+    def parse_mix(self, predictor, mix):
+        """(registry ash key, input row) from one request mix, validated like the GUI"""
+        if not isinstance(mix, dict) or 'ash_type' not in mix:
+            raise HttpError(400, "Each mix needs an 'ash_type'")
+        try:
+            ash_type = predictor.resolve_ash_type(mix['ash_type'])
+        except (KeyError, TypeError):
+            raise HttpError(400, f"Unknown ash type: {mix['ash_type']!r}")
+        if 'values' in mix:
+            x = mix['values']
+        else:
+            inputs = mix.get('inputs', {})
+            unknown = set(inputs) - set(predictor.input_variables)
+            if unknown:
+                raise HttpError(400, f"Unknown input variables: {sorted(unknown)}")
+            x = [inputs.get(var, 0.0) for var in predictor.input_variables]
+        try:
+            x = np.asarray(x, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise HttpError(400, 'All input values must be valid numbers.')
+        if x.shape != (len(predictor.input_variables),):
+            raise HttpError(400, f"Expected {len(predictor.input_variables)} input values")
+        if not valid_rows(x.reshape(1, -1))[0]:
+            raise HttpError(400, 'Input values must be finite and non-negative.')
+        return ash_type, x
+
+    async def predict(self, body):
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            raise HttpError(400, 'Body must be JSON')
+        if not isinstance(request, dict):
+            raise HttpError(400, 'Body must be a JSON object')
+
+        # One registry version serves the whole request, even across a reload
+        predictor = self.manager.predictor
+        single = 'mixes' not in request
+        mixes = [request] if single else request['mixes']
+        parsed = [self.parse_mix(predictor, mix) for mix in mixes]
+        coverage = request.get('coverage')
+        if coverage is not None and (isinstance(coverage, bool) or not isinstance(coverage, (int, float))
+                                     or not 0 < coverage < 1):
+            raise HttpError(400, "'coverage' must be a number between 0 and 1")
+        results = await asyncio.gather(*(self.batcher.submit(a, x, predictor) for a, x in parsed))
+        payload = []
+        for (ash_type, _), predictions in zip(parsed, results):
+            item = {
+                'ash_type': ash_type.strip(),
+                'predictions': predictions,
+                'models': {t: predictor.model_name(ash_type, t) for t in predictions},
+            }
+            if coverage is not None:
+                # Half-widths are cached per model, so intervals cost no extra model calls
+                item['intervals'] = {t: _interval(p, predictor.interval_half_width(ash_type, t, coverage))
+                                     for t, p in predictions.items()}
+            payload.append(item)
+        return payload[0] if single else {'results': payload}
+
+    async def reload(self, body):
+        """Reload the registry off the event loop; returns the attempt and the resulting status"""
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            raise HttpError(400, 'Body must be JSON')
+        force = bool(request.get('force', False)) if isinstance(request, dict) else False
+        # Default executor: a slow reload does not hold up the prediction workers
+        attempt = await asyncio.get_running_loop().run_in_executor(None, self.manager.reload, force)
+        return {'reload': attempt, 'status': self.manager.status()}
+
+
+async def serve(models_dir=DEFAULT_MODELS_DIR, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=2,
+                use_processes=False, max_delay_ms=DEFAULT_MAX_DELAY_MS, max_batch=DEFAULT_MAX_BATCH,
+                ready=None, arrays=False, watch=None):
+    """
+    Run the server until cancelled.
+
+    arrays=True serves from the memory-mapped array registry; watch polls
+    the registry files every `watch` seconds and reloads them when they change.
+    """
+    manager = RegistryManager(models_dir, **_predictor_options(arrays))
+    if watch:
+        manager.start_watching(watch)
+    if use_processes:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(models_dir, arrays))
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='predict')
+
+    batcher = MicroBatcher(manager, executor, max_delay_ms=max_delay_ms, max_batch=max_batch,
+                           max_in_flight=workers, use_processes=use_processes)
+    batcher.start()
+    app = PredictionServer(manager, batcher)
+    server = await asyncio.start_server(app.handle_connection, host, port)
+    print(f"Serving predictions on http://{host}:{port} "
+          f"({workers} {'process' if use_processes else 'thread'} workers, registry {manager.version})")
+    if ready is not None:
+        ready.set()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        manager.stop_watching()
+        await batcher.stop()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON concrete prediction service")
+    parser.add_argument('--models-dir', default=DEFAULT_MODELS_DIR)
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=2, help="Worker pool size")
+    parser.add_argument('--processes', action='store_true', help="Use worker processes instead of threads")
+    parser.add_argument('--max-delay-ms', type=float, default=DEFAULT_MAX_DELAY_MS,
+                        help="How long a request may wait to be batched")
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument('--metrics', action='store_true', help="Collect stage/model metrics for /metrics")
+    parser.add_argument('--arrays', action='store_true',
+                        help="Load the memory-mapped array registry (worker processes share its pages)")
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help="Reload the registry when its files change, checking every SECONDS")
+    args = parser.parse_args()
+
+    if args.metrics:
+        METRICS.enable()
+
+    started = time.perf_counter()
+    try:
+        asyncio.run(serve(args.models_dir, args.host, args.port, args.workers, args.processes,
+                          args.max_delay_ms, args.max_batch, arrays=args.arrays, watch=args.watch))
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return 1
+    except KeyboardInterrupt:
+        print(f"\nStopped after {time.perf_counter() - started:.0f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""
+Concrete Mixture Prediction System
+Hot-reloading model registry for long-running services
+
+RegistryManager owns the active Predictor of a models directory. A reload
+(requested explicitly, or started by a change to the registry files) loads
+the new version in the background and validates it:
+
+- its input variables must equal the active version's, and every model's
+  features must be among them
+- every (ash type, target) must give finite smoke predictions, which also
+  loads every model
+
+Only then is the new predictor swapped in, by one reference assignment.
+Callers read manager.predictor once per request, so in-flight requests
+finish on the version they started with; predictor.registry_version names
+that version. A failed reload leaves the active
+version in place.
+
+Usage:
+    manager = RegistryManager('trained_models', lazy=True, compiled=True)
+    manager.start_watching()
+    predictor = manager.predictor   # once per request
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from array_registry import ARRAY_REGISTRY_DIR, MANIFEST_FILE
+from concrete_predictor import (DEFAULT_MODELS_DIR, EXAMPLE_MIX, INDEX_FILE, REGISTRY_FILE, Predictor,
+                                base_vector, file_sha256)
+
+# Files whose content identifies a registry version (the array manifest names its blob)
+VERSION_FILES = (REGISTRY_FILE, INDEX_FILE, os.path.join(ARRAY_REGISTRY_DIR, MANIFEST_FILE))
+DEFAULT_WATCH_INTERVAL = 2.0
+# Smoke mixes: the example mix scaled by each factor
+SMOKE_SCALES = (0.5, 1.0, 1.5)
+HISTORY_SIZE = 20
+# The first load is retried, e.g. when it starts while a new version is being copied in
+INITIAL_LOAD_ATTEMPTS = 3
+INITIAL_LOAD_RETRY_DELAY = 1.0
+
+
+def registry_version(models_dir=DEFAULT_MODELS_DIR):
+    """Short content hash of the registry files of a models directory"""
+    digest = hashlib.sha256()
+    for name in VERSION_FILES:
+        path = os.path.join(models_dir, name)
+        if os.path.exists(path):
+            digest.update(name.encode())
+            digest.update(file_sha256(path).encode())
+    return digest.hexdigest()[:16]
+
+
+def _stat_files(models_dir):
+    """Cheap change detector: (name, mtime, size) of the registry files"""
+    stat = []
+    for name in VERSION_FILES:
+        path = os.path.join(models_dir, name)
+        if os.path.exists(path):
+            st = os.stat(path)
+            stat.append((name, st.st_mtime_ns, st.st_size))
+    return tuple(stat)
+
+
+def validate_predictor(predictor, base_inputs=None, input_variables=None):
+    """
+    Check a freshly loaded predictor before it serves; raises ValueError.
+
+    input_variables is the input list callers already send (the active
+    version's); the new version must use exactly that list, in that order,
+    since request rows are positional. Returns the number of smoke
+    predictions made.
+    """
+    if input_variables is not None and list(predictor.input_variables) != list(input_variables):
+        added = [v for v in predictor.input_variables if v not in input_variables]
+        removed = [v for v in input_variables if v not in predictor.input_variables]
+        raise ValueError(f"input_variables differ from the active version's "
+                         f"(added {added}, removed {removed}"
+                         f"{', reordered' if not added and not removed else ''})")
+    inputs = set(predictor.input_variables)
+    X = np.outer(SMOKE_SCALES, base_vector(predictor.input_variables, base_inputs or EXAMPLE_MIX))
+    n = 0
+    for ash_type in predictor.ash_types:
+        targets = predictor.available_targets(ash_type)
+        for target_var in targets:
+            features = predictor.model_features(ash_type, target_var)
+            missing = [f for f in features if f not in inputs]
+            if not features or missing:
+                raise ValueError(f"{ash_type.strip()} / {target_var}: features {missing or features} "
+                                 f"do not match input_variables")
+        if not targets:
+            continue
+        predictor.preload(ash_type)
+        predictions = predictor.predict(X, ash_type, targets)
+        bad = [t for t in targets if not np.isfinite(predictions[t]).all()]
+        if bad:
+            raise ValueError(f"{ash_type.strip()}: non-finite smoke predictions for {bad}")
+        n += len(targets) * len(X)
+    if n == 0:
+        raise ValueError("The registry has no models")
+    return n
+
+
+class RegistryManager:
+    """
+    Active predictor of a models directory with validated, atomic reloads.
+
+    predictor_options are passed to Predictor.from_directory for every
+    version (e.g. lazy=True, compiled=True or arrays=True).
+    """
+
+    def __init__(self, models_dir=DEFAULT_MODELS_DIR, load=True, **predictor_options):
+        self.models_dir = models_dir
+        self.predictor_options = predictor_options
+        self.predictor = None
+        self.version = None
+        self.generation = 0
+        self.loaded_at = None
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.last_error = None
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        # Registry file stats when the last reload started (the watcher's baseline)
+        self._attempted_stat = None
+        if load:
+            for attempt in range(INITIAL_LOAD_ATTEMPTS):
+                if attempt:
+                    time.sleep(INITIAL_LOAD_RETRY_DELAY)
+                if self.reload()['swapped']:
+                    break
+            else:
+                raise ValueError(f"Could not load {models_dir}: {self.last_error}")
+
+    def reload(self, force=False):
+        """
+        Load, validate and swap in the directory's current version; returns the attempt record.
+
+        Unless force is set, nothing is loaded when the version is already
+        active. Reloads are serialized; the active predictor keeps serving
+        throughout.
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            self._attempted_stat = _stat_files(self.models_dir)
+            version = registry_version(self.models_dir)
+            attempt = {'version': version, 'at': time.time(), 'swapped': False, 'error': None,
+                       'load_ms': None, 'validate_ms': None, 'total_ms': None}
+            if version == self.version and not force:
+                attempt['total_ms'] = 1000 * (time.perf_counter() - start)
+                return attempt
+            try:
+                predictor = Predictor.from_directory(self.models_dir, **self.predictor_options)
+                loaded = time.perf_counter()
+                attempt['load_ms'] = 1000 * (loaded - start)
+                active = self.predictor
+                attempt['smoke_predictions'] = validate_predictor(
+                    predictor, input_variables=active.input_variables if active is not None else None)
+                attempt['validate_ms'] = 1000 * (time.perf_counter() - loaded)
+                # Files replaced while loading: the predictor may mix two versions
+                if registry_version(self.models_dir) != version:
+                    raise ValueError("Registry files changed while loading; will retry on the next change")
+            except Exception as e:
+                attempt['error'] = f"{type(e).__name__}: {e}"
+                self.failed_reloads += 1
+                self.last_error = attempt['error']
+            else:
+                # The swap: requests holding the old predictor finish on it
+                predictor.registry_version = version
+                self.predictor = predictor
+                self.version = version
+                self.generation += 1
+                self.loaded_at = attempt['at']
+                self.reloads += 1
+                self.last_error = None
+                attempt['swapped'] = True
+            attempt['total_ms'] = 1000 * (time.perf_counter() - start)
+            self.history.append(attempt)
+            return attempt
+
+    def request_reload(self, force=False):
+        """Start reload() on a background thread and return the thread"""
+        thread = threading.Thread(target=self.reload, kwargs={'force': force}, name='registry-reload',
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def start_watching(self, interval=DEFAULT_WATCH_INTERVAL):
+        """Poll the registry files every interval seconds and reload after they change"""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name='registry-watch',
+                                         daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self, interval):
+        last = None
+        while not self._stop.wait(interval):
+            current = _stat_files(self.models_dir)
+            # Reload files that differ from the last attempt once they have been quiet for an interval
+            if current != self._attempted_stat and current == last:
+                self.reload()
+            last = current
+
+    def status(self):
+        """Active version, counters and recent reload timings (JSON-serializable)"""
+        return {
+            'models_dir': self.models_dir,
+            'version': self.version,
+            'generation': self.generation,
+            'loaded_at': self.loaded_at,
+            'reloads': self.reloads,
+            'failed_reloads': self.failed_reloads,
+            'last_error': self.last_error,
+            'reloading': self._reload_lock.locked(),
+            'watching': self._watcher is not None,
+            'history': list(self.history),
+        }
@@ -5,9 +5,10 @@ Launcher script for Concrete Predictor GUI
 
 import sys
 import os
+import importlib.util
 
 def check_requirements():
-    """Check if required packages are installed"""
+    """Check if required packages are installed (without importing them)"""
     required_packages = {
         'numpy': 'numpy',
         'pandas': 'pandas',
@@ -18,9 +19,7 @@ def check_requirements():
     
     missing = []
     for module, package in required_packages.items():
-        try:
-            __import__(module)
-        except ImportError:
+        if importlib.util.find_spec(module) is None:
             missing.append(package)
     
     if missing:
@@ -0,0 +1,43 @@
+"""Shared test setup: the repository's flat modules, trained models and a tiny synthetic registry"""
+
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(ROOT, 'trained_models')
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+ASH_TYPE = 'TEST 1'
+TARGET = 'cost_USD_per_m3'
+INPUTS = ['cement_kg_m3', 'ash_kg_m3', 'water kg_m3']
+
+
+def write_registry(models_dir, offset, input_variables=INPUTS):
+    """A one-model registry predicting sum(inputs) + offset; returns its registry_version"""
+    import joblib
+    from sklearn.linear_model import LinearRegression
+    from sklearn.preprocessing import StandardScaler
+    from concrete_predictor import REGISTRY_FILE
+    from registry_manager import registry_version
+
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 500, (50, len(input_variables)))
+    scaler = StandardScaler().fit(X)
+    model = LinearRegression().fit(scaler.transform(X), X.sum(axis=1) + offset)
+    registry = {
+        'ash_types': [ASH_TYPE],
+        'target_variables': [TARGET],
+        'input_variables': list(input_variables),
+        'models': {ASH_TYPE: {TARGET: {'name': 'Linear Regression', 'model': model, 'scaler': scaler,
+                                       'features': list(input_variables)}}},
+    }
+    # Write then rename, as a deployment would
+    path = os.path.join(models_dir, REGISTRY_FILE)
+    joblib.dump(registry, path + '.tmp')
+    os.replace(path + '.tmp', path)
+    return registry_version(models_dir)
@@ -0,0 +1,68 @@
+"""Bulk scorer: row statuses, defaults for unused inputs and chunked output"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bulk_score import STATUS_COLUMN, bulk_score, score_chunk
+from conftest import MODELS_DIR
+from concrete_predictor import EXAMPLE_MIX, Predictor
+
+FLY_ASH = 'pozzolan added(Fly Ash) kgm3'  # read only by the POFA models
+
+
+@pytest.fixture(scope='module')
+def predictor():
+    return Predictor.from_directory(MODELS_DIR, lazy=True)
+
+
+def _frame(predictor, ash_types, **overrides):
+    """One example mix per ash type label; overrides replace whole input columns"""
+    frame = pd.DataFrame({var: [EXAMPLE_MIX.get(var, 0.0)] * len(ash_types) for var in predictor.input_variables})
+    frame['ash_type'] = ash_types
+    for var, values in overrides.items():
+        frame[var] = values
+    return frame
+
+
+def test_status_codes(predictor):
+    cement = 'cement_kg_m3'
+    frame = _frame(predictor, ['RHA', 'RHA', 'RHA', 'XYZ', None, 'POFA'],
+                   **{cement: [300.0, -1.0, 'abc', 300.0, 300.0, 300.0]})
+    out = score_chunk(predictor, frame)
+    assert out[STATUS_COLUMN].tolist() == ['ok', 'invalid inputs', 'invalid inputs', 'unknown ash type',
+                                          'unknown ash type', 'ok']
+    target = predictor.target_variables[0]
+    assert out[target].notna().tolist() == [True, False, False, False, False, True]
+    expected = predictor.predict_one('RHA', {var: frame.at[0, var] for var in predictor.input_variables})
+    assert out.at[0, target] == pytest.approx(expected[target])
+
+
+def test_unused_inputs_default_to_zero(predictor):
+    """A blank or absent input the row's models do not read counts as 0; one they read does not"""
+    frame = _frame(predictor, ['RHA', 'RHA', 'POFA'], **{FLY_ASH: [np.nan, ' ', np.nan]})
+    out = score_chunk(predictor, frame)
+    assert out[STATUS_COLUMN].tolist() == ['ok', 'ok', 'invalid inputs']
+
+    absent = frame.drop(columns=FLY_ASH)
+    out = score_chunk(predictor, absent)
+    assert out[STATUS_COLUMN].tolist() == ['ok', 'ok', 'invalid inputs']
+    assert score_chunk(predictor, absent.iloc[:2], ash_type='RHA')[STATUS_COLUMN].eq('ok').all()
+    with pytest.raises(ValueError, match='Missing input columns'):
+        score_chunk(predictor, absent, ash_type='POFA')
+
+
+def test_unused_input_must_still_be_valid(predictor):
+    frame = _frame(predictor, ['RHA', 'RHA'], **{FLY_ASH: [-5.0, 'abc']})
+    assert score_chunk(predictor, frame)[STATUS_COLUMN].tolist() == ['invalid inputs'] * 2
+
+
+def test_bulk_score_csv_in_chunks(predictor, tmp_path):
+    frame = _frame(predictor, ['RHA', 'XYZ', 'POFA'] * 5)
+    frame.to_csv(tmp_path / 'mixes.csv', index=False)
+    summary = bulk_score(str(tmp_path / 'mixes.csv'), str(tmp_path / 'scored.csv'), MODELS_DIR,
+                         chunk_size=4, verbose=False)
+    assert (summary['rows'], summary['scored'], summary['skipped']) == (15, 10, 5)
+    scored = pd.read_csv(tmp_path / 'scored.csv')
+    assert len(scored) == 15
+    assert scored[STATUS_COLUMN].tolist() == ['ok', 'unknown ash type', 'ok'] * 5
@@ -0,0 +1,140 @@
+"""Per-sheet dataset cache: only sheets whose values changed are cleaned again"""
+
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import concrete_dataset
+from concrete_dataset import INPUT_VARIABLES, TARGET_VARIABLES, load_clean_datasets, sheet_hashes
+
+SHEETS = ['POFA 1', 'RHA 1', 'SCBA 1']
+
+
+def _sheet(seed, n=40):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.uniform(1, 100, (n, len(INPUT_VARIABLES) + len(TARGET_VARIABLES))).round(2),
+                      columns=INPUT_VARIABLES + TARGET_VARIABLES)
+    df['paper'] = [f'paper {seed}-{k % 3}' for k in range(n)]
+    return df
+
+
+def _write(path, frames):
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for name, df in frames.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    frames = {name: _sheet(k) for k, name in enumerate(SHEETS)}
+    path = str(tmp_path / 'mixes.xlsx')
+    _write(path, frames)
+    return path, frames
+
+
+@pytest.fixture
+def cleaned(monkeypatch):
+    """Names of the sheets clean_dataset() is called for"""
+    calls = []
+    clean = concrete_dataset.clean_dataset
+
+    def counting_clean(df, ash_type_name, verbose=True):
+        calls.append(ash_type_name)
+        return clean(df, ash_type_name, verbose)
+
+    monkeypatch.setattr(concrete_dataset, 'clean_dataset', counting_clean)
+    return calls
+
+
+def _load(path, cache_dir):
+    return load_clean_datasets(path, str(cache_dir), verbose=False)[1]
+
+
+def test_unchanged_workbook_is_read_from_cache(workbook, tmp_path, cleaned):
+    path, _ = workbook
+    first = _load(path, tmp_path / 'cache')
+    assert cleaned == SHEETS
+    second = _load(path, tmp_path / 'cache')
+    assert cleaned == SHEETS
+    for name in SHEETS:
+        pd.testing.assert_frame_equal(second[name].reset_index(drop=True), first[name].reset_index(drop=True),
+                                      check_dtype=False)
+
+
+def test_one_changed_sheet_is_rebuilt(workbook, tmp_path, cleaned):
+    path, frames = workbook
+    _load(path, tmp_path / 'cache')
+    frames['RHA 1'].loc[0, 'cement_kg_m3'] = 55.5
+    _write(path, frames)
+    cleaned.clear()
+    datasets = _load(path, tmp_path / 'cache')
+    assert cleaned == ['RHA 1']
+    assert 55.5 in datasets['RHA 1']['cement_kg_m3'].to_numpy()
+
+
+def _shared_string_package(path, sheets):
+    """Minimal .xlsx with every string in one shared table, numbered in order of first use"""
+    main, rel = concrete_dataset._XLSX_NS['main'], concrete_dataset._XLSX_NS['rel']
+    strings = []
+    parts = {}
+    for k, rows in enumerate(sheets.values(), start=1):
+        xml_rows = []
+        for r, row in enumerate(rows, start=1):
+            cells = []
+            for c, value in enumerate(row):
+                ref = f"{chr(ord('A') + c)}{r}"
+                if isinstance(value, str):
+                    if value not in strings:
+                        strings.append(value)
+                    cells.append(f'<c r="{ref}" t="s"><v>{strings.index(value)}</v></c>')
+                else:
+                    cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+            xml_rows.append(f'<row r="{r}">{"".join(cells)}</row>')
+        parts[f'xl/worksheets/sheet{k}.xml'] = (f'<worksheet xmlns="{main}"><sheetData>{"".join(xml_rows)}'
+                                                f'</sheetData></worksheet>')
+    parts['xl/sharedStrings.xml'] = (f'<sst xmlns="{main}">'
+                                     + ''.join(f'<si><t>{s}</t></si>' for s in strings) + '</sst>')
+    parts['xl/workbook.xml'] = (f'<workbook xmlns="{main}" xmlns:r="{rel}"><sheets>'
+                                + ''.join(f'<sheet name="{name}" sheetId="{k}" r:id="rId{k}"/>'
+                                          for k, name in enumerate(sheets, start=1)) + '</sheets></workbook>')
+    parts['xl/_rels/workbook.xml.rels'] = (
+        f'<Relationships xmlns="{concrete_dataset._XLSX_NS["pkg"]}">'
+        + ''.join(f'<Relationship Id="rId{k}" Target="worksheets/sheet{k}.xml"/>'
+                  for k in range(1, len(sheets) + 1)) + '</Relationships>')
+    with zipfile.ZipFile(path, 'w') as z:
+        for name, xml in parts.items():
+            z.writestr(name, xml)
+
+
+def test_strings_added_elsewhere_keep_other_sheets(tmp_path):
+    """A new string early in the shared-string table renumbers every later one"""
+    path = str(tmp_path / 'shared.xlsx')
+    sheets = {'POFA 1': [['paper a', 1.5]], 'RHA 1': [['paper b', 2.5, 'paper a']]}
+    _shared_string_package(path, sheets)
+    before = sheet_hashes(path)
+    with zipfile.ZipFile(path) as z:
+        rha_xml = z.read('xl/worksheets/sheet2.xml')
+
+    sheets['POFA 1'][0].insert(0, 'a new paper')
+    _shared_string_package(path, sheets)
+    after = sheet_hashes(path)
+    with zipfile.ZipFile(path) as z:
+        assert z.read('xl/worksheets/sheet2.xml') != rha_xml  # its indices moved
+    assert after['RHA 1'] == before['RHA 1'] and after['POFA 1'] != before['POFA 1']
+
+
+def test_new_cleaning_code_rebuilds_everything(workbook, tmp_path, cleaned, monkeypatch):
+    path, _ = workbook
+    _load(path, tmp_path / 'cache')
+    monkeypatch.setattr(concrete_dataset, 'cleaning_version', lambda: 'changed')
+    cleaned.clear()
+    _load(path, tmp_path / 'cache')
+    assert cleaned == SHEETS
+
+
+def test_sheet_hashes_of_other_files(tmp_path):
+    path = tmp_path / 'mixes.csv'
+    _sheet(0).to_csv(path, index=False)
+    assert sheet_hashes(str(path)) is None
@@ -0,0 +1,83 @@
+"""Fused linear models must match the sklearn scaler + model pipeline they replace"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import MODELS_DIR
+from concrete_predictor import LINEAR_MODEL_CLASSES, Predictor, load_model_index
+
+TOLERANCE = 1e-9
+
+
+def _linear_pairs():
+    index = load_model_index(MODELS_DIR)
+    return [(ash_type, target_var)
+            for ash_type, models in index['models'].items()
+            for target_var, meta in models.items()
+            if meta['model_class'] in LINEAR_MODEL_CLASSES]
+
+
+@pytest.fixture(scope='module')
+def predictor():
+    return Predictor.from_directory(MODELS_DIR)
+
+
+def _probe_rows(entry, n_inputs, n_rows=256, seed=0):
+    """Raw input rows spread over +-3 standard deviations of the model's features"""
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n_rows, n_inputs))
+    mean, scale = entry['scaler'].mean_, entry['scaler'].scale_
+    X[:, entry['feature_idx']] = mean + scale * rng.uniform(-3, 3, (n_rows, len(mean)))
+    return X
+
+
+@pytest.mark.parametrize('ash_type,target_var', _linear_pairs())
+def test_fused_matches_sklearn(predictor, ash_type, target_var):
+    fused = predictor._fused_linear(ash_type)
+    assert fused is not None and target_var in fused['targets'], "linear model was not fused"
+
+    entry = predictor._model_entry(ash_type, target_var)
+    X = _probe_rows(entry, len(predictor.input_variables))
+    features = pd.DataFrame(X[:, entry['feature_idx']], columns=entry['features'])
+    expected = entry['model'].predict(entry['scaler'].transform(features))
+
+    actual = predictor.predict(X, ash_type, [target_var])[target_var]
+    np.testing.assert_allclose(actual, expected, rtol=TOLERANCE, atol=TOLERANCE)
+
+
+def test_fused_batch_matches_unfused(predictor):
+    """All of an ash type's fused targets in one call equal the unfused predictor's"""
+    unfused = Predictor.from_directory(MODELS_DIR, fuse_linear=False)
+    rng = np.random.default_rng(1)
+    for ash_type in predictor.ash_types:
+        fused = predictor._fused_linear(ash_type)
+        if fused is None:
+            continue
+        X = rng.uniform(0, 500, (64, len(predictor.input_variables)))
+        actual = predictor.predict(X, ash_type, fused['targets'])
+        expected = unfused.predict(X, ash_type, fused['targets'])
+        for target_var in fused['targets']:
+            np.testing.assert_allclose(actual[target_var], expected[target_var],
+                                       rtol=TOLERANCE, atol=TOLERANCE)
+
+
+def test_disagreeing_fold_falls_back_to_sklearn(tmp_path, monkeypatch):
+    """A folded model that fails its check warns and is served by scaler + model instead"""
+    import concrete_predictor
+    from conftest import ASH_TYPE, INPUTS, TARGET, write_registry
+
+    write_registry(str(tmp_path), 0)
+    fold = concrete_predictor.fold_linear_model
+
+    def bad_fold(*args):
+        weights, intercept = fold(*args)
+        return weights, intercept + 1.0
+
+    monkeypatch.setattr(concrete_predictor, 'fold_linear_model', bad_fold)
+    with pytest.warns(RuntimeWarning, match='disagrees with sklearn'):
+        predictor = Predictor.from_directory(str(tmp_path), fuse_linear=True)
+        predictor.preload(ASH_TYPE)
+    assert predictor._fused_linear(ASH_TYPE) is None
+    X = np.random.default_rng(2).uniform(0, 500, (16, len(INPUTS)))
+    np.testing.assert_allclose(predictor.predict(X, ASH_TYPE, [TARGET])[TARGET], X.sum(axis=1), atol=1e-6)
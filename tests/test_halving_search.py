@@ -0,0 +1,87 @@
+"""Successive-halving search: elimination per fold, shared staged fits, early stopping and the budget"""
+
+import numpy as np
+import pytest
+from sklearn.base import BaseEstimator, RegressorMixin
+
+from train_models import HALVING_FACTOR, _staged_predictions, get_models, halving_search
+
+FITS = []
+
+
+class Constant(BaseEstimator, RegressorMixin):
+    """Predicts c everywhere; records every fit"""
+
+    def __init__(self, c=0.0):
+        self.c = c
+
+    def fit(self, X, y):
+        FITS.append(self.c)
+        return self
+
+    def predict(self, X):
+        return np.full(len(X), self.c)
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 1, (90, 3))
+    return X, 4.0 + X @ [1.0, -2.0, 0.5] + 0.1 * rng.standard_normal(90)
+
+
+def test_candidates_are_halved_each_fold(data):
+    X, y = data
+    FITS.clear()
+    grid = {'c': [float(c) for c in range(9)]}
+    model, params = halving_search(Constant(), 'Constant', grid, X, y, n_folds=3)
+    # 9 candidates on the first fold, the best third on the second, then one refit of the winner
+    assert len(FITS) == 9 + 9 // HALVING_FACTOR + 1
+    assert params == {'c': 4.0} and model.c == 4.0
+
+
+def test_budget_stops_new_fits(data):
+    X, y = data
+    FITS.clear()
+    _, params = halving_search(Constant(), 'Constant', {'c': [1.0, 4.0, 7.0]}, X, y, n_folds=3, budget=0)
+    # Out of time after the first fit: the only scored candidate wins and is refit
+    assert FITS == [1.0, 1.0] and params == {'c': 1.0}
+
+
+@pytest.mark.parametrize('model_name', ['Random Forest', 'Gradient Boosting'])
+def test_staged_predictions_equal_smaller_ensembles(data, model_name):
+    """The first n trees of a seeded ensemble predict like the n-tree ensemble"""
+    X, y = data
+    model = get_models(threads=1)[model_name].set_params(n_estimators=20, max_depth=3)
+    staged = _staged_predictions(model.fit(X, y), model_name, X, [5, 20])
+    for n in (5, 20):
+        small = get_models(threads=1)[model_name].set_params(n_estimators=n, max_depth=3).fit(X, y)
+        np.testing.assert_allclose(staged[n], small.predict(X), rtol=1e-10)
+
+
+def test_staged_candidates_share_one_fit(data, monkeypatch):
+    """Candidates differing only in n_estimators are scored from one fit of the largest"""
+    from sklearn.ensemble import RandomForestRegressor
+    X, y = data
+    sizes, fit = [], RandomForestRegressor.fit
+
+    def counting_fit(self, *args, **kwargs):
+        sizes.append(self.n_estimators)
+        return fit(self, *args, **kwargs)
+
+    monkeypatch.setattr(RandomForestRegressor, 'fit', counting_fit)
+    model, params = halving_search(get_models(threads=1)['Random Forest'], 'Random Forest',
+                                   {'n_estimators': [5, 10, 20], 'max_depth': [2]}, X, y, n_folds=3)
+    # One shared fit on the first fold leaves a single candidate, which is refit
+    assert sizes == [20, params['n_estimators']] and model.n_estimators == params['n_estimators']
+
+
+def test_boosters_stop_early(data):
+    pytest.importorskip('xgboost')
+    X, _ = data
+    y = np.random.default_rng(1).standard_normal(len(X))  # nothing to learn: held-out loss stops improving
+    grid = {'n_estimators': [50, 400], 'learning_rate': [0.3], 'max_depth': [2, 3]}
+    model, params = halving_search(get_models(threads=1)['XGBoost'], 'XGBoost', grid, X, y, n_folds=3)
+    # Rounds are not searched: the winner gets its mean early-stopping round count
+    assert isinstance(params['n_estimators'], int) and 1 <= params['n_estimators'] < 400
+    assert model.get_params()['n_estimators'] == params['n_estimators']
@@ -0,0 +1,95 @@
+"""Split-conformal intervals: the half-width rule and the shipped calibration"""
+
+import math
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from conftest import MODELS_DIR, ROOT
+from concrete_dataset import DEFAULT_DATASET
+from concrete_predictor import Predictor, conformal_half_width, load_model_index
+
+
+@pytest.mark.parametrize('n', [9, 17, 99, 100])
+@pytest.mark.parametrize('coverage', [0.5, 0.8, 0.9, 0.95])
+def test_half_width_is_the_ceil_rank(n, coverage):
+    """The half-width is the ceil((n + 1) * coverage)-th smallest residual, inf past n"""
+    residuals = np.arange(1.0, n + 1)
+    k = math.ceil((n + 1) * coverage)
+    expected = float(k) if k <= n else float('inf')
+    assert conformal_half_width(residuals, coverage) == expected
+
+
+def test_half_width_edges():
+    # 17 rows (CCA's validation split) reach 90% but not 95%
+    assert conformal_half_width(np.arange(1.0, 18), 0.9) == 17.0
+    assert conformal_half_width(np.arange(1.0, 18), 0.95) == float('inf')
+    assert conformal_half_width(np.array([]), 0.5) == float('inf')
+    for coverage in (0.0, 1.0, 1.5):
+        with pytest.raises(ValueError):
+            conformal_half_width(np.arange(1.0, 10), coverage)
+
+
+def test_coverage_on_exchangeable_data():
+    """Averaged over many calibration sets, coverage is at least the nominal level"""
+    rng = np.random.default_rng(0)
+    n_cal, n_new, trials = 19, 200, 2000
+    for coverage in (0.8, 0.9):
+        covered = 0
+        for _ in range(trials):
+            residuals = np.sort(np.abs(rng.standard_t(3, n_cal)))
+            width = conformal_half_width(residuals, coverage)
+            covered += np.count_nonzero(np.abs(rng.standard_t(3, n_new)) <= width)
+        rate = covered / (trials * n_new)
+        # The exact guarantee is k / (n + 1); sampling error here is about 0.002
+        assert rate >= math.ceil((n_cal + 1) * coverage) / (n_cal + 1) - 0.01
+
+
+@pytest.fixture(scope='module')
+def predictor():
+    return Predictor.from_directory(MODELS_DIR)
+
+
+def test_shipped_half_widths(predictor):
+    """Calibrated models give finite widths from their residuals; the rest give NaN bounds"""
+    index = load_model_index(MODELS_DIR)
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 400, (8, len(predictor.input_variables)))
+    for ash_type, models in index['models'].items():
+        predictions, lower, upper = predictor.predict_interval(X, ash_type, list(models))
+        for target_var, meta in models.items():
+            width = predictor.interval_half_width(ash_type, target_var)
+            if meta.get('calibration') is None:
+                assert math.isnan(width)
+                assert np.isnan(lower[target_var]).all()
+                continue
+            assert width == conformal_half_width(meta['calibration'])
+            np.testing.assert_allclose(upper[target_var] - predictions[target_var], width, atol=1e-9)
+            np.testing.assert_allclose(predictions[target_var] - lower[target_var], width, atol=1e-9)
+
+
+def test_calibrate_only_keeps_models(tmp_path):
+    """--calibrate-only reproduces the shipped residuals and leaves the fitted models untouched"""
+    import joblib
+    from train_models import calibrate_saved_models
+    dataset = os.path.join(ROOT, DEFAULT_DATASET)
+    if not os.path.exists(dataset):
+        pytest.skip(f"{DEFAULT_DATASET} not found")
+    models_dir = str(tmp_path / 'models')
+    shutil.copytree(MODELS_DIR, models_dir)
+    calibrated = calibrate_saved_models(dataset, models_dir, cache_dir=None, verbose=False)
+
+    shipped = load_model_index(MODELS_DIR)['models']
+    assert sorted(calibrated) == sorted((a, t) for a, models in shipped.items()
+                                        for t, meta in models.items() if meta.get('calibration') is not None)
+    rng = np.random.default_rng(0)
+    for ash_type, target_var in calibrated:
+        meta = shipped[ash_type][target_var]
+        saved = joblib.load(os.path.join(models_dir, meta['file']))
+        original = joblib.load(os.path.join(MODELS_DIR, meta['file']))
+        np.testing.assert_array_equal(saved['calibration'], meta['calibration'])
+        np.testing.assert_array_equal(saved['scaler'].mean_, original['scaler'].mean_)
+        X = rng.standard_normal((32, len(meta['features'])))
+        np.testing.assert_array_equal(saved['model'].predict(X), original['model'].predict(X))
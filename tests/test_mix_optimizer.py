@@ -0,0 +1,66 @@
+"""Mix optimizer: the Pareto mask and the derived replacement percentage"""
+
+import numpy as np
+import pytest
+
+from conftest import MODELS_DIR
+from concrete_predictor import Predictor
+from mix_optimizer import derived_replacement, optimize_mix, pareto_mask
+
+ASH = 'RHA'
+
+
+def _dominated(objectives):
+    """Brute force: rows some other row beats in one objective and ties or beats in the other"""
+    better_eq = (objectives[None, :, :] <= objectives[:, None, :]).all(axis=2)
+    better = (objectives[None, :, :] < objectives[:, None, :]).any(axis=2)
+    return (better_eq & better).any(axis=1)
+
+
+@pytest.mark.parametrize('n', [0, 1, 2, 50, 500])
+def test_pareto_mask_matches_brute_force(n):
+    objectives = np.random.default_rng(n).standard_normal((n, 2))
+    np.testing.assert_array_equal(pareto_mask(objectives), ~_dominated(objectives))
+
+
+def test_pareto_mask_ties():
+    objectives = np.array([[1.0, 5.0], [1.0, 3.0], [2.0, 3.0], [3.0, 1.0], [3.0, 1.0], [4.0, 0.5]])
+    # [1, 5] and [2, 3] are dominated by [1, 3]; of two identical points one is kept
+    assert pareto_mask(objectives).tolist() == [False, True, False, True, False, True]
+
+
+@pytest.fixture(scope='module')
+def predictor():
+    return Predictor.from_directory(MODELS_DIR)
+
+
+def _run(predictor, **options):
+    return optimize_mix(predictor, ASH, population=500, generations=3, seed=0, **options)
+
+
+def _columns(predictor, inputs, *names):
+    return [inputs[:, predictor.input_variables.index(name)] for name in names]
+
+
+def test_replacement_is_derived_within_its_bound(predictor):
+    """A replacement_pct bound is honoured by the derived value, not overwritten"""
+    result = _run(predictor, bounds={'replacement_pct': (10.0, 15.0)})
+    pct, cement, ash = _columns(predictor, result['inputs'], 'replacement_pct', 'cement_kg_m3', 'ash_kg_m3')
+    np.testing.assert_allclose(pct, derived_replacement(cement, ash))
+    assert (pct >= 10.0 - 1e-9).all() and (pct <= 15.0 + 1e-9).all()
+    assert (result['violation'] == 0).all()
+
+
+def test_unreachable_replacement_bound_is_a_violation(predictor):
+    # Without ash the derived percentage is 0, below the bound
+    result = _run(predictor, bounds={'replacement_pct': (20.0, 30.0), 'ash_kg_m3': (0.0, 0.0)})
+    assert not result['feasible']
+    np.testing.assert_array_equal(result['inputs'][:, predictor.input_variables.index('replacement_pct')], 0)
+    assert (result['violation'] >= 20.0).all()
+
+
+def test_replacement_searched_independently(predictor):
+    result = _run(predictor, bounds={'replacement_pct': (10.0, 15.0)}, derive_replacement=False)
+    pct, cement, ash = _columns(predictor, result['inputs'], 'replacement_pct', 'cement_kg_m3', 'ash_kg_m3')
+    assert (pct >= 10.0).all() and (pct <= 15.0).all()
+    assert not np.allclose(pct, derived_replacement(cement, ash))
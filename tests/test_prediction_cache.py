@@ -0,0 +1,115 @@
+"""PredictionCache: hits, misses, expiry, eviction and reloads on registry changes"""
+
+import time
+
+import numpy as np
+import pytest
+
+from conftest import ASH_TYPE, INPUTS, TARGET, write_registry
+from concrete_predictor import Predictor
+from prediction_cache import PredictionCache
+
+ROW = [300.0, 100.0, 180.0]
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    write_registry(str(tmp_path), 0)
+    return str(tmp_path)
+
+
+def _cache(models_dir, **options):
+    return PredictionCache(Predictor.from_directory(models_dir), **options)
+
+
+def _predict(cache, rows):
+    return cache.predict(np.array(rows, dtype=float), ASH_TYPE, [TARGET])[TARGET]
+
+
+def test_hits_and_misses(models_dir):
+    cache = _cache(models_dir)
+    first = _predict(cache, [ROW])
+    assert cache.stats()['misses'] == 1 and cache.stats()['hits'] == 0
+    np.testing.assert_array_equal(_predict(cache, [ROW]), first)
+    # A second, new row in the same batch is a miss; the known one a hit
+    _predict(cache, [ROW, [1.0, 2.0, 3.0]])
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 2, 2)
+    np.testing.assert_allclose(first, sum(ROW), atol=1e-6)
+
+
+def test_quantized_keys_share_entries(models_dir):
+    cache = _cache(models_dir, decimals=3)
+    _predict(cache, [ROW])
+    nearby = [ROW[0] + 1e-4, ROW[1], ROW[2]]
+    np.testing.assert_array_equal(_predict(cache, [nearby]), _predict(cache, [ROW]))
+    assert cache.stats()['hits'] == 2
+
+
+def test_exact_keys_match_the_predictor(models_dir):
+    """decimals=None neither rounds nor merges nearby mixes"""
+    cache = _cache(models_dir, decimals=None)
+    nearby = [ROW[0] + 1e-4, ROW[1], ROW[2]]
+    rows = np.array([ROW, nearby])
+    expected = cache.predictor.predict(rows, ASH_TYPE, [TARGET])[TARGET]
+    np.testing.assert_array_equal(_predict(cache, rows), expected)
+    assert cache.stats()['entries'] == 2
+    values = dict(zip(INPUTS, nearby))
+    assert cache.predict_one(ASH_TYPE, values) == cache.predictor.predict_one(ASH_TYPE, values)
+
+
+def test_ttl_expiry(models_dir):
+    cache = _cache(models_dir, ttl=0.05)
+    _predict(cache, [ROW])
+    _predict(cache, [ROW])
+    time.sleep(0.1)
+    _predict(cache, [ROW])
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations']) == (1, 2, 1)
+
+
+def test_lru_eviction_and_large_batches(models_dir):
+    cache = _cache(models_dir, max_entries=2, max_cached_rows=4)
+    for k in range(3):
+        _predict(cache, [[k, 0.0, 0.0]])
+    assert cache.stats()['evictions'] == 1 and cache.stats()['entries'] == 2
+    _predict(cache, [[0.0, 0.0, 0.0]])  # the least recently used row was evicted
+    assert cache.stats()['hits'] == 0
+    _predict(cache, np.ones((5, 3)))
+    assert cache.stats()['bypassed_rows'] == 5
+
+
+def test_registry_change_reloads_the_predictor(models_dir, tmp_path):
+    """A new registry version is loaded before the cache refills, and save() keeps its hash"""
+    cache = _cache(models_dir)
+    np.testing.assert_allclose(_predict(cache, [ROW]), sum(ROW), atol=1e-6)
+    old_predictor, old_hash = cache.predictor, cache.registry_hash
+
+    write_registry(models_dir, 100)
+    np.testing.assert_allclose(_predict(cache, [ROW]), sum(ROW) + 100, atol=1e-6)
+    assert cache.predictor is not old_predictor and cache.registry_hash != old_hash
+    stats = cache.stats()
+    assert (stats['invalidations'], stats['entries'], stats['hits']) == (1, 1, 0)
+
+    path = str(tmp_path / 'cache.joblib')
+    cache.save(path)
+    warm = PredictionCache(Predictor.from_directory(models_dir), persist_path=path)
+    np.testing.assert_allclose(_predict(warm, [ROW]), sum(ROW) + 100, atol=1e-6)
+    assert warm.stats()['hits'] == 1
+
+
+def test_failed_reload_keeps_the_current_version(models_dir, capsys):
+    cache = _cache(models_dir)
+    _predict(cache, [ROW])
+    old_predictor, old_hash = cache.predictor, cache.registry_hash
+
+    write_registry(models_dir, 100, INPUTS[::-1])  # refused: inputs reordered
+    np.testing.assert_allclose(_predict(cache, [ROW]), sum(ROW), atol=1e-6)
+    assert cache.predictor is old_predictor and cache.registry_hash == old_hash
+    assert cache.stats()['hits'] == 1 and cache.stats()['invalidations'] == 0
+    assert 'Could not reload' in capsys.readouterr().out
+
+    _predict(cache, [ROW])  # not retried until the files change again
+    assert 'Could not reload' not in capsys.readouterr().out
+    write_registry(models_dir, 100)
+    np.testing.assert_allclose(_predict(cache, [ROW]), sum(ROW) + 100, atol=1e-6)
@@ -0,0 +1,132 @@
+"""Prediction server: micro-batching, request validation and HTTP status codes"""
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from conftest import ASH_TYPE, INPUTS, TARGET, write_registry
+from prediction_server import MicroBatcher, PredictionServer
+from registry_manager import RegistryManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    write_registry(str(tmp_path), 0)
+    return RegistryManager(str(tmp_path))
+
+
+def _run(manager, client, max_delay_ms=20.0):
+    """Serve on an ephemeral port, run client(port, batcher) and return its result"""
+    async def main():
+        executor = ThreadPoolExecutor(max_workers=2)
+        batcher = MicroBatcher(manager, executor, max_delay_ms=max_delay_ms, max_in_flight=2)
+        batcher.start()
+        server = await asyncio.start_server(PredictionServer(manager, batcher).handle_connection,
+                                            '127.0.0.1', 0)
+        try:
+            return await client(server.sockets[0].getsockname()[1], batcher)
+        finally:
+            server.close()
+            await server.wait_closed()
+            await batcher.stop()
+            executor.shutdown()
+    return asyncio.run(main())
+
+
+async def _request(port, method, path, body=b'', headers=None):
+    """One raw HTTP/1.1 exchange; returns (status, JSON body, connection header)"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    if headers is None:
+        headers = {'Content-Length': str(len(body))}
+    head = ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\n{head}\r\n".encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    response_headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        response_headers[name.strip().lower()] = value.strip()
+    data = await reader.readexactly(int(response_headers['content-length']))
+    writer.close()
+    return status, json.loads(data), response_headers.get('connection')
+
+
+def _mix(row, **extra):
+    return json.dumps({'ash_type': ASH_TYPE.strip(), 'inputs': dict(zip(INPUTS, row)), **extra}).encode()
+
+
+def test_concurrent_requests_are_batched(manager):
+    rows = np.random.default_rng(0).uniform(0, 500, (24, len(INPUTS)))
+
+    async def client(port, batcher):
+        responses = await asyncio.gather(*(_request(port, 'POST', '/predict', _mix(row.tolist()))
+                                           for row in rows))
+        return responses, batcher.stats()
+
+    responses, stats = _run(manager, client)
+    assert [status for status, _, _ in responses] == [200] * len(rows)
+    expected = manager.predictor.predict(rows, ASH_TYPE, [TARGET])[TARGET]
+    actual = [payload['predictions'][TARGET] for _, payload, _ in responses]
+    np.testing.assert_allclose(actual, expected, rtol=1e-12)
+    assert stats['rows'] == len(rows)
+    assert stats['batches'] < len(rows) and stats['largest_batch'] > 1
+
+
+def test_batch_request_and_intervals(manager):
+    rows = [[300.0, 100.0, 180.0], [200.0, 50.0, 150.0]]
+    body = json.dumps({'mixes': [json.loads(_mix(row)) for row in rows], 'coverage': 0.9}).encode()
+
+    async def client(port, _):
+        return await _request(port, 'POST', '/predict', body)
+
+    status, payload, _ = _run(manager, client)
+    assert status == 200
+    results = payload['results']
+    np.testing.assert_allclose([r['predictions'][TARGET] for r in results], np.sum(rows, axis=1), atol=1e-6)
+    # The synthetic model has no calibration residuals: null bounds
+    assert results[0]['intervals'][TARGET] == [None, None]
+
+
+@pytest.mark.parametrize('method,path,body,status', [
+    ('GET', '/health', b'', 200),
+    ('GET', '/nowhere', b'', 404),
+    ('GET', '/predict', b'', 405),
+    ('POST', '/predict', b'not json', 400),
+    ('POST', '/predict', b'[1, 2]', 400),
+    ('POST', '/predict', json.dumps({'ash_type': 'XYZ', 'inputs': {}}).encode(), 400),
+    ('POST', '/predict', json.dumps({'ash_type': 'TEST', 'inputs': {'bogus': 1}}).encode(), 400),
+    ('POST', '/predict', _mix([300.0, -1.0, 180.0]), 400),
+    ('POST', '/predict', _mix([300.0, 100.0, 180.0], coverage=1.5), 400),
+])
+def test_status_codes(manager, method, path, body, status):
+    async def client(port, _):
+        return await _request(port, method, path, body)
+
+    got, payload, _ = _run(manager, client)
+    assert got == status
+    assert ('error' in payload) == (status != 200)
+
+
+@pytest.mark.parametrize('length', ['abc', '-5', '+5', '1.5', '5 5', '0x10'])
+def test_invalid_content_length_is_rejected(manager, length):
+    """A Content-Length that is not a plain non-negative integer gets 400 and closes the connection"""
+    async def client(port, _):
+        return await _request(port, 'POST', '/predict', b'', headers={'Content-Length': length})
+
+    status, payload, connection = _run(manager, client)
+    assert status == 400 and 'Content-Length' in payload['error']
+    assert connection == 'close'
+
+
+def test_oversized_body_is_rejected(manager):
+    async def client(port, _):
+        return await _request(port, 'POST', '/predict', b'', headers={'Content-Length': str(11 * 1024 * 1024)})
+
+    status, _, connection = _run(manager, client)
+    assert status == 413 and connection == 'close'
@@ -0,0 +1,85 @@
+"""Hot reloads: validation against the active version and swaps under load"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from conftest import ASH_TYPE, INPUTS, TARGET, write_registry
+from registry_manager import RegistryManager
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    return str(tmp_path)
+
+
+def test_reload_swaps_a_valid_version(models_dir):
+    write_registry(models_dir, 0)
+    manager = RegistryManager(models_dir)
+    old = manager.predictor
+    version = write_registry(models_dir, 100)
+    attempt = manager.reload()
+    assert attempt['swapped'] and attempt['error'] is None
+    assert manager.predictor is not old and manager.predictor.registry_version == version
+    assert manager.reload()['swapped'] is False  # already active
+
+
+@pytest.mark.parametrize('inputs', [INPUTS + ['curing_days'], INPUTS[:-1], INPUTS[::-1]],
+                         ids=['added', 'removed', 'reordered'])
+def test_reload_refuses_changed_input_variables(models_dir, inputs):
+    """A version whose inputs differ from the active list is refused, even if self-consistent"""
+    first = write_registry(models_dir, 0)
+    manager = RegistryManager(models_dir)
+    active = manager.predictor
+    write_registry(models_dir, 0, inputs)
+    attempt = manager.reload()
+    assert not attempt['swapped']
+    assert 'input_variables differ' in attempt['error']
+    assert manager.predictor is active and manager.version == first
+    assert manager.failed_reloads == 1
+
+
+def test_swap_during_in_flight_requests(models_dir):
+    """Requests that started on a version finish on it; later requests see the new one"""
+    offsets = {write_registry(models_dir, 0): 0.0}
+    manager = RegistryManager(models_dir)
+    X = np.random.default_rng(1).uniform(0, 500, (200, len(INPUTS)))
+    expected = X.sum(axis=1)
+    stop = threading.Event()
+    seen, errors = [], []
+
+    def client():
+        while not stop.is_set():
+            predictor = manager.predictor  # once per request
+            version = predictor.registry_version
+            try:
+                first = predictor.predict(X, ASH_TYPE, [TARGET])[TARGET]
+                time.sleep(0.001)  # the swap can land mid-request
+                second = predictor.predict(X, ASH_TYPE, [TARGET])[TARGET]
+                np.testing.assert_allclose(first, expected + offsets[version], atol=1e-6)
+                np.testing.assert_array_equal(first, second)
+            except Exception as e:
+                errors.append(e)
+            seen.append(version)
+
+    threads = [threading.Thread(target=client) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        time.sleep(0.05)
+        new_version = write_registry(models_dir, 100)
+        offsets[new_version] = 100.0
+        assert manager.reload()['swapped']
+        swapped_at = len(seen)
+        time.sleep(0.05)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert not errors, errors[0]
+    assert set(seen) == set(offsets)
+    # At most one in-flight request per client finishes on the old version after the swap
+    assert seen[swapped_at + len(threads):] and set(seen[swapped_at + len(threads):]) == {new_version}
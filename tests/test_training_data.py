@@ -0,0 +1,68 @@
+"""train_models.py's cleaning and splits must reproduce the shipped models' summary metrics"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import MODELS_DIR, ROOT
+from concrete_dataset import DEFAULT_DATASET, clean_dataset, load_datasets
+from train_models import SUMMARY_FILE, prepare_data
+
+DATASET = os.path.join(ROOT, DEFAULT_DATASET)
+METRIC_COLUMNS = {'Train R²': 'train_r2', 'Test R²': 'test_r2', 'Val R²': 'val_r2',
+                  'Val RMSE': 'val_rmse', 'Val MAE': 'val_mae'}
+# The shipped WSA models were fit on 358 cleaned rows; the workbook now cleans to 362
+NOT_REPRODUCIBLE = {'WSA'}
+
+
+def _summary_rows():
+    summary = pd.read_csv(os.path.join(MODELS_DIR, SUMMARY_FILE), encoding='utf-8')
+    rows = []
+    for _, row in summary.iterrows():
+        marks = [pytest.mark.xfail(strict=True, reason="fit on rows the workbook no longer cleans to")
+                 ] if row['Ash Type'] in NOT_REPRODUCIBLE else []
+        rows.append(pytest.param(row, marks=marks, id=f"{row['Ash Type'].strip()}-{row['Target Variable']}"))
+    return rows
+
+
+@pytest.fixture(scope='module')
+def prepared():
+    if not os.path.exists(DATASET):
+        pytest.skip(f"{DEFAULT_DATASET} not found")
+    ash_types, raw = load_datasets(DATASET)
+    datasets_clean = {ash_type: clean_dataset(raw[ash_type], ash_type, verbose=False) for ash_type in ash_types}
+    splits, targets, _ = prepare_data(datasets_clean, ash_types, verbose=False)
+    return ash_types, splits, targets
+
+
+def _metrics(model, split, data):
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+    metrics = {}
+    for part in ('train', 'test', 'val'):
+        y_true, y_pred = data[f'y_{part}'], model.predict(split[f'X_{part}'])
+        metrics[f'{part}_r2'] = r2_score(y_true, y_pred)
+        metrics[f'{part}_rmse'] = np.sqrt(mean_squared_error(y_true, y_pred))
+        metrics[f'{part}_mae'] = mean_absolute_error(y_true, y_pred)
+    return metrics
+
+
+@pytest.mark.parametrize('row', _summary_rows())
+def test_shipped_summary_reproduces(prepared, row):
+    """Each shipped model, scored on the script's splits, gives its summary row to 4 decimals"""
+    import joblib
+    from concrete_predictor import fix_xgboost_model, model_file_name
+    ash_types, splits, targets = prepared
+    ash_type = next(a for a in ash_types if a.replace(' 1', '') == row['Ash Type'])
+    data = targets[(ash_type, row['Target Variable'])]
+    split = splits[data['split_id']]
+    saved = joblib.load(os.path.join(MODELS_DIR, model_file_name(ash_type, row['Target Variable'])))
+
+    # The split's scaler is the one the model was fit with
+    np.testing.assert_allclose(split['scaler'].mean_, saved['scaler'].mean_, rtol=1e-12)
+    fix_xgboost_model(saved['model'])
+    metrics = _metrics(saved['model'], split, data)
+    actual = {column: f"{metrics[key]:.4f}" for column, key in METRIC_COLUMNS.items()}
+    expected = {column: f"{row[column]:.4f}" for column in METRIC_COLUMNS}
+    assert actual == expected
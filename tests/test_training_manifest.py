@@ -0,0 +1,119 @@
+"""Incremental training: job hashes and the manifest's reuse and retrain decisions"""
+
+import json
+import os
+
+import joblib
+import numpy as np
+import pytest
+
+import train_models
+from concrete_predictor import model_file_name
+from train_models import (COST_KEYS, METRIC_KEYS, attach_saved_models, job_hashes, read_training_manifest,
+                          reused_records, write_training_manifest)
+
+ASH = 'TEST 1'
+PAIRS = [(ASH, 'cost_USD_per_m3'), (ASH, 'Slump(mm)')]
+FEATURES = ['cement_kg_m3', 'water kg_m3']
+BEST = 'Linear Regression'
+
+
+def _targets(**changed):
+    """Slice hashes per pair; changed maps a target to a new hash"""
+    return {(a, t): {'hash': changed.get(t, f'slice-{t}')} for a, t in PAIRS}
+
+
+def _tasks():
+    return [(a, t, FEATURES) for a, t in PAIRS]
+
+
+def _record(ash_type, target_var, model_name, error=None):
+    result = None if error else dict({key: 0.5 for key in METRIC_KEYS + COST_KEYS}, model=object())
+    return {'ash_type': ash_type, 'target_var': target_var, 'model_name': model_name, 'result': result,
+            'best_params': {}, 'error': error, 'seconds': 1.0}
+
+
+@pytest.fixture
+def trained(tmp_path):
+    """A models directory as left by a full run: pickles plus the manifest"""
+    from sklearn.linear_model import LinearRegression
+    hashes = job_hashes(_targets(), _tasks())
+    records = [_record(a, t, m, error='boom' if m == 'Lasso Regression' else None) for a, t, m in hashes]
+    best_models = {ASH: {}}
+    for ash_type, target_var in PAIRS:
+        model = LinearRegression().fit(np.eye(2), [1.0, 2.0])
+        joblib.dump({'model': model, 'calibration': np.array([0.1, 0.2])},
+                    os.path.join(tmp_path, model_file_name(ash_type, target_var)))
+        best_models[ASH][target_var] = {'name': BEST, 'model': model, 'features': FEATURES, 'metrics': {}}
+    write_training_manifest(str(tmp_path), records, hashes, best_models)
+    return str(tmp_path), hashes
+
+
+def _unfitted_best(target_var, name=BEST):
+    return {ASH: {target_var: {'name': name, 'model': None, 'features': FEATURES, 'metrics': {}}}}
+
+
+def test_job_hashes_change_only_with_their_inputs(monkeypatch):
+    hashes = job_hashes(_targets(), _tasks())
+    assert len(hashes) == len(PAIRS) * len(train_models.get_models())
+    assert job_hashes(_targets(), _tasks()) == hashes
+
+    # New data for one pair: only that pair's jobs change
+    changed = job_hashes(_targets(**{'Slump(mm)': 'new'}), _tasks())
+    assert {job for job in hashes if changed[job] != hashes[job]} == {job for job in hashes
+                                                                     if job[1] == 'Slump(mm)'}
+
+    # A new grid for one model: only that model's jobs change
+    grids = train_models.get_param_grids()
+    grids['Ridge Regression'] = {'alpha': [1.0]}
+    monkeypatch.setattr(train_models, 'get_param_grids', lambda: grids)
+    changed = job_hashes(_targets(), _tasks())
+    assert {job for job in hashes if changed[job] != hashes[job]} == {job for job in hashes
+                                                                     if job[2] == 'Ridge Regression'}
+    assert job_hashes(_targets(), _tasks(), search='halving', budget=5) != hashes
+
+
+def test_unchanged_jobs_are_reused(trained):
+    models_dir, hashes = trained
+    manifest = read_training_manifest(models_dir)
+    records = reused_records(manifest, hashes)
+    assert {(r['ash_type'], r['target_var'], r['model_name']) for r in records} == set(hashes)
+    failed = [r for r in records if r['model_name'] == 'Lasso Regression']
+    assert all(r['result'] is None and r['error'] == 'boom' for r in failed)
+    ok = [r for r in records if r['result'] is not None]
+    assert all(r['result']['model'] is None and r['result']['val_r2'] == 0.5 for r in ok)
+
+
+def test_changed_jobs_are_retrained(trained):
+    models_dir, _ = trained
+    manifest = read_training_manifest(models_dir)
+    hashes = job_hashes(_targets(**{'Slump(mm)': 'new'}), _tasks())
+    reused = {(r['ash_type'], r['target_var'], r['model_name']) for r in reused_records(manifest, hashes)}
+    assert reused == {job for job in hashes if job[1] != 'Slump(mm)'}
+    # No manifest, or one from another format: everything is retrained
+    assert reused_records(None, hashes) == []
+    manifest['format'] = -1
+    with open(os.path.join(models_dir, train_models.MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    assert read_training_manifest(models_dir) is None
+
+
+def test_saved_pickles_are_attached_only_when_they_match(trained):
+    models_dir, hashes = trained
+    manifest = read_training_manifest(models_dir)
+    target_var = PAIRS[0][1]
+
+    best_models = _unfitted_best(target_var)
+    loaded, refit = attach_saved_models(best_models, manifest, hashes, models_dir)
+    assert refit == [] and best_models[ASH][target_var]['model'] is not None
+    np.testing.assert_array_equal(loaded[(ASH, target_var)], [0.1, 0.2])
+
+    # Another model became the best: its fitted object was never saved
+    loaded, refit = attach_saved_models(_unfitted_best(target_var, 'Ridge Regression'), manifest, hashes,
+                                        models_dir)
+    assert loaded == {} and refit == [(ASH, target_var, 'Ridge Regression')]
+
+    # The pickle was replaced after the manifest was written
+    joblib.dump({'model': None}, os.path.join(models_dir, model_file_name(ASH, target_var)))
+    loaded, refit = attach_saved_models(_unfitted_best(target_var), manifest, hashes, models_dir)
+    assert loaded == {} and refit == [(ASH, target_var, BEST)]
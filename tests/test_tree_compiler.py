@@ -0,0 +1,182 @@
+"""Compiled tree ensembles must reproduce the native libraries' predictions"""
+
+import os
+
+import numpy as np
+import pytest
+
+from conftest import MODELS_DIR
+from tree_compiler import (CHECK_ATOL, CHECK_RTOL, COMPILED_DIR, DEDUP_MIN_ROWS, CompiledEnsemble,
+                           export_ensemble, load_compiled, probe_inputs)
+
+N_FEATURES = 4
+# One batch on each side of the dedup threshold
+BATCH_SIZES = (DEDUP_MIN_ROWS // 8, 2 * DEDUP_MIN_ROWS)
+
+
+def _sklearn(name):
+    def make():
+        from sklearn import ensemble, tree
+        if name == 'DecisionTreeRegressor':
+            return tree.DecisionTreeRegressor(max_depth=6, random_state=0)
+        if name == 'RandomForestRegressor':
+            return ensemble.RandomForestRegressor(n_estimators=10, max_depth=5, random_state=0)
+        return ensemble.GradientBoostingRegressor(n_estimators=20, max_depth=3, random_state=0)
+    return make
+
+
+def _xgboost():
+    xgboost = pytest.importorskip('xgboost')
+    return xgboost.XGBRegressor(n_estimators=20, max_depth=4, random_state=0, verbosity=0)
+
+
+def _lightgbm():
+    lightgbm = pytest.importorskip('lightgbm')
+    return lightgbm.LGBMRegressor(n_estimators=20, num_leaves=15, random_state=0, verbose=-1)
+
+
+def _catboost():
+    catboost = pytest.importorskip('catboost')
+    return catboost.CatBoostRegressor(iterations=20, depth=4, random_state=0, verbose=0,
+                                      allow_writing_files=False)
+
+
+LIBRARIES = {
+    'DecisionTreeRegressor': _sklearn('DecisionTreeRegressor'),
+    'RandomForestRegressor': _sklearn('RandomForestRegressor'),
+    'GradientBoostingRegressor': _sklearn('GradientBoostingRegressor'),
+    'XGBRegressor': _xgboost,
+    'LGBMRegressor': _lightgbm,
+    'CatBoostRegressor': _catboost,
+}
+
+
+@pytest.fixture(scope='module', params=sorted(LIBRARIES))
+def fitted(request):
+    """(native model, compiled ensemble) fitted on scaled synthetic mixes"""
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((400, N_FEATURES))
+    y = 30 + 5 * X[:, 0] - 3 * X[:, 1] ** 2 + 2 * np.sin(3 * X[:, 2]) + X[:, 3] * X[:, 0]
+    model = LIBRARIES[request.param]().fit(X, y)
+    return model, export_ensemble(model)
+
+
+def _batch(compiled, n_rows, n_features=N_FEATURES, seed=0):
+    """Probe rows (on and just above split thresholds) repeated, so large batches dedup"""
+    distinct = probe_inputs(compiled, n_features, n_rows=min(n_rows, 256), seed=seed)
+    return distinct[np.random.default_rng(seed).integers(0, len(distinct), n_rows)]
+
+
+@pytest.mark.parametrize('n_rows', BATCH_SIZES)
+def test_compiled_matches_native(fitted, n_rows):
+    model, compiled = fitted
+    X = _batch(compiled, n_rows)
+    expected = np.asarray(model.predict(X), dtype=np.float64).reshape(-1)
+    np.testing.assert_allclose(compiled.predict(X), expected, rtol=CHECK_RTOL, atol=CHECK_ATOL)
+
+
+def test_dedup_branch_is_taken_and_exact(fitted):
+    """Above DEDUP_MIN_ROWS only the distinct threshold cells are walked, with identical results"""
+    _, compiled = fitted
+    X = _batch(compiled, 2 * DEDUP_MIN_ROWS)
+    walked = []
+    walk = compiled._walk
+
+    def counting_walk(X_walk, has_nan):
+        walked.append(X_walk.shape[0])
+        return walk(X_walk, has_nan)
+
+    compiled._walk = counting_walk
+    try:
+        deduped = compiled.predict(X)
+    finally:
+        del compiled._walk
+    assert walked and walked[0] <= X.shape[0] // 2
+    full = compiled._walk(np.ascontiguousarray(X, dtype=compiled._threshold.dtype), False)
+    np.testing.assert_array_equal(deduped, full)
+
+
+def _stump(threshold, input_dtype):
+    """One split on feature 0: left leaf 1.0, right leaf 2.0"""
+    return CompiledEnsemble(feature=[0, 0, 0], threshold=[threshold, 0.0, 0.0], left=[1, 1, 2],
+                            right=[2, 1, 2], value=[0.0, 1.0, 2.0], default_left=[True, False, False],
+                            roots=[0], input_dtype=input_dtype)
+
+
+def test_float32_threshold_rounding():
+    """float32 inputs compare like the libraries: float32(x) <= t64, even when t64 is not a float32"""
+    threshold = 0.1  # float32(0.1) rounds up, above the float64 threshold
+    x32 = np.float32(0.1)
+    below = np.nextafter(x32, np.float32(-np.inf))
+    compiled = _stump(threshold, 'float32')
+    X = np.array([[below], [x32], [threshold]], dtype=np.float64)
+    expected = np.where(X[:, 0].astype(np.float32).astype(np.float64) <= threshold, 1.0, 2.0)
+    np.testing.assert_array_equal(compiled.predict(X), expected)
+    np.testing.assert_array_equal(expected, [1.0, 2.0, 2.0])
+
+    # float64 ensembles compare the input unrounded
+    np.testing.assert_array_equal(_stump(threshold, 'float64').predict(X), [1.0, 2.0, 1.0])
+
+
+def test_sibling_renumbering():
+    """Node tables whose right child does not follow the left one are renumbered, not mispredicted"""
+    # Root 0 splits on x0 <= 0 into node 3 (left) and node 1 (right); node 1 splits x1 <= 0 into 4 / 2
+    compiled = CompiledEnsemble(feature=[0, 1, 0, 0, 0], threshold=[0.0, 0.0, 0.0, 0.0, 0.0],
+                                left=[3, 4, 2, 3, 4], right=[1, 2, 2, 3, 4],
+                                value=[0.0, 0.0, 30.0, 10.0, 20.0], default_left=[True] * 5, roots=[0],
+                                input_dtype='float64')
+    internal = compiled.left != np.arange(compiled.n_nodes)
+    assert np.array_equal(compiled.right[internal], compiled.left[internal] + 1)
+    X = np.array([[-1.0, 5.0], [1.0, -1.0], [1.0, 1.0], [0.0, 0.0]])
+    np.testing.assert_array_equal(compiled.predict(X), [10.0, 20.0, 30.0, 10.0])
+
+
+def _shipped_compiled():
+    directory = os.path.join(MODELS_DIR, COMPILED_DIR)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory) if name.endswith('.npz'))
+
+
+@pytest.mark.parametrize('file_name', _shipped_compiled())
+def test_shipped_compiled_models_match_pickles(file_name):
+    """Every exported model in trained_models/compiled matches its pickle on both batch sizes"""
+    import joblib
+    from concrete_predictor import fix_xgboost_model
+    compiled = load_compiled(os.path.join(MODELS_DIR, COMPILED_DIR, file_name))
+    saved = joblib.load(os.path.join(MODELS_DIR, file_name[:-len('.npz')] + '.pkl'))
+    model = saved['model']
+    fix_xgboost_model(model)
+    for n_rows in BATCH_SIZES:
+        X = _batch(compiled['model'], n_rows, len(compiled['features']))
+        expected = np.asarray(model.predict(X), dtype=np.float64).reshape(-1)
+        np.testing.assert_allclose(compiled['model'].predict(X), expected,
+                                   rtol=CHECK_RTOL, atol=CHECK_ATOL)
+
+
+def test_mismatch_removes_stale_compiled_file(tmp_path, monkeypatch):
+    """A model that no longer compiles exactly loses both its index entry and its old .npz"""
+    import joblib
+    from sklearn.preprocessing import StandardScaler
+    import tree_compiler
+    from concrete_predictor import load_model_index, model_file_name, write_model_index
+
+    models_dir = str(tmp_path)
+    X = np.random.default_rng(0).uniform(0, 10, (200, N_FEATURES))
+    model = _sklearn('DecisionTreeRegressor')().fit(X, X.sum(axis=1))
+    ash_type, target_var, features = 'TEST 1', 'cost_USD_per_m3', [f'x{k}' for k in range(N_FEATURES)]
+    joblib.dump({'model': model, 'scaler': StandardScaler().fit(X), 'features': features,
+                 'model_name': 'Decision Tree'}, os.path.join(models_dir, model_file_name(ash_type, target_var)))
+    write_model_index(models_dir, {
+        'ash_types': [ash_type], 'target_variables': [target_var], 'input_variables': features,
+        'models': {ash_type: {target_var: {'name': 'Decision Tree', 'model': model, 'features': features}}}})
+
+    tree_compiler.compile_directory(models_dir, verbose=False)
+    meta = load_model_index(models_dir)['models'][ash_type][target_var]
+    npz = os.path.join(models_dir, meta['compiled'])
+    assert os.path.exists(npz)
+
+    monkeypatch.setattr(tree_compiler, 'check_compiled', lambda *args: (False, 1.0))
+    assert tree_compiler.compile_directory(models_dir, verbose=False) == {(ash_type, target_var): 1.0}
+    assert 'compiled' not in load_model_index(models_dir)['models'][ash_type][target_var]
+    assert not os.path.exists(npz)
@@ -0,0 +1,1082 @@
+"""
+Concrete Mixture Prediction System
+Scripted training pipeline (the training steps of concrete_ml_analysis.ipynb)
+
+Cleans each ash type sheet, splits 75/15/10, grid-searches the 10 models for
+every (ash type, target) and exports the best model by validation R², exactly
+like the notebook. The (ash type, target, model) jobs run in a process pool
+with a per-worker thread limit, so boosters and GridSearchCV do not
+oversubscribe the CPU. Splits and scalers are computed once per distinct set
+of rows and shared by every model and target that uses them.
+
+Training is incremental: training_manifest.json records a content hash of
+every job's inputs (data slice, features, model settings, grid, library
+version and training code) with its metrics. A rerun only trains jobs whose
+hash changed and reuses the stored results and best-model pickles for the
+rest.
+
+--search halving swaps GridSearchCV for successive halving over the CV folds,
+with early stopping for the boosters and an optional per-target time budget;
+--compare-search reports its time saving and validation R² against the grid.
+Each candidate's size, load time and predict latency are measured, and
+--policy can trade accuracy for lighter models when picking the best one.
+--pooled also fits the pooled multi-ash layout (pooled_models.py) and
+compares it with the per-pair models. Every exported model carries its
+sorted absolute validation residuals, the calibration data of the
+predictor's split-conformal intervals; --calibrate-only attaches them to
+an existing models directory without refitting.
+
+Usage:
+    python train_models.py --data REVISED_DATASET.xlsx --out trained_models --workers 4
+    python train_models.py --search halving --budget 10
+    python train_models.py --pooled
+    python train_models.py --calibrate-only
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from concrete_dataset import (DEFAULT_CACHE_DIR, DEFAULT_DATASET, INPUT_VARIABLES, TARGET_VARIABLES,
+                              load_clean_datasets)
+from concrete_predictor import (DEFAULT_COVERAGE, DEFAULT_MODELS_DIR, INDEX_FILE, REGISTRY_FILE,
+                                conformal_half_width, file_sha256, load_model_index, model_file_name,
+                                write_model_index)
+
+SUMMARY_FILE = 'best_models_summary.csv'
+TIMINGS_FILE = 'training_timings.csv'
+MANIFEST_FILE = 'training_manifest.json'
+MANIFEST_FORMAT_VERSION = 1
+# Model parameters that only set parallelism or run logging and never change the fitted model
+RUNTIME_PARAMS = ('n_jobs', 'thread_count', 'allow_writing_files')
+METRIC_KEYS = [f'{part}_{metric}' for part in ('train', 'test', 'val') for metric in ('r2', 'rmse', 'mae')]
+# Inference costs measured for every fitted candidate (see measure_costs)
+COST_KEYS = ['size_bytes', 'load_ms', 'single_ms', 'batch_ms']
+LATENCY_BATCH_ROWS = 1000
+LATENCY_REPEATS = 20
+# Best-model selection policies (see selection_policy)
+SELECTION_POLICIES = ('accuracy', 'budget', 'tolerance')
+DEFAULT_DELTA_R2 = 0.005
+
+# Submission order: slowest grid searches first keeps the pool busy to the end
+JOB_ORDER = ['CatBoost', 'Random Forest', 'Gradient Boosting', 'XGBoost', 'LightGBM',
+             'Decision Tree', 'ElasticNet', 'Ridge Regression', 'Lasso Regression', 'Linear Regression']
+
+SEARCH_STRATEGIES = ('grid', 'halving')
+# Successive halving keeps the best 1/HALVING_FACTOR of the candidates after each CV fold
+HALVING_FACTOR = 3
+# Boosters whose number of rounds is found by early stopping instead of the grid
+EARLY_STOPPING_PARAMS = {'XGBoost': 'n_estimators', 'LightGBM': 'n_estimators', 'CatBoost': 'iterations'}
+EARLY_STOPPING_ROUNDS = 10
+# Ensembles whose first n trees equal an n-tree ensemble: one fit scores every grid value
+STAGED_PARAMS = {'Random Forest': 'n_estimators', 'Gradient Boosting': 'n_estimators'}
+COMPARISON_FILE = 'search_comparison.csv'
+
+# Shared read-only training data of a worker process (see _init_worker)
+_worker_splits = None
+_worker_targets = None
+_worker_threads = None
+
+
+def get_models(threads=None):
+    """The 10 candidate models; threads caps each model's own parallelism"""
+    from catboost import CatBoostRegressor
+    from lightgbm import LGBMRegressor
+    from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+    from sklearn.linear_model import ElasticNet, Lasso, LinearRegression, Ridge
+    from sklearn.tree import DecisionTreeRegressor
+    from xgboost import XGBRegressor
+
+    n_jobs = {} if threads is None else {'n_jobs': threads}
+    models = {
+        'Linear Regression': LinearRegression(),
+        'Ridge Regression': Ridge(),
+        'Lasso Regression': Lasso(),
+        'ElasticNet': ElasticNet(),
+        'Decision Tree': DecisionTreeRegressor(random_state=42),
+        'Random Forest': RandomForestRegressor(random_state=42, **n_jobs),
+        'Gradient Boosting': GradientBoostingRegressor(random_state=42),
+        'XGBoost': XGBRegressor(random_state=42, verbosity=0, **n_jobs),
+        'LightGBM': LGBMRegressor(random_state=42, verbose=-1, **n_jobs),
+        # No catboost_info/ training logs in the working directory
+        'CatBoost': CatBoostRegressor(random_state=42, verbose=0, allow_writing_files=False,
+                                      **({} if threads is None else {'thread_count': threads})),
+    }
+    return models
+
+
+def get_param_grids():
+    """Hyperparameter grids for tuning"""
+    param_grids = {
+        'Linear Regression': {},
+        'Ridge Regression': {'alpha': [0.1, 1.0, 10.0]},
+        'Lasso Regression': {'alpha': [0.1, 1.0, 10.0]},
+        'ElasticNet': {'alpha': [0.1, 1.0], 'l1_ratio': [0.3, 0.5, 0.7]},
+        'Decision Tree': {'max_depth': [5, 10, 15], 'min_samples_split': [2, 5]},
+        'Random Forest': {'n_estimators': [50, 100], 'max_depth': [10, 20], 'min_samples_split': [2, 5]},
+        'Gradient Boosting': {'n_estimators': [50, 100], 'learning_rate': [0.01, 0.1], 'max_depth': [3, 5]},
+        'XGBoost': {'n_estimators': [50, 100], 'learning_rate': [0.01, 0.1], 'max_depth': [3, 5]},
+        'LightGBM': {'n_estimators': [50, 100], 'learning_rate': [0.01, 0.1], 'num_leaves': [31, 50]},
+        'CatBoost': {'iterations': [50, 100], 'learning_rate': [0.01, 0.1], 'depth': [4, 6]}
+    }
+    return param_grids
+
+
+def split_data(X, y, random_state=42):
+    """Split into train (75%), test (15%) and validation (10%)"""
+    from sklearn.model_selection import train_test_split
+
+    # First split: 75% train, 25% temp
+    X_train, X_temp, y_train, y_temp = train_test_split(X, y, test_size=0.25, random_state=random_state)
+
+    # Second split: 15% test (60% of temp), 10% validation (40% of temp)
+    X_test, X_val, y_test, y_val = train_test_split(X_temp, y_temp, test_size=0.4, random_state=random_state)
+
+    return X_train, X_test, X_val, y_train, y_test, y_val
+
+
+def cv_folds(n_train):
+    """GridSearchCV folds used by the notebook for a training set size"""
+    return min(3, n_train // 10 if n_train >= 30 else 2)
+
+
+def budget_shares():
+    """
+    Fraction of a (ash type, target) time budget given to each model's search.
+
+    Shares are proportional to grid size; the budget is a cap, so cheap
+    models simply finish early.
+    """
+    from sklearn.model_selection import ParameterGrid
+
+    sizes = {name: len(ParameterGrid(grid)) if grid else 0 for name, grid in get_param_grids().items()}
+    total = sum(sizes.values())
+    return {name: size / total for name, size in sizes.items()}
+
+
+def _fit_early_stopping(model, model_name, X_train, y_train, X_eval, y_eval):
+    """Fit a booster, stopping once (X_eval, y_eval) stops improving; returns the best number of rounds"""
+    if model_name == 'XGBoost':
+        model.set_params(early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+        model.fit(X_train, y_train, eval_set=[(X_eval, y_eval)], verbose=False)
+        return model.best_iteration + 1
+    if model_name == 'LightGBM':
+        import lightgbm
+        model.fit(X_train, y_train, eval_set=[(X_eval, y_eval)],
+                  callbacks=[lightgbm.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+        return model.best_iteration_
+    model.fit(X_train, y_train, eval_set=(X_eval, y_eval), early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+    return model.get_best_iteration() + 1
+
+
+def _staged_predictions(model, model_name, X, stages):
+    """{n: predictions of the first n trees/stages} of a fitted Random Forest or Gradient Boosting model"""
+    wanted = set(stages)
+    if model_name == 'Gradient Boosting':
+        return {n: pred for n, pred in enumerate(model.staged_predict(X), start=1) if n in wanted}
+    totals = np.cumsum([tree.predict(X) for tree in model.estimators_], axis=0)
+    return {n: totals[n - 1] / n for n in wanted}
+
+
+def halving_search(model, model_name, param_grid, X, y, n_folds, budget=None):
+    """
+    Successive-halving replacement for GridSearchCV; returns (fitted best model, best params).
+
+    Each CV fold is one rung: the surviving candidates are scored on the
+    next fold and only the best 1/HALVING_FACTOR (by mean R² so far) move
+    on, until one is left. Boosters in EARLY_STOPPING_PARAMS are not
+    searched over their number of rounds: each fit stops early on its
+    held-out fold (like xgboost.cv) and the winner is refit with its mean
+    best round count. For STAGED_PARAMS models, candidates differing only
+    in n_estimators share one fit of the largest (the first n trees of a
+    seeded ensemble are the n-tree ensemble). After budget seconds no new
+    fits start and the best candidate among those scored on the most folds
+    wins.
+    """
+    from sklearn.base import clone
+    from sklearn.metrics import r2_score
+    from sklearn.model_selection import KFold, ParameterGrid
+
+    deadline = None if budget is None else time.perf_counter() + budget
+    rounds_param = EARLY_STOPPING_PARAMS.get(model_name)
+    staged_param = STAGED_PARAMS.get(model_name)
+    grid = dict(param_grid)
+    if rounds_param in grid:
+        grid[rounds_param] = [max(grid[rounds_param])]
+    candidates = list(ParameterGrid(grid))
+    scores = [[] for _ in candidates]
+    rounds = [[] for _ in candidates]
+
+    alive = list(range(len(candidates)))
+    out_of_time = False
+    for train_idx, eval_idx in KFold(n_folds).split(X):
+        if len(alive) == 1:
+            break
+        X_fit, y_fit, X_eval, y_eval = X[train_idx], y[train_idx], X[eval_idx], y[eval_idx]
+        groups = {}
+        for i in alive:
+            key = tuple(sorted((k, v) for k, v in candidates[i].items() if k != staged_param))
+            groups.setdefault(key, []).append(i)
+        for members in groups.values():
+            if deadline is not None and time.perf_counter() > deadline and any(scores):
+                out_of_time = True
+                break
+            params = dict(candidates[members[0]])
+            if staged_param:
+                params[staged_param] = max(candidates[i][staged_param] for i in members)
+            estimator = clone(model).set_params(**params)
+            if rounds_param:
+                rounds[members[0]].append(_fit_early_stopping(estimator, model_name, X_fit, y_fit,
+                                                              X_eval, y_eval))
+            else:
+                estimator.fit(X_fit, y_fit)
+            if staged_param:
+                staged = _staged_predictions(estimator, model_name, X_eval,
+                                             [candidates[i][staged_param] for i in members])
+                for i in members:
+                    scores[i].append(r2_score(y_eval, staged[candidates[i][staged_param]]))
+            else:
+                scores[members[0]].append(r2_score(y_eval, estimator.predict(X_eval)))
+        depth = max(len(scores[i]) for i in alive)
+        ranked = sorted((i for i in alive if len(scores[i]) == depth),
+                        key=lambda i: np.mean(scores[i]), reverse=True)
+        alive = ranked[:1] if out_of_time else ranked[:max(1, -(-len(ranked) // HALVING_FACTOR))]
+        if out_of_time:
+            break
+
+    best_params = dict(candidates[alive[0]])
+    if rounds_param and rounds[alive[0]]:
+        best_params[rounds_param] = max(1, int(round(np.mean(rounds[alive[0]]))))
+    best_model = clone(model).set_params(**best_params)
+    best_model.fit(X, y)
+    return best_model, best_params
+
+
+def slice_hash(X, y):
+    """Content hash of one (ash type, target) training slice: columns, row order and values"""
+    digest = hashlib.sha256(json.dumps([list(X.columns), y.name]).encode())
+    digest.update(np.ascontiguousarray(X.to_numpy(dtype=np.float64)).tobytes())
+    digest.update(np.ascontiguousarray(y.to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+def prepare_data(datasets_clean, ash_types, verbose=True):
+    """
+    Split and scale every (ash type, target) once.
+
+    Returns (splits, targets, tasks): splits[split_id] holds scaled
+    train/test/validation inputs and the fitted scaler, shared by every
+    target of an ash type whose rows are identical; targets[(ash, target)]
+    holds that target's y arrays, split_id and slice hash; tasks lists (ash, target,
+    features) in notebook order.
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    splits, split_ids, targets, tasks = {}, {}, {}, []
+    for ash_type in ash_types:
+        df = datasets_clean[ash_type]
+        X_cols = [col for col in INPUT_VARIABLES if col in df.columns]
+        for target_var in TARGET_VARIABLES:
+            if target_var not in df.columns or df[target_var].isnull().all():
+                if verbose:
+                    print(f"  ⚠ Skipping {target_var} - not available in {ash_type}")
+                continue
+            df_target = df.dropna(subset=[target_var])
+            X = df_target[X_cols]
+            y = df_target[target_var]
+            if len(X) < 10:
+                if verbose:
+                    print(f"  ⚠ Insufficient data ({len(X)} samples) for {target_var} in {ash_type}")
+                continue
+
+            # The split depends only on the number of rows, so targets with the
+            # same rows share the same split and the same fitted scaler
+            key = (ash_type, tuple(X.index))
+            if key not in split_ids:
+                X_train, X_test, X_val, _, _, _ = split_data(X, y)
+                scaler = StandardScaler()
+                split_ids[key] = len(splits)
+                splits[split_ids[key]] = {
+                    'X_train': scaler.fit_transform(X_train),
+                    'X_test': scaler.transform(X_test),
+                    'X_val': scaler.transform(X_val),
+                    'index': (X_train.index, X_test.index, X_val.index),
+                    'scaler': scaler,
+                }
+            split = splits[split_ids[key]]
+            train_idx, test_idx, val_idx = split['index']
+            targets[(ash_type, target_var)] = {
+                'split_id': split_ids[key],
+                'y_train': y.loc[train_idx].to_numpy(),
+                'y_test': y.loc[test_idx].to_numpy(),
+                'y_val': y.loc[val_idx].to_numpy(),
+                'hash': slice_hash(X, y),
+            }
+            tasks.append((ash_type, target_var, X_cols))
+    return splits, targets, tasks
+
+
+def _init_worker(splits, targets, threads):
+    """Process-pool initializer: receive the shared data once and cap threads"""
+    global _worker_splits, _worker_targets, _worker_threads
+    from threadpoolctl import threadpool_limits
+
+    warnings.filterwarnings('ignore')
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    threadpool_limits(limits=threads)
+    _worker_splits = {i: {k: v for k, v in s.items() if k.startswith('X_')} for i, s in splits.items()}
+    _worker_targets = targets
+    _worker_threads = threads
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def measure_costs(model, X):
+    """
+    Inference costs of a fitted model: pickled size, unpickling time, and the
+    latency of a single-row predict (median) and of a LATENCY_BATCH_ROWS-row
+    predict (best of 3), in bytes and milliseconds.
+    """
+    import pickle
+
+    blob = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+    row = X[:1]
+    batch = np.resize(X, (LATENCY_BATCH_ROWS, X.shape[1]))
+    model.predict(row)
+    return {
+        'size_bytes': len(blob),
+        'load_ms': 1000 * min(_timed(pickle.loads, blob) for _ in range(3)),
+        'single_ms': 1000 * float(np.median([_timed(model.predict, row) for _ in range(LATENCY_REPEATS)])),
+        'batch_ms': 1000 * min(_timed(model.predict, batch) for _ in range(3)),
+    }
+
+
+def train_model(ash_type, target_var, model_name, search='grid', budget=None):
+    """Search hyperparameters (GridSearchCV or halving_search) and evaluate one model; runs inside a worker"""
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+    from sklearn.model_selection import GridSearchCV
+
+    start = time.perf_counter()
+    data = _worker_targets[(ash_type, target_var)]
+    split = _worker_splits[data['split_id']]
+    model = get_models(_worker_threads)[model_name]
+    param_grid = get_param_grids()[model_name]
+    best_params = {}
+    try:
+        if param_grid and search == 'halving':
+            best_model, best_params = halving_search(model, model_name, param_grid, split['X_train'],
+                                                     data['y_train'], cv_folds(len(split['X_train'])),
+                                                     budget)
+        elif param_grid:
+            grid_search = GridSearchCV(model, param_grid, cv=cv_folds(len(split['X_train'])),
+                                       scoring='r2', n_jobs=1)
+            grid_search.fit(split['X_train'], data['y_train'])
+            best_model = grid_search.best_estimator_
+            best_params = grid_search.best_params_
+        else:
+            best_model = model
+            best_model.fit(split['X_train'], data['y_train'])
+
+        result = {'model': best_model}
+        for part in ('train', 'test', 'val'):
+            y_true = data[f'y_{part}']
+            y_pred = best_model.predict(split[f'X_{part}'])
+            result[f'{part}_r2'] = r2_score(y_true, y_pred)
+            result[f'{part}_rmse'] = np.sqrt(mean_squared_error(y_true, y_pred))
+            result[f'{part}_mae'] = mean_absolute_error(y_true, y_pred)
+        result.update(measure_costs(best_model, split['X_val']))
+        error = None
+    except Exception as e:
+        result, error = None, str(e)
+    return {
+        'ash_type': ash_type,
+        'target_var': target_var,
+        'model_name': model_name,
+        'result': result,
+        'best_params': best_params,
+        'error': error,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def all_jobs(tasks):
+    """Every (ash type, target, model) job in submission order"""
+    model_names = list(get_param_grids())
+    return [(ash_type, target_var, model_name)
+            for model_name in JOB_ORDER if model_name in model_names
+            for ash_type, target_var, _ in tasks]
+
+
+def run_jobs(splits, targets, tasks, workers=None, threads=1, verbose=True, jobs=None, search='grid',
+             budget=None):
+    """
+    Train the given (default: every) (ash type, target, model) job; returns the job records.
+
+    budget is the halving search time per (ash type, target), shared out by budget_shares().
+    """
+    jobs = all_jobs(tasks) if jobs is None else jobs
+    if not jobs:
+        return []
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    shares = budget_shares()
+
+    def job_args(job):
+        return job + (search, None if budget is None else budget * shares[job[2]])
+
+    records = []
+
+    def report(record):
+        records.append(record)
+        if verbose:
+            status = (f"val R² {record['result']['val_r2']:.4f}" if record['result'] is not None
+                      else f"✗ Error: {record['error']}")
+            print(f"  [{len(records):>3}/{len(jobs)}] {record['ash_type'].strip():<6} "
+                  f"{record['target_var']:<28} {record['model_name']:<18} "
+                  f"{record['seconds']:>7.2f}s  {status}")
+
+    if workers == 1:
+        _init_worker(splits, targets, threads)
+        for job in jobs:
+            report(train_model(*job_args(job)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(splits, targets, threads)) as executor:
+            futures = [executor.submit(train_model, *job_args(job)) for job in jobs]
+            for future in futures:
+                report(future.result())
+    return records
+
+
+def training_version():
+    """Hash of the code that turns a data slice into fitted models"""
+    digest = hashlib.sha256(str(MANIFEST_FORMAT_VERSION).encode())
+    for func in (split_data, cv_folds, prepare_data, train_model, halving_search, _fit_early_stopping,
+                 _staged_predictions, measure_costs):
+        digest.update(inspect.getsource(func).encode())
+    return digest.hexdigest()[:16]
+
+
+def library_version(model):
+    """Version of the package a model class comes from"""
+    package = sys.modules.get(type(model).__module__.split('.')[0])
+    return getattr(package, '__version__', 'unknown')
+
+
+def job_hashes(targets, tasks, search='grid', budget=None):
+    """{(ash type, target, model): hash of everything that determines the job's result}"""
+    models = get_models()
+    param_grids = get_param_grids()
+    version = training_version()
+    if search != 'grid':
+        version += json.dumps([search, budget, HALVING_FACTOR, EARLY_STOPPING_ROUNDS])
+    settings = {}
+    for model_name, model in models.items():
+        params = {k: v for k, v in model.get_params().items() if k not in RUNTIME_PARAMS}
+        settings[model_name] = json.dumps({
+            'class': type(model).__name__,
+            'library': library_version(model),
+            'params': repr(sorted(params.items())),
+            'grid': param_grids[model_name],
+        }, sort_keys=True)
+
+    hashes = {}
+    for ash_type, target_var, X_cols in tasks:
+        for model_name in models:
+            digest = hashlib.sha256(version.encode())
+            digest.update(json.dumps([targets[(ash_type, target_var)]['hash'], X_cols, model_name]).encode())
+            digest.update(settings[model_name].encode())
+            hashes[(ash_type, target_var, model_name)] = digest.hexdigest()
+    return hashes
+
+
+def read_training_manifest(models_dir):
+    """training_manifest.json of a models directory, or None"""
+    path = os.path.join(models_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read {path}: {e}")
+        return None
+    return manifest if manifest.get('format') == MANIFEST_FORMAT_VERSION else None
+
+
+def _stored_pair(manifest, ash_type, target_var):
+    return (manifest or {}).get('pairs', {}).get(ash_type, {}).get(target_var, {})
+
+
+def reused_records(manifest, hashes):
+    """Job records (without fitted models) for every job whose stored hash still matches"""
+    records = []
+    for (ash_type, target_var, model_name), job_hash in hashes.items():
+        stored = _stored_pair(manifest, ash_type, target_var).get('jobs', {}).get(model_name)
+        if stored is None or stored['hash'] != job_hash:
+            continue
+        result = None
+        if stored['error'] is None:
+            result = {key: stored[key] for key in METRIC_KEYS + COST_KEYS}
+            result['model'] = None
+        records.append({
+            'ash_type': ash_type,
+            'target_var': target_var,
+            'model_name': model_name,
+            'result': result,
+            'best_params': stored['best_params'],
+            'error': stored['error'],
+            'seconds': stored['seconds'],
+            'reused': True,
+        })
+    return records
+
+
+def attach_saved_models(best_models, manifest, hashes, models_dir):
+    """
+    Fill in the fitted models of reused best models from their saved pickles.
+
+    A pickle is used only if the manifest lists it as that pair's best model
+    with the same job hash and file hash. Returns ({pair loaded from disk:
+    the calibration residuals saved with it, or None}, jobs that must be
+    retrained because no usable pickle exists).
+    """
+    loaded, refit = {}, []
+    for ash_type, ash_models in best_models.items():
+        for target_var, info in ash_models.items():
+            if info['model'] is not None:
+                continue
+            job = (ash_type, target_var, info['name'])
+            pair = _stored_pair(manifest, ash_type, target_var)
+            path = os.path.join(models_dir, model_file_name(ash_type, target_var))
+            if (pair.get('best_model') == info['name'] and
+                    pair['jobs'][info['name']]['hash'] == hashes[job] and
+                    os.path.exists(path) and file_sha256(path) == pair.get('file_sha256')):
+                saved = joblib.load(path)
+                info['model'] = saved['model']
+                info['metrics']['model'] = info['model']
+                loaded[(ash_type, target_var)] = saved.get('calibration')
+            else:
+                refit.append(job)
+    return loaded, refit
+
+
+def write_training_manifest(models_dir, records, hashes, best_models):
+    """Record job hashes, metrics and the best-model pickle of every pair"""
+    pairs = {}
+    for record in records:
+        job = (record['ash_type'], record['target_var'], record['model_name'])
+        entry = {
+            'hash': hashes[job],
+            'best_params': record['best_params'],
+            'error': record['error'],
+            'seconds': round(float(record['seconds']), 3),
+        }
+        if record['result'] is not None:
+            entry.update({key: float(record['result'][key]) for key in METRIC_KEYS + COST_KEYS})
+        pair = pairs.setdefault(record['ash_type'], {}).setdefault(record['target_var'], {'jobs': {}})
+        pair['jobs'][record['model_name']] = entry
+
+    for ash_type, ash_models in best_models.items():
+        for target_var, info in ash_models.items():
+            file_name = model_file_name(ash_type, target_var)
+            pairs[ash_type][target_var].update({
+                'best_model': info['name'],
+                'features': list(info['features']),
+                'file': file_name,
+                'file_sha256': file_sha256(os.path.join(models_dir, file_name)),
+            })
+
+    manifest = {
+        'format': MANIFEST_FORMAT_VERSION,
+        'training_version': training_version(),
+        'pairs': pairs,
+    }
+    tmp_path = os.path.join(models_dir, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False, default=_json_default)
+    os.replace(tmp_path, os.path.join(models_dir, MANIFEST_FILE))
+    return manifest
+
+
+def _json_default(value):
+    """numpy scalars in best_params"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def selection_policy(name='accuracy', max_ms=None, max_mb=None, delta_r2=None):
+    """
+    Validated best-model selection policy, as stored in the registry.
+
+    'accuracy': highest validation R² (the notebook's rule).
+    'budget': most accurate model with a single-row latency within max_ms
+    and a pickled size within max_mb (either may be None).
+    'tolerance': fastest single-row model whose validation R² is within
+    delta_r2 of the best.
+    """
+    if name not in SELECTION_POLICIES:
+        raise ValueError(f"Unknown selection policy {name!r} (use {', '.join(SELECTION_POLICIES)})")
+    if name == 'budget' and max_ms is None and max_mb is None:
+        raise ValueError("The 'budget' policy needs a latency (max_ms) and/or size (max_mb) limit")
+    policy = {'name': name}
+    if name == 'budget':
+        policy.update(max_ms=max_ms, max_mb=max_mb)
+    elif name == 'tolerance':
+        policy['delta_r2'] = DEFAULT_DELTA_R2 if delta_r2 is None else delta_r2
+    return policy
+
+
+def choose_model(results, policy):
+    """Name of the model in results ({name: metrics}, notebook order) that policy selects"""
+    # max()/min() keep the first model in notebook order on ties
+    most_accurate = max(results, key=lambda name: results[name]['val_r2'])
+    if policy['name'] == 'accuracy':
+        return most_accurate
+    if policy['name'] == 'tolerance':
+        floor = results[most_accurate]['val_r2'] - policy['delta_r2']
+        return min((name for name in results if results[name]['val_r2'] >= floor),
+                   key=lambda name: results[name]['single_ms'])
+
+    max_ms, max_mb = policy['max_ms'], policy['max_mb']
+    within = [name for name in results
+              if (max_ms is None or results[name]['single_ms'] <= max_ms) and
+              (max_mb is None or results[name]['size_bytes'] <= max_mb * 1e6)]
+    if not within:
+        fastest = min(results, key=lambda name: results[name]['single_ms'])
+        print(f"Warning: No model is within {max_ms} ms / {max_mb} MB; using the fastest ({fastest})")
+        return fastest
+    return max(within, key=lambda name: results[name]['val_r2'])
+
+
+def select_best_models(records, splits, targets, tasks, ash_types, policy=None):
+    """Assemble all_results and best_models in notebook order (best as chosen by policy, default accuracy)"""
+    policy = policy or selection_policy()
+    by_job = {(r['ash_type'], r['target_var'], r['model_name']): r for r in records}
+    model_names = list(get_param_grids())
+    all_results = {ash_type: {} for ash_type in ash_types}
+    best_models = {ash_type: {} for ash_type in ash_types}
+
+    for ash_type, target_var, X_cols in tasks:
+        scaler = splits[targets[(ash_type, target_var)]['split_id']]['scaler']
+        results = {}
+        for model_name in model_names:
+            record = by_job.get((ash_type, target_var, model_name))
+            if record is None or record['result'] is None:
+                continue
+            results[model_name] = dict(record['result'], scaler=scaler)
+        all_results[ash_type][target_var] = results
+        if results:
+            best_model_name = choose_model(results, policy)
+            best_models[ash_type][target_var] = {
+                'name': best_model_name,
+                'model': results[best_model_name]['model'],
+                'scaler': scaler,
+                'metrics': results[best_model_name],
+                'features': X_cols,
+            }
+    return all_results, best_models
+
+
+def calibrate_best_models(best_models, splits, targets):
+    """Attach each best model's sorted absolute validation residuals (split-conformal calibration)"""
+    for ash_type, ash_models in best_models.items():
+        for target_var, info in ash_models.items():
+            data = targets[(ash_type, target_var)]
+            y_pred = info['model'].predict(splits[data['split_id']]['X_val'])
+            info['calibration'] = np.sort(np.abs(data['y_val'] - np.asarray(y_pred).reshape(-1)))
+    return best_models
+
+
+def calibrate_saved_models(excel_file=DEFAULT_DATASET, models_dir=DEFAULT_MODELS_DIR,
+                           cache_dir=DEFAULT_CACHE_DIR, verbose=True):
+    """
+    Attach validation residuals to already exported models without refitting them.
+
+    Each model is scored on the validation split it was fit with. A pair is
+    skipped when the split's scaler differs from the saved one, because its
+    rows changed since training and the validation rows may include training
+    rows. The pickles, registry, index and array registry are rewritten;
+    fitted models and compiled ensembles are untouched. Returns the
+    calibrated pairs.
+    """
+    from concrete_predictor import fix_xgboost_model
+
+    model_registry = joblib.load(os.path.join(models_dir, REGISTRY_FILE))
+    compiled = {(ash_type, target_var): meta['compiled']
+                for ash_type, ash_models in load_model_index(models_dir)['models'].items()
+                for target_var, meta in ash_models.items() if meta.get('compiled')}
+    ash_types, datasets_clean = load_clean_datasets(excel_file, cache_dir, verbose=verbose)
+    splits, targets, _ = prepare_data(datasets_clean, ash_types, verbose)
+    calibrated = []
+    for ash_type, ash_models in model_registry['models'].items():
+        for target_var, info in ash_models.items():
+            data = targets.get((ash_type, target_var))
+            scaler = splits[data['split_id']]['scaler'] if data else None
+            if scaler is None or not (np.allclose(scaler.mean_, info['scaler'].mean_) and
+                                      np.allclose(scaler.scale_, info['scaler'].scale_)):
+                print(f"Warning: {ash_type} {target_var} was fit on different rows; not calibrated")
+                continue
+            fix_xgboost_model(info['model'])
+            calibrate_best_models({ash_type: {target_var: info}}, splits, targets)
+            path = os.path.join(models_dir, model_file_name(ash_type, target_var))
+            saved = joblib.load(path)
+            saved['calibration'] = info['calibration']
+            joblib.dump(saved, path)
+            calibrated.append((ash_type, target_var))
+
+    joblib.dump(model_registry, os.path.join(models_dir, REGISTRY_FILE))
+    index = write_model_index(models_dir, model_registry)
+    if compiled:
+        # The compiled ensembles are unchanged, so the index keeps pointing at them
+        for (ash_type, target_var), rel_path in compiled.items():
+            index['models'][ash_type][target_var]['compiled'] = rel_path
+        with open(os.path.join(models_dir, INDEX_FILE), 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+    manifest = read_training_manifest(models_dir)
+    if manifest is not None:
+        # Keep the rewritten pickles reusable by the next incremental run
+        for ash_type, target_var in calibrated:
+            pair = _stored_pair(manifest, ash_type, target_var)
+            if pair.get('file'):
+                pair['file_sha256'] = file_sha256(os.path.join(models_dir, pair['file']))
+        with open(os.path.join(models_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False, default=_json_default)
+    from array_registry import ARRAY_REGISTRY_DIR, convert_directory
+    if os.path.isdir(os.path.join(models_dir, ARRAY_REGISTRY_DIR)):
+        convert_directory(models_dir, verbose=False)
+    if verbose:
+        print(f"Calibrated {len(calibrated)} of {sum(len(m) for m in model_registry['models'].values())} "
+              f"models in {models_dir}/")
+    return calibrated
+
+
+def summary_frame(best_models, ash_types):
+    """best_models_summary.csv contents"""
+    summary_data = []
+    for ash_type in ash_types:
+        for target_var in TARGET_VARIABLES:
+            if target_var not in best_models.get(ash_type, {}):
+                continue
+            best_model_info = best_models[ash_type][target_var]
+            metrics = best_model_info['metrics']
+            summary_data.append({
+                'Ash Type': ash_type.replace(' 1', ''),
+                'Target Variable': target_var,
+                'Best Model': best_model_info['name'],
+                'Train R²': f"{metrics['train_r2']:.4f}",
+                'Test R²': f"{metrics['test_r2']:.4f}",
+                'Val R²': f"{metrics['val_r2']:.4f}",
+                'Val RMSE': f"{metrics['val_rmse']:.4f}",
+                'Val MAE': f"{metrics['val_mae']:.4f}",
+                'Size KB': f"{metrics['size_bytes'] / 1000:.1f}",
+                'Load ms': f"{metrics['load_ms']:.3f}",
+                'Single-row ms': f"{metrics['single_ms']:.3f}",
+                f'Batch ms ({LATENCY_BATCH_ROWS} rows)': f"{metrics['batch_ms']:.3f}",
+                f'{DEFAULT_COVERAGE:.0%} Interval ±': (
+                    f"{conformal_half_width(best_model_info['calibration']):.4f}"
+                    if best_model_info.get('calibration') is not None else ''),
+            })
+    return pd.DataFrame(summary_data)
+
+
+def timings_frame(records):
+    """Per-job timings and validation scores, slowest first (reused jobs show their last timing)"""
+    columns = ['Ash Type', 'Target Variable', 'Model', 'Seconds', 'Val R²', 'Size KB', 'Single-row ms',
+               'Best Params', 'Error', 'Reused']
+    df = pd.DataFrame([{
+        'Ash Type': r['ash_type'].strip(),
+        'Target Variable': r['target_var'],
+        'Model': r['model_name'],
+        'Seconds': round(r['seconds'], 3),
+        'Val R²': r['result']['val_r2'] if r['result'] is not None else np.nan,
+        'Size KB': r['result']['size_bytes'] / 1000 if r['result'] is not None else np.nan,
+        'Single-row ms': r['result']['single_ms'] if r['result'] is not None else np.nan,
+        'Best Params': r['best_params'],
+        'Error': r['error'] or '',
+        'Reused': r.get('reused', False),
+    } for r in records], columns=columns)
+    return df.sort_values('Seconds', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def export_models(best_models, ash_types, models_dir=DEFAULT_MODELS_DIR, unchanged=(), policy=None):
+    """
+    Write per-model pickles, the registry and its JSON index like the notebook.
+
+    Pairs in unchanged keep their existing pickle (it was loaded from there).
+    The selection policy is recorded in the registry and the index.
+    """
+    os.makedirs(models_dir, exist_ok=True)
+    for ash_type, ash_models in best_models.items():
+        for target_var, info in ash_models.items():
+            if (ash_type, target_var) in unchanged:
+                continue
+            joblib.dump({
+                'model': info['model'],
+                'scaler': info['scaler'],
+                'features': info['features'],
+                'ash_type': ash_type,
+                'target_var': target_var,
+                'model_name': info['name'],
+                'calibration': info.get('calibration'),
+            }, os.path.join(models_dir, model_file_name(ash_type, target_var)))
+
+    model_registry = {
+        'ash_types': ash_types,
+        'target_variables': TARGET_VARIABLES,
+        'input_variables': INPUT_VARIABLES,
+        'models': best_models,
+        'selection_policy': policy or selection_policy(),
+    }
+    joblib.dump(model_registry, os.path.join(models_dir, REGISTRY_FILE))
+    write_model_index(models_dir, model_registry)
+    return model_registry
+
+
+def train_all(excel_file=DEFAULT_DATASET, models_dir=DEFAULT_MODELS_DIR, workers=None, threads=1,
+              compile_trees=True, cache_dir=DEFAULT_CACHE_DIR, incremental=True, search='grid', budget=None,
+              policy=None, pooled=False, verbose=True):
+    """
+    Full pipeline: clean, split, train, select and export; returns the registry.
+
+    With incremental, jobs whose hash matches training_manifest.json are not
+    retrained; their stored metrics and best-model pickles are reused.
+    search is 'grid' (GridSearchCV, as in the notebook) or 'halving'
+    (halving_search, with budget seconds per (ash type, target)). policy
+    (see selection_policy) picks each pair's exported model. pooled also
+    writes pooled_model.pkl (retrained only when its inputs changed) and
+    compares both layouts.
+    """
+    start = time.perf_counter()
+    policy = policy or selection_policy()
+    ash_types, datasets_clean = load_clean_datasets(excel_file, cache_dir, verbose=verbose)
+    splits, targets, tasks = prepare_data(datasets_clean, ash_types, verbose)
+    if not tasks:
+        raise ValueError(f"No (ash type, target) pair in {excel_file} has enough data to train")
+    hashes = job_hashes(targets, tasks, search, budget)
+    manifest = read_training_manifest(models_dir) if incremental else None
+
+    reused = reused_records(manifest, hashes)
+    reused_jobs = {(r['ash_type'], r['target_var'], r['model_name']) for r in reused}
+    jobs = [job for job in all_jobs(tasks) if job not in reused_jobs]
+    if verbose:
+        print(f"\n{len(tasks)} targets share {len(splits)} splits/scalers; "
+              f"training {len(jobs)} jobs, {len(reused)} unchanged since the last run\n")
+
+    records = run_jobs(splits, targets, tasks, workers=workers, threads=threads, verbose=verbose, jobs=jobs,
+                       search=search, budget=budget)
+    _, best_models = select_best_models(reused + records, splits, targets, tasks, ash_types, policy)
+    unchanged, refit = attach_saved_models(best_models, manifest, hashes, models_dir)
+    if refit:
+        # A reused model became the best but its fitted object was not kept
+        if verbose:
+            print(f"\nRefitting {len(refit)} reused best models without a saved pickle")
+        refitted = run_jobs(splits, targets, tasks, workers=workers, threads=threads, verbose=verbose,
+                            jobs=refit, search=search, budget=budget)
+        # Keep the stored costs so that timing noise cannot change the selection
+        stored = {(r['ash_type'], r['target_var'], r['model_name']): r['result'] for r in reused}
+        for record in refitted:
+            old = stored[(record['ash_type'], record['target_var'], record['model_name'])]
+            if record['result'] is not None and old is not None:
+                record['result'].update({key: old[key] for key in COST_KEYS})
+        records += refitted
+        refit_jobs = set(refit)
+        reused = [r for r in reused if (r['ash_type'], r['target_var'], r['model_name']) not in refit_jobs]
+        _, best_models = select_best_models(reused + records, splits, targets, tasks, ash_types, policy)
+        unchanged, _ = attach_saved_models(best_models, manifest, hashes, models_dir)
+
+    calibrate_best_models(best_models, splits, targets)
+    # Reused pickles saved without these residuals (e.g. before calibration was stored) are rewritten
+    unchanged = {(a, t) for (a, t), saved in unchanged.items()
+                 if saved is not None and np.array_equal(saved, best_models[a][t]['calibration'])}
+    model_registry = export_models(best_models, ash_types, models_dir, unchanged, policy)
+    write_training_manifest(models_dir, reused + records, hashes, best_models)
+
+    summary_df = summary_frame(best_models, ash_types)
+    summary_df.to_csv(os.path.join(models_dir, SUMMARY_FILE), index=False)
+    timings_df = timings_frame(reused + records)
+    timings_df.to_csv(os.path.join(models_dir, TIMINGS_FILE), index=False)
+    trained_df = timings_df[~timings_df['Reused']]
+
+    if compile_trees:
+        from tree_compiler import compile_directory
+        if verbose:
+            print("\nCompiling tree ensembles...")
+        compile_directory(models_dir, verbose=verbose)
+        from array_registry import convert_directory
+        if verbose:
+            print("\nWriting the array registry...")
+        convert_directory(models_dir, verbose=False)
+
+    if pooled:
+        train_pooled_layout(datasets_clean, ash_types, splits, targets, tasks, models_dir, workers, threads,
+                            incremental, verbose)
+
+    if verbose:
+        print("\n" + summary_df.to_string(index=False))
+        job_seconds = trained_df['Seconds'].sum()
+        elapsed = time.perf_counter() - start
+        if records:
+            slowest = trained_df.head(10).drop(columns=['Best Params', 'Error', 'Reused'])
+            print(f"\nSlowest jobs:\n{slowest.to_string(index=False)}")
+        print(f"\nTrained {len(records)} jobs ({job_seconds:.1f}s of work), reused {len(reused)}, "
+              f"in {elapsed:.1f}s")
+        print(f"Models saved to: {models_dir}/ (job timings in {TIMINGS_FILE})")
+    return model_registry
+
+
+def train_pooled_layout(datasets_clean, ash_types, splits, targets, tasks, models_dir=DEFAULT_MODELS_DIR,
+                        workers=None, threads=1, incremental=True, verbose=True):
+    """Fit and export the pooled layout unless its hash is unchanged, then compare it with the per-pair one"""
+    from pooled_models import POOLED_FILE, compare_layouts, export_pooled, load_pooled, pooled_hash, train_pooled
+
+    source_hash = pooled_hash(targets, tasks)
+    path = os.path.join(models_dir, POOLED_FILE)
+    if incremental and os.path.exists(path) and load_pooled(models_dir).get('hash') == source_hash:
+        if verbose:
+            print(f"\nPooled models unchanged since the last run ({POOLED_FILE})")
+    else:
+        if verbose:
+            print("\nTraining pooled multi-ash models...")
+        trained = train_pooled(datasets_clean, ash_types, splits, targets, tasks, workers=workers,
+                               threads=threads, verbose=verbose)
+        export_pooled(trained, models_dir, source_hash)
+    return compare_layouts(datasets_clean, ash_types, splits, targets, tasks, models_dir, verbose=verbose)
+
+
+def compare_search(excel_file=DEFAULT_DATASET, models_dir=DEFAULT_MODELS_DIR, workers=None, threads=1,
+                   cache_dir=DEFAULT_CACHE_DIR, budget=None, verbose=True):
+    """
+    Train with both search strategies and compare them per (ash type, target).
+
+    Nothing is exported. Grid results whose hash matches the manifest in
+    models_dir are reused instead of retrained. Returns a DataFrame with the
+    search time of each strategy and the validation R² of the model each
+    would select; it is also written to search_comparison.csv.
+    """
+    ash_types, datasets_clean = load_clean_datasets(excel_file, cache_dir, verbose=verbose)
+    splits, targets, tasks = prepare_data(datasets_clean, ash_types, verbose)
+    if not tasks:
+        raise ValueError(f"No (ash type, target) pair in {excel_file} has enough data to train")
+    manifest = read_training_manifest(models_dir)
+
+    outcomes = {}
+    for search in SEARCH_STRATEGIES:
+        hashes = job_hashes(targets, tasks, search, budget)
+        reused = reused_records(manifest, hashes)
+        reused_jobs = {(r['ash_type'], r['target_var'], r['model_name']) for r in reused}
+        jobs = [job for job in all_jobs(tasks) if job not in reused_jobs]
+        if verbose:
+            print(f"\n{search} search: training {len(jobs)} jobs, {len(reused)} from {MANIFEST_FILE}\n")
+        records = reused + run_jobs(splits, targets, tasks, workers=workers, threads=threads, verbose=verbose,
+                                    jobs=jobs, search=search, budget=budget)
+        _, best_models = select_best_models(records, splits, targets, tasks, ash_types)
+        seconds = {}
+        for record in records:
+            pair = (record['ash_type'], record['target_var'])
+            seconds[pair] = seconds.get(pair, 0.0) + record['seconds']
+        outcomes[search] = (best_models, seconds)
+
+    rows = []
+    for ash_type, target_var, _ in tasks:
+        row = {'Ash Type': ash_type.strip(), 'Target Variable': target_var}
+        for search, (best_models, seconds) in outcomes.items():
+            best = best_models[ash_type].get(target_var)
+            label = search.capitalize()
+            row[f'{label} Seconds'] = seconds.get((ash_type, target_var), 0.0)
+            row[f'{label} Model'] = best['name'] if best else ''
+            row[f'{label} Val R²'] = best['metrics']['val_r2'] if best else np.nan
+        rows.append(row)
+    df = pd.DataFrame(rows)
+    df['Speedup'] = df['Grid Seconds'] / df['Halving Seconds']
+    df['Val R² Change'] = df['Halving Val R²'] - df['Grid Val R²']
+
+    os.makedirs(models_dir, exist_ok=True)
+    df.to_csv(os.path.join(models_dir, COMPARISON_FILE), index=False)
+    if verbose:
+        grid_seconds, halving_seconds = df['Grid Seconds'].sum(), df['Halving Seconds'].sum()
+        print("\n" + df.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+        print(f"\nGrid search {grid_seconds:.1f}s of work, halving {halving_seconds:.1f}s "
+              f"({grid_seconds / halving_seconds:.1f}x faster, {grid_seconds - halving_seconds:.1f}s saved)")
+        print(f"Val R² change of the selected models: mean {df['Val R² Change'].mean():+.4f}, "
+              f"worst {df['Val R² Change'].min():+.4f}; "
+              f"same model chosen for {(df['Grid Model'] == df['Halving Model']).sum()}/{len(df)} targets")
+        print(f"Comparison saved to: {os.path.join(models_dir, COMPARISON_FILE)}")
+    return df
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Train the concrete mixture models")
+    parser.add_argument('--data', default=DEFAULT_DATASET, help="Excel workbook with one sheet per ash type")
+    parser.add_argument('--out', default=DEFAULT_MODELS_DIR, help="Output models directory")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--threads', type=int, default=1, help="Threads per worker")
+    parser.add_argument('--no-compile', action='store_true',
+                        help="Skip compiling tree ensembles and writing the array registry")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="Cleaned dataset cache directory")
+    parser.add_argument('--no-cache', action='store_true', help="Always re-read the Excel workbook")
+    parser.add_argument('--full', action='store_true', help=f"Retrain every job, ignoring {MANIFEST_FILE}")
+    parser.add_argument('--search', choices=SEARCH_STRATEGIES, default='grid',
+                        help="Hyperparameter search: full grid (default) or successive halving")
+    parser.add_argument('--budget', type=float, default=None,
+                        help="Halving search seconds per (ash type, target) (default: no limit)")
+    parser.add_argument('--compare-search', action='store_true',
+                        help=f"Run both searches and write {COMPARISON_FILE} instead of exporting models")
+    parser.add_argument('--policy', choices=SELECTION_POLICIES, default='accuracy',
+                        help="Best-model selection: highest val R² (default), most accurate within "
+                             "--max-ms/--max-mb, or fastest within --delta-r2 of the best")
+    parser.add_argument('--max-ms', type=float, default=None, help="Single-row latency limit (budget policy)")
+    parser.add_argument('--max-mb', type=float, default=None, help="Pickled model size limit (budget policy)")
+    parser.add_argument('--delta-r2', type=float, default=None,
+                        help=f"Allowed val R² loss (tolerance policy, default {DEFAULT_DELTA_R2})")
+    parser.add_argument('--pooled', action='store_true',
+                        help="Also train the pooled multi-ash layout and compare it with the per-pair models")
+    parser.add_argument('--calibrate-only', action='store_true',
+                        help="Attach validation residuals to the exported models without retraining")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data):
+        print(f"ERROR: Dataset not found: {args.data}")
+        return 1
+    if args.budget is not None and args.search != 'halving' and not args.compare_search:
+        print("ERROR: --budget applies to --search halving")
+        return 1
+    cache_dir = None if args.no_cache else args.cache_dir
+    try:
+        policy = selection_policy(args.policy, args.max_ms, args.max_mb, args.delta_r2)
+        if args.calibrate_only:
+            calibrate_saved_models(args.data, args.out, cache_dir=cache_dir, verbose=not args.quiet)
+            return 0
+        if args.compare_search:
+            compare_search(args.data, args.out, workers=args.workers, threads=args.threads,
+                           cache_dir=cache_dir, budget=args.budget, verbose=not args.quiet)
+            return 0
+        train_all(args.data, args.out, workers=args.workers, threads=args.threads,
+                  compile_trees=not args.no_compile, cache_dir=cache_dir, incremental=not args.full,
+                  search=args.search, budget=args.budget, policy=policy, pooled=args.pooled,
+                  verbose=not args.quiet)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
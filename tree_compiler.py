@@ -0,0 +1,561 @@
+"""
+Concrete Mixture Prediction System
+Exporter and NumPy evaluator for fitted tree-ensemble models
+
+Decision trees, random forests, gradient boosting, XGBoost, LightGBM and
+CatBoost models are flattened into one node table (feature, threshold,
+left/right child, leaf value). Prediction then walks every tree of the
+ensemble for a whole batch at once and needs nothing but NumPy.
+
+Usage:
+    python tree_compiler.py [trained_models]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+COMPILED_DIR = 'compiled'
+TREE_MODEL_CLASSES = {
+    'DecisionTreeRegressor', 'RandomForestRegressor', 'GradientBoostingRegressor',
+    'XGBRegressor', 'LGBMRegressor', 'CatBoostRegressor',
+}
+# Tolerance for compiled vs original predictions (boosters accumulate in float32)
+CHECK_RTOL = 1e-5
+CHECK_ATOL = 1e-4
+# Rows x trees evaluated per block; keeps the working set in cache
+EVAL_BLOCK = 1 << 14
+# Bits reserved for the feature index in the packed (child, feature) node word
+FEATURE_BITS = 16
+# Batches at least this large are first collapsed to one row per threshold cell
+DEDUP_MIN_ROWS = 2048
+
+
+def _sibling_order(left, right, roots):
+    """Node permutation (breadth-first per tree) that puts every right child right after its left child"""
+    order = []
+    for root in roots:
+        order.append(root)
+        queue = [root]
+        while queue:
+            children = []
+            for node in queue:
+                if left[node] != node:
+                    children.extend((left[node], right[node]))
+            order.extend(children)
+            queue = children
+    return np.array(order, dtype=np.int64)
+
+
+class CompiledEnsemble:
+    """
+    Tree ensemble stored as flat node arrays.
+
+    A row goes to the left child when x[feature] <= threshold (or when x is
+    NaN and default_left is set). Leaves point to themselves, so walking
+    max_depth steps lands every row on a leaf. The prediction is
+    base_score + scale * sum of the reached leaf values.
+
+    Nodes are numbered so that right == left + 1; each step of the walk is
+    then one packed (left child, feature) lookup, one threshold lookup and
+    an add.
+
+    Rows that fall between the same pair of split thresholds on every
+    feature reach the same leaves, so large batches (e.g. sweep grids) are
+    evaluated once per distinct threshold cell.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, default_left, roots,
+                 base_score=0.0, scale=1.0, input_dtype='float32', max_depth=None, prepared=None):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.base_score = float(base_score)
+        self.scale = float(scale)
+        self.input_dtype = str(input_dtype)
+        if self.feature.size and self.feature.max() >= 1 << FEATURE_BITS:
+            raise ValueError(f"At most {1 << FEATURE_BITS} features are supported")
+
+        leaf = self.left == np.arange(self.n_nodes)
+        if not np.array_equal(self.right[~leaf], self.left[~leaf] + 1):
+            self._renumber(_sibling_order(self.left, self.right, self.roots))
+            leaf = self.left == np.arange(self.n_nodes)
+        self.max_depth = int(max_depth) if max_depth is not None else self._depth()
+        self._prepare(leaf, prepared)
+
+    def _renumber(self, order):
+        """Apply a node permutation to all arrays"""
+        new_id = np.empty(self.n_nodes, dtype=np.int64)
+        new_id[order] = np.arange(len(order))
+        self.feature = self.feature[order]
+        self.threshold = self.threshold[order]
+        self.left = new_id[self.left[order]].astype(np.int32)
+        self.right = new_id[self.right[order]].astype(np.int32)
+        self.value = self.value[order]
+        self.default_left = self.default_left[order]
+        self.roots = new_id[self.roots].astype(np.int32)
+
+    def _prepare(self, leaf, prepared=None):
+        """
+        Evaluation arrays: packed child/feature words and thresholds in the input dtype.
+
+        prepared is a previous eval_arrays() result (e.g. memory-mapped); it is
+        used as is instead of being recomputed.
+        """
+        if prepared is not None:
+            self._packed = prepared['packed']
+            self._threshold = prepared['eval_threshold']
+            self._nan_right = prepared['nan_right']
+        else:
+            self._packed = (self.left.astype(np.int64) << FEATURE_BITS) | self.feature
+            if self.input_dtype == 'float32':
+                # x32 <= t64 exactly when x32 <= the largest float32 not above t64
+                threshold = self.threshold.astype(np.float32)
+                too_high = threshold.astype(np.float64) > self.threshold
+                threshold[too_high] = np.nextafter(threshold[too_high], np.float32(-np.inf))
+            else:
+                threshold = self.threshold.copy()
+            # Leaves never move: x > inf is false, and NaN stays via default_left
+            threshold[leaf] = np.inf
+            self._threshold = threshold
+            self._nan_right = ~self.default_left & ~leaf
+        # Sorted distinct split thresholds of each feature
+        n_features = int(self.feature[~leaf].max()) + 1 if (~leaf).any() else 0
+        self._cuts = [np.unique(self._threshold[~leaf & (self.feature == j)]) for j in range(n_features)]
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def _depth(self):
+        """Longest root-to-leaf path over all trees"""
+        depth = 0
+        frontier = self.roots
+        while True:
+            frontier = frontier[self.left[frontier] != frontier]
+            if len(frontier) == 0:
+                return depth
+            frontier = np.concatenate([self.left[frontier], self.right[frontier]])
+            depth += 1
+
+    def predict(self, X):
+        """Predict a batch; X is an (N x features) array already scaled like at training"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        # The original libraries compare float32 features (LightGBM uses float64)
+        X = np.ascontiguousarray(X, dtype=self._threshold.dtype)
+        has_nan = bool(np.isnan(X).any())
+        if X.shape[0] >= DEDUP_MIN_ROWS and not has_nan:
+            cells = self._cell_codes(X)
+            if cells is not None:
+                _, first, inverse = np.unique(cells, return_index=True, return_inverse=True)
+                if len(first) <= X.shape[0] // 2:
+                    return self._walk(X[first], False)[inverse]
+        return self._walk(X, has_nan)
+
+    def _cell_codes(self, X):
+        """One int64 per row identifying its threshold cell, or None if the cells do not fit"""
+        codes = np.zeros(X.shape[0], dtype=np.int64)
+        radix = 1
+        for j, cuts in enumerate(self._cuts):
+            if len(cuts) == 0:
+                continue
+            if radix * (len(cuts) + 1) >= 1 << 62:
+                return None
+            # Number of thresholds below x == number of 'x > threshold' splits taken right
+            codes += radix * np.searchsorted(cuts, X[:, j], side='left')
+            radix *= len(cuts) + 1
+        return codes
+
+    def _walk(self, X, has_nan):
+        """Walk every tree for a contiguous batch in the input dtype"""
+        n_features = X.shape[1]
+        feature_mask = (1 << FEATURE_BITS) - 1
+
+        out = np.empty(X.shape[0])
+        block = max(1, EVAL_BLOCK // max(1, self.n_trees))
+        for start in range(0, X.shape[0], block):
+            Xb = X[start:start + block]
+            flat = Xb.ravel()
+            row_offset = (np.arange(Xb.shape[0]) * n_features)[:, None]
+            node = np.repeat(self.roots.astype(np.intp)[None, :], Xb.shape[0], axis=0)
+            for _ in range(self.max_depth):
+                packed = self._packed[node]
+                x = flat[row_offset + (packed & feature_mask)]
+                go_right = x > self._threshold[node]
+                if has_nan:
+                    go_right |= np.isnan(x) & self._nan_right[node]
+                node = (packed >> FEATURE_BITS) + go_right
+            out[start:start + block] = self.value[node].sum(axis=1)
+        return self.base_score + self.scale * out
+
+    def to_arrays(self):
+        """Arrays for np.savez (no pickled objects)"""
+        return {
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'left': self.left,
+            'right': self.right,
+            'value': self.value,
+            'default_left': self.default_left,
+            'roots': self.roots,
+            'base_score': np.array(self.base_score),
+            'scale': np.array(self.scale),
+            'input_dtype': np.array(self.input_dtype),
+            'max_depth': np.array(self.max_depth),
+        }
+
+    def eval_arrays(self):
+        """Prepared evaluation arrays, accepted back by the constructor's prepared argument"""
+        return {
+            'packed': self._packed,
+            'eval_threshold': self._threshold,
+            'nan_right': self._nan_right,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild an ensemble from to_arrays() output (e.g. a loaded .npz)"""
+        return cls(arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'],
+                   arrays['value'], arrays['default_left'], arrays['roots'],
+                   base_score=arrays['base_score'][()], scale=arrays['scale'][()],
+                   input_dtype=str(arrays['input_dtype'][()]), max_depth=arrays['max_depth'][()])
+
+
+class ArrayScaler:
+    """StandardScaler stand-in holding only mean_ and scale_"""
+
+    def __init__(self, mean, scale):
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+
+    @classmethod
+    def from_scaler(cls, scaler):
+        """Copy the parameters of a fitted StandardScaler"""
+        mean = getattr(scaler, 'mean_', None)
+        scale = getattr(scaler, 'scale_', None)
+        if mean is None:
+            mean = np.zeros(scaler.n_features_in_)
+        if scale is None:
+            scale = np.ones(scaler.n_features_in_)
+        return cls(mean, scale)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+class _NodeTable:
+    """Accumulates trees into one flat node table"""
+
+    def __init__(self):
+        self.parts = []
+        self.roots = []
+        self.n_nodes = 0
+
+    def add_tree(self, feature, threshold, left, right, value, default_left=None):
+        """Append one tree given local node arrays; leaves have left == -1"""
+        feature = np.asarray(feature, dtype=np.int64).copy()
+        left = np.asarray(left, dtype=np.int64).copy()
+        right = np.asarray(right, dtype=np.int64).copy()
+        threshold = np.asarray(threshold, dtype=np.float64).copy()
+        value = np.asarray(value, dtype=np.float64).copy()
+        default_left = (np.zeros(len(feature), dtype=bool) if default_left is None
+                        else np.asarray(default_left, dtype=bool).copy())
+
+        leaf = left < 0
+        own = np.arange(len(feature))
+        left[leaf] = own[leaf]
+        right[leaf] = own[leaf]
+        feature[leaf] = 0
+        threshold[leaf] = 0.0
+        value[~leaf] = 0.0
+
+        self.parts.append((feature, threshold, left + self.n_nodes, right + self.n_nodes,
+                           value, default_left))
+        self.roots.append(self.n_nodes)
+        self.n_nodes += len(feature)
+
+    def build(self, **kwargs):
+        columns = list(zip(*self.parts))
+        return CompiledEnsemble(*[np.concatenate(c) for c in columns], self.roots, **kwargs)
+
+
+def _below_float32(threshold):
+    """Largest float32 strictly below threshold, turning 'x < t' into 'x <= t''"""
+    t = np.asarray(threshold, dtype=np.float32)
+    return np.nextafter(t, np.float32(-np.inf)).astype(np.float64)
+
+
+def _add_sklearn_tree(table, tree):
+    table.add_tree(tree.feature, tree.threshold, tree.children_left, tree.children_right,
+                   tree.value[:, 0, 0])
+
+
+def _export_sklearn(model):
+    """DecisionTree, RandomForest and GradientBoosting regressors"""
+    table = _NodeTable()
+    name = model.__class__.__name__
+    if name == 'DecisionTreeRegressor':
+        _add_sklearn_tree(table, model.tree_)
+        return table.build()
+    if name == 'RandomForestRegressor':
+        for estimator in model.estimators_:
+            _add_sklearn_tree(table, estimator.tree_)
+        return table.build(scale=1.0 / len(model.estimators_))
+
+    # GradientBoostingRegressor: init prediction + learning_rate * sum of trees
+    for estimator in model.estimators_[:, 0]:
+        _add_sklearn_tree(table, estimator.tree_)
+    if model.init_ == 'zero':
+        base_score = 0.0
+    else:
+        base_score = float(np.ravel(model.init_.predict(np.zeros((1, model.n_features_in_))))[0])
+    return table.build(base_score=base_score, scale=model.learning_rate)
+
+
+def _export_xgboost(model):
+    booster = model.get_booster()
+    dump = json.loads(booster.save_raw('json'))
+    learner = dump['learner']
+    base_score = float(str(learner['learner_model_param']['base_score']).strip('[]'))
+    trees = learner['gradient_booster']['model']['trees']
+
+    table = _NodeTable()
+    for tree in trees:
+        left = np.array(tree['left_children'])
+        split = np.array(tree['split_conditions'], dtype=np.float64)
+        leaf = left < 0
+        # XGBoost goes left when x < split; leaves keep their value in split_conditions
+        threshold = np.where(leaf, 0.0, _below_float32(split))
+        table.add_tree(tree['split_indices'], threshold, left, tree['right_children'],
+                       np.where(leaf, split, 0.0), tree['default_left'])
+    return table.build(base_score=base_score)
+
+
+def _export_lightgbm(model):
+    dump = model.booster_.dump_model()
+    table = _NodeTable()
+    for tree_info in dump['tree_info']:
+        feature, threshold, left, right, value, default_left = [], [], [], [], [], []
+
+        def visit(node):
+            idx = len(feature)
+            for column in (feature, threshold, left, right, value, default_left):
+                column.append(0)
+            if 'leaf_value' in node or 'split_feature' not in node:
+                left[idx] = right[idx] = -1
+                value[idx] = node.get('leaf_value', 0.0)
+                return idx
+            if node.get('decision_type', '<=') != '<=':
+                raise ValueError(f"Unsupported LightGBM decision type {node['decision_type']}")
+            feature[idx] = node['split_feature']
+            threshold[idx] = node['threshold']
+            if node.get('missing_type', 'None') == 'None':
+                # LightGBM reads NaN as 0.0 when no missing values were seen in training
+                default_left[idx] = 0.0 <= node['threshold']
+            else:
+                default_left[idx] = node.get('default_left', True)
+            left[idx] = visit(node['left_child'])
+            right[idx] = visit(node['right_child'])
+            return idx
+
+        visit(tree_info['tree_structure'])
+        table.add_tree(feature, threshold, left, right, value, default_left)
+    # LightGBM compares float64 features against float64 thresholds
+    return table.build(input_dtype='float64')
+
+
+def _export_catboost(model):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.json')
+        model.save_model(path, format='json')
+        with open(path, encoding='utf-8') as f:
+            dump = json.load(f)
+
+    float_features = dump['features_info'].get('float_features', [])
+    flat_index = {f['feature_index']: f['flat_feature_index'] for f in float_features}
+    scale, bias = dump.get('scale_and_bias', [1.0, [0.0]])
+    bias = float(np.ravel(bias)[0]) if np.size(bias) else 0.0
+
+    table = _NodeTable()
+    for tree in dump['oblivious_trees']:
+        splits = tree['splits']
+        leaf_values = np.asarray(tree['leaf_values'], dtype=np.float64)
+        depth = len(splits)
+        for split in splits:
+            if split.get('split_type', 'FloatFeature') != 'FloatFeature':
+                raise ValueError(f"Unsupported CatBoost split type {split['split_type']}")
+
+        # Expand the oblivious tree into a complete binary tree in BFS order.
+        # CatBoost sets bit l of the leaf index when split l is true (x > border).
+        n_internal = (1 << depth) - 1
+        n_nodes = 2 * n_internal + 1
+        feature = np.zeros(n_nodes, dtype=np.int64)
+        threshold = np.zeros(n_nodes)
+        left = np.full(n_nodes, -1, dtype=np.int64)
+        right = np.full(n_nodes, -1, dtype=np.int64)
+        value = np.zeros(n_nodes)
+        for node in range(n_internal):
+            level = int(np.log2(node + 1))
+            split = splits[level]
+            feature[node] = flat_index[split['float_feature_index']]
+            threshold[node] = split['border']
+            left[node] = 2 * node + 1
+            right[node] = 2 * node + 2
+        for position in range(1 << depth):
+            leaf_index = 0
+            for level in range(depth):
+                if position >> (depth - 1 - level) & 1:
+                    leaf_index |= 1 << level
+            value[n_internal + position] = leaf_values[leaf_index]
+        table.add_tree(feature, threshold, left, right, value)
+    return table.build(base_score=bias, scale=scale)
+
+
+def export_ensemble(model):
+    """Convert a fitted tree model to a CompiledEnsemble"""
+    name = model.__class__.__name__
+    if name in ('DecisionTreeRegressor', 'RandomForestRegressor', 'GradientBoostingRegressor'):
+        return _export_sklearn(model)
+    if name == 'XGBRegressor':
+        return _export_xgboost(model)
+    if name == 'LGBMRegressor':
+        return _export_lightgbm(model)
+    if name == 'CatBoostRegressor':
+        return _export_catboost(model)
+    raise ValueError(f"Cannot compile model of type {name}")
+
+
+def probe_inputs(compiled, n_features, n_rows=256, seed=0):
+    """
+    Scaled probe rows for checking a compiled model.
+
+    Half the rows are spread over +-3 standard deviations; the other half sit
+    exactly on split thresholds or the next float32 above them, which is
+    where a wrong '<' vs '<=' translation would show up.
+    """
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(-3, 3, (n_rows, n_features))
+    internal = compiled.left != np.arange(compiled.n_nodes)
+    for f in range(n_features):
+        thresholds = compiled.threshold[internal & (compiled.feature == f)]
+        if len(thresholds) == 0:
+            continue
+        rows = slice(n_rows // 2, None)
+        picked = rng.choice(thresholds, n_rows - n_rows // 2).astype(np.float32)
+        above = np.nextafter(picked, np.float32(np.inf))
+        X[rows, f] = np.where(rng.random(len(picked)) < 0.5, picked, above)
+    return X
+
+
+def check_compiled(model, compiled, X_scaled):
+    """Max absolute difference between the original and compiled predictions"""
+    expected = np.asarray(model.predict(X_scaled), dtype=np.float64).reshape(-1)
+    actual = compiled.predict(X_scaled)
+    ok = np.allclose(actual, expected, rtol=CHECK_RTOL, atol=CHECK_ATOL)
+    return ok, float(np.max(np.abs(actual - expected)))
+
+
+def save_compiled(path, compiled, scaler, features, name, model_class):
+    """Write a compiled model and its scaler parameters to one .npz file"""
+    array_scaler = ArrayScaler.from_scaler(scaler)
+    np.savez(path,
+             scaler_mean=array_scaler.mean_,
+             scaler_scale=array_scaler.scale_,
+             features=np.array(features),
+             name=np.array(name),
+             model_class=np.array(model_class),
+             **compiled.to_arrays())
+
+
+def load_compiled(path):
+    """Load a .npz written by save_compiled as {'name', 'model', 'scaler', 'features'}"""
+    with np.load(path, allow_pickle=False) as arrays:
+        return {
+            'name': str(arrays['name'][()]),
+            'model_class': str(arrays['model_class'][()]),
+            'model': CompiledEnsemble.from_arrays(arrays),
+            'scaler': ArrayScaler(arrays['scaler_mean'], arrays['scaler_scale']),
+            'features': [str(f) for f in arrays['features']],
+        }
+
+
+def compile_directory(models_dir='trained_models', verbose=True):
+    """
+    Compile every tree model listed in model_index.json.
+
+    Each compiled model is checked against the original on probe inputs and
+    only written (to <models_dir>/compiled/<stem>.npz) if it matches; on a
+    mismatch any earlier .npz of that model is deleted. The index entries
+    gain a 'compiled' path. Returns {(ash, target): max error}.
+    """
+    import joblib
+    from concrete_predictor import INDEX_FILE, fix_xgboost_model, load_model_index
+
+    index = load_model_index(models_dir)
+    os.makedirs(os.path.join(models_dir, COMPILED_DIR), exist_ok=True)
+
+    errors = {}
+    for ash_type, ash_models in index['models'].items():
+        for target_var, meta in ash_models.items():
+            if meta['model_class'] not in TREE_MODEL_CLASSES:
+                continue
+            saved = joblib.load(os.path.join(models_dir, meta['file']))
+            fix_xgboost_model(saved['model'])
+            compiled = export_ensemble(saved['model'])
+
+            X_probe = probe_inputs(compiled, len(saved['features']))
+            ok, max_error = check_compiled(saved['model'], compiled, X_probe)
+            errors[(ash_type, target_var)] = max_error
+            if verbose:
+                status = 'ok' if ok else 'MISMATCH, skipped'
+                print(f"  {ash_type.strip():<6} {target_var:<28} {meta['name']:<16} "
+                      f"{compiled.n_trees:>4} trees {compiled.n_nodes:>7} nodes  "
+                      f"max error {max_error:.2e}  {status}")
+            rel_path = os.path.join(COMPILED_DIR, os.path.splitext(meta['file'])[0] + '.npz')
+            if not ok:
+                # A file left from an earlier run would no longer match the pickle
+                meta.pop('compiled', None)
+                if os.path.exists(os.path.join(models_dir, rel_path)):
+                    os.remove(os.path.join(models_dir, rel_path))
+                continue
+
+            save_compiled(os.path.join(models_dir, rel_path), compiled, saved['scaler'],
+                          saved['features'], saved.get('model_name', meta['name']),
+                          meta['model_class'])
+            meta['compiled'] = rel_path.replace(os.sep, '/')
+
+    with open(os.path.join(models_dir, INDEX_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    return errors
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Compile tree-ensemble models to NumPy node tables")
+    parser.add_argument('models_dir', nargs='?', default='trained_models')
+    args = parser.parse_args()
+
+    print(f"Compiling tree models in {args.models_dir}/ ...")
+    errors = compile_directory(args.models_dir)
+    print(f"\nCompiled models written to {os.path.join(args.models_dir, COMPILED_DIR)}/")
+    if not errors:
+        print("No tree models found.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())